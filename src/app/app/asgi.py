@@ -13,4 +13,17 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up by get_asgi_application.
+from django.conf import settings  # noqa: E402
+from django.contrib.staticfiles.handlers import (  # noqa: E402
+    ASGIStaticFilesHandler,
+)
+from bank.streams import EventStreamApp  # noqa: E402
+
+if settings.DEBUG:
+    # Serves static files in development like runserver does.
+    django_application = ASGIStaticFilesHandler(django_application)
+
+application = EventStreamApp(django_application, '/api/bank/events/')
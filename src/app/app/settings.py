@@ -45,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'bank.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,6 +53,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'bank.middleware.ReplicaPinningMiddleware',
 ]
 
 ROOT_URLCONF = 'app.urls'
@@ -89,6 +91,78 @@ DATABASES = {
     }
 }
 
+# Read replicas share the primary's settings except for the HOST (the
+# database file for SQLite), given as a comma separated SQL_REPLICAS list.
+_replica_key = (
+    'NAME' if DATABASES['default']['ENGINE'].endswith('sqlite3') else 'HOST'
+)
+for _number, _replica in enumerate(
+    filter(None, os.getenv('SQL_REPLICAS', '').split(',')), start=1
+):
+    DATABASES[f'replica{_number}'] = {
+        **DATABASES['default'],
+        _replica_key: _replica.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != 'default']
+
+# Seconds the clients read from the primary after a write.
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', '5'))
+
+DATABASE_ROUTERS = ['bank.routers.PrimaryReplicaRouter']
+
+# Time-ordered (uuid7) instead of random primary keys of bank models.
+TIME_ORDERED_IDS = os.getenv('TIME_ORDERED_IDS', 'FALSE') == 'TRUE'
+
+# Balance change streams, see bank.events. `local` delivers events only
+# to streams of the same worker process, `cache` to all workers sharing
+# the cache, including run_transfer_workers.
+EVENTS_BROKER = os.getenv('EVENTS_BROKER', 'local')
+EVENTS_POLL_INTERVAL = float(os.getenv('EVENTS_POLL_INTERVAL', '0.5'))
+EVENTS_KEEPALIVE_SECONDS = float(os.getenv('EVENTS_KEEPALIVE_SECONDS', '15'))
+EVENTS_QUEUE_SIZE = 100
+
+
+# Metrics
+# Fraction of requests whose database queries are counted and timed.
+METRICS_SAMPLE_RATE = float(os.getenv('METRICS_SAMPLE_RATE', '0.1'))
+
+# Sampled requests slower than this log their slowest queries.
+METRICS_SLOW_REQUEST_SECONDS = float(
+    os.getenv('METRICS_SLOW_REQUEST_SECONDS', '1.0')
+)
+METRICS_SLOW_QUERIES = 5
+
+METRICS_SERVER_TIMING = os.getenv('METRICS_SERVER_TIMING', 'FALSE') == 'TRUE'
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+# Throttling and the `cache` events broker need a cache shared by all
+# worker processes, e.g. django.core.cache.backends.redis.RedisCache
+# with redis://cache:6379 in docker compose. The local memory default
+# is separate in every process.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# ETags of account and customer views, see bank.etags. Resource versions
+# are kept in the cache, which has to be shared by all workers.
+ETAGS_ENABLED = CACHES['default']['BACKEND'] not in (
+    'django.core.cache.backends.dummy.DummyCache',
+    'django.core.cache.backends.locmem.LocMemCache',
+)
+
+# Tests run with a cache of their own, see app.test_runner.
+TEST_RUNNER = 'app.test_runner.TestRunner'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -114,6 +188,12 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.TokenAuthentication',
     ],
+    # Token buckets of bank views per user and endpoint,
+    # see bank.throttling. Empty rate disables the limit.
+    'DEFAULT_THROTTLE_RATES': {
+        'bank_read': os.getenv('THROTTLE_READ_RATE', '600/min') or None,
+        'bank_write': os.getenv('THROTTLE_WRITE_RATE', '60/min') or None,
+    },
 }
 
 # Internationalization
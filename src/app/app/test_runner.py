@@ -0,0 +1,26 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Runs tests with a local memory cache of their own.
+
+    Tests clear the cache between each other, which must not flush
+    throttle buckets, ETag versions and events of a server sharing
+    the configured cache, e.g. Redis of the docker compose setup.
+    """
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_settings = override_settings(
+            CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            }},
+            # ETags need a shared cache, tests enable them explicitly.
+            ETAGS_ENABLED=False,
+        )
+        self.cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache_settings.disable()
+        super().teardown_test_environment(**kwargs)
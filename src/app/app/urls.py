@@ -16,6 +16,8 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from bank.metrics import metrics
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('dj-rest-auth/', include('dj_rest_auth.urls')),
@@ -24,4 +26,5 @@ urlpatterns = [
         include('dj_rest_auth.registration.urls')
     ),
     path('api/bank/', include('bank.urls', namespace='api')),
+    path('metrics', metrics, name='metrics'),
 ]
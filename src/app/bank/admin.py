@@ -1,10 +1,66 @@
 from django.contrib import admin
 
+from bank.services import set_balance_shards
 from bank.models import (Customer, Account,
-                         Replenishment, Transfer)
+                         Replenishment, Transfer, LedgerEntry,
+                         IdempotencyKey, BalanceSnapshot, ArchivedHistory)
 
 
-admin.site.register(Customer)
-admin.site.register(Account)
-admin.site.register(Replenishment)
-admin.site.register(Transfer)
+@admin.register(Customer)
+class CustomerAdmin(admin.ModelAdmin):
+    list_select_related = ('user', )
+
+
+@admin.register(Account)
+class AccountAdmin(admin.ModelAdmin):
+    # Account.__str__ reads the related user.
+    list_select_related = ('user', )
+    list_filter = ('balance_shards', )
+    readonly_fields = ('balance', 'balance_shards', )
+    actions = ('enable_hot_mode', 'disable_hot_mode', )
+
+    hot_mode_shards = 8
+
+    @admin.action(description="Spread credits over balance shards")
+    def enable_hot_mode(self, request, queryset):
+        for account in queryset:
+            set_balance_shards(account, self.hot_mode_shards)
+
+    @admin.action(description="Credit account balance directly")
+    def disable_hot_mode(self, request, queryset):
+        for account in queryset:
+            set_balance_shards(account, 0)
+
+
+@admin.register(Replenishment)
+class ReplenishmentAdmin(admin.ModelAdmin):
+    # Replenishment.__str__ reads the related account and its user.
+    list_select_related = ('account__user', )
+
+
+@admin.register(Transfer)
+class TransferAdmin(admin.ModelAdmin):
+    # Transfer.__str__ reads both related accounts.
+    list_select_related = ('from_account', 'to_account')
+
+
+@admin.register(LedgerEntry)
+class LedgerEntryAdmin(admin.ModelAdmin):
+    # The ledger is append-only, entries are written by bank.services.
+    list_display = ('created_at', 'account', 'kind', 'amount')
+    list_filter = ('kind', )
+    list_select_related = ('account__user', )
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+admin.site.register(IdempotencyKey)
+admin.site.register(BalanceSnapshot)
+admin.site.register(ArchivedHistory)
@@ -0,0 +1,254 @@
+"""
+Async versions of the most frequent read endpoints and transfer creation.
+
+These are plain Django async views using the async ORM, so under an
+ASGI server a worker is not blocked while it waits for the database.
+DRF 3.13 views are sync only, which is why authentication, errors and
+pagination mirror DRF behaviour here instead of reusing it.
+"""
+import base64
+import functools
+import json
+import math
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import JsonResponse
+from django.utils.dateparse import parse_datetime
+
+from rest_framework import exceptions, status
+
+from .authentication import aauthenticate_token
+from .idempotency import IDEMPOTENCY_KEY_HEADER, idempotent_create
+from .pagination import HistoryCursorPagination
+from .serializers import TransferSerializer
+from .throttling import method_scope, scope_wait
+from .services import (
+    CENT,
+    annotate_replenishment_summary,
+    annotate_total_balance,
+    get_all_user_transfers,
+    get_user_accounts,
+)
+
+ACCOUNT_FIELDS = (
+    'id',
+    'created_at',
+    'total_balance',
+    'replenishments_count',
+    'replenishments_total',
+)
+
+TRANSFER_FIELDS = (
+    'id',
+    'created_at',
+    'from_account',
+    'to_account',
+    'amount',
+    'status',
+)
+
+
+def error_response(detail, status):
+    return JsonResponse({"detail": detail}, status=status)
+
+
+def async_api_view(**endpoints):
+    """
+    Decorator for async views with token authentication.
+
+    Takes the allowed HTTP methods with the DRF view action doing
+    the same, e.g. `GET='AccountView.list'`. Sets request.user to the
+    token owner and returns DRF-like 401, 405 and 429 responses.
+    Requests share the throttle bucket of the DRF action, so the async
+    views do not give clients a second budget.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in endpoints:
+                return error_response(
+                    f'Method "{request.method}" not allowed.', 405
+                )
+
+            auth = request.headers.get('Authorization', '').split()
+            if len(auth) != 2 or auth[0].lower() != 'token':
+                return error_response(
+                    "Authentication credentials were not provided.", 401
+                )
+            user = await aauthenticate_token(auth[1])
+            if user is None:
+                return error_response("Invalid token.", 401)
+
+            request.user = user
+            wait = await sync_to_async(scope_wait)(
+                method_scope(request.method), endpoints[request.method],
+                user.pk
+            )
+            if wait:
+                response = error_response(
+                    exceptions.Throttled(wait).detail, 429
+                )
+                response['Retry-After'] = str(math.ceil(wait))
+                return response
+            return await view(request, *args, **kwargs)
+
+        # csrf_exempt is not async-aware in Django 4.1.
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+def json_response(data, status=200):
+    return JsonResponse(
+        data, status=status, encoder=DjangoJSONEncoder, safe=False
+    )
+
+
+def encode_cursor(row) -> str:
+    value = f"{row['created_at'].isoformat()}|{row['id']}"
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    try:
+        created_at, pk = base64.urlsafe_b64decode(
+            cursor.encode()
+        ).decode().split('|')
+        # Invalid dates, e.g. month 13, raise instead of returning None.
+        created_at = parse_datetime(created_at)
+        pk = uuid.UUID(pk)
+    except ValueError:
+        return None
+    if created_at is None:
+        return None
+    return created_at, pk
+
+
+def account_row(row):
+    # Shown balance includes balance shards of hot accounts.
+    row['balance'] = row.pop('total_balance').quantize(CENT)
+    return row
+
+
+def user_accounts(user):
+    return annotate_total_balance(get_user_accounts(user))
+
+
+@async_api_view(GET='AccountView.list')
+async def account_list(request):
+    accounts = annotate_replenishment_summary(
+        user_accounts(request.user)
+    ).values(*ACCOUNT_FIELDS)
+    return json_response([account_row(row) async for row in accounts])
+
+
+@async_api_view(GET='AccountView.retrieve')
+async def account_detail(request, pk):
+    accounts = annotate_replenishment_summary(
+        user_accounts(request.user)
+    ).values(*ACCOUNT_FIELDS)
+    account = await accounts.filter(pk=pk).afirst()
+    if account is None:
+        return error_response("Not found.", 404)
+    return json_response(account_row(account))
+
+
+@async_api_view(GET='AccountView.balance')
+async def account_balance(request, pk):
+    account = await user_accounts(request.user).filter(
+        pk=pk
+    ).values('id', 'total_balance').afirst()
+    if account is None:
+        return error_response("Not found.", 404)
+    return json_response(account_row(account))
+
+
+def create_transfer(request, data):
+    serializer = TransferSerializer(data=data, context={'request': request})
+    serializer.is_valid(raise_exception=True)
+    serializer.save()
+    return status.HTTP_201_CREATED, serializer.data
+
+
+def create_idempotent_transfer(request, data):
+    """Creates a transfer once per Idempotency-Key like TransferView."""
+    if not request.headers.get(IDEMPOTENCY_KEY_HEADER):
+        return *create_transfer(request, data), False
+    return idempotent_create(
+        request, data, lambda: create_transfer(request, data)
+    )
+
+
+@async_api_view(GET='TransferView.list', POST='TransferView.create')
+async def transfer_list(request):
+    """
+    Lists transfers of the user newest first or creates a transfer.
+
+    History uses keyset pagination on (created_at, id), with the same
+    page size parameters as HistoryCursorPagination.
+    """
+    if request.method == 'POST':
+        return await transfer_create(request)
+
+    pagination = HistoryCursorPagination
+    try:
+        page_size = min(
+            int(request.GET.get(
+                pagination.page_size_query_param, pagination.page_size
+            )),
+            pagination.max_page_size
+        )
+    except ValueError:
+        page_size = pagination.page_size
+    # DRF falls back to the default for sizes below 1 as well.
+    if page_size < 1:
+        page_size = pagination.page_size
+
+    transfers = get_all_user_transfers(request.user).order_by(
+        '-created_at', '-id'
+    )
+    cursor = request.GET.get('cursor')
+    if cursor:
+        position = decode_cursor(cursor)
+        if position is None:
+            return error_response("Invalid cursor", 404)
+        created_at, pk = position
+        transfers = transfers.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+        )
+
+    rows = [
+        row async for row in
+        transfers.values(*TRANSFER_FIELDS)[:page_size + 1]
+    ]
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1])
+    return json_response({"next": next_cursor, "results": rows})
+
+
+async def transfer_create(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return error_response("JSON parse error.", 400)
+
+    # Validation and make_transfer run in one worker thread, so the
+    # whole write path keeps using sync ORM and transaction.atomic().
+    try:
+        status_code, body, replayed = await sync_to_async(
+            create_idempotent_transfer
+        )(request, data)
+    except exceptions.ValidationError as e:
+        return json_response({"detail": e.detail}, status=400)
+    except ValidationError as e:
+        return json_response({"detail": e.message_dict}, status=400)
+    response = json_response(body, status=status_code)
+    if replayed:
+        response['Idempotent-Replayed'] = 'true'
+    return response
@@ -0,0 +1,101 @@
+import hashlib
+import pickle
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .cache import LocalTTLCache
+from .routers import use_primary
+
+# Seconds a resolved token stays in the shared cache.
+TOKEN_CACHE_TIMEOUT = getattr(settings, 'TOKEN_CACHE_TIMEOUT', 60 * 5)
+
+token_cache = LocalTTLCache(
+    maxsize=getattr(settings, 'TOKEN_CACHE_LOCAL_MAXSIZE', 10000),
+    ttl=getattr(settings, 'TOKEN_CACHE_LOCAL_TIMEOUT', 10)
+)
+
+
+def token_cache_key(key: str) -> str:
+    """Returns cache key of the token without exposing the token itself."""
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return f'bank:token:{digest}'
+
+
+def invalidate_token(key: str):
+    """Removes the token from both cache tiers."""
+    cache_key = token_cache_key(key)
+    token_cache.delete(cache_key)
+    cache.delete(cache_key)
+
+
+async def aauthenticate_token(key: str):
+    """
+    Async version of CachedTokenAuthentication.authenticate_credentials.
+
+    Returns the user owning the token or None if the token is invalid
+    or the user is inactive.
+    """
+    cache_key = token_cache_key(key)
+
+    pickled = token_cache.get(cache_key)
+    if pickled is not None:
+        credentials = pickle.loads(pickled)
+    else:
+        credentials = await cache.aget(cache_key)
+        if credentials is None:
+            try:
+                with use_primary():
+                    token = await Token.objects.select_related(
+                        'user'
+                    ).aget(key=key)
+            except Token.DoesNotExist:
+                return None
+            credentials = (token.user, token)
+            await cache.aset(cache_key, credentials, TOKEN_CACHE_TIMEOUT)
+        token_cache.set(cache_key, pickle.dumps(credentials))
+
+    user, token = credentials
+    if not user.is_active:
+        return None
+    return user
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that caches token to user resolution.
+
+    Tokens are looked up in a per-process LRU first, then in Django's
+    cache, and only then in the database. Entries are invalidated by
+    signals on logout (token deletion) and on user changes, so a
+    deactivated user is rejected at the latest after the local
+    timeout in other worker processes.
+    """
+    def authenticate_credentials(self, key):
+        cache_key = token_cache_key(key)
+
+        # Local tier keeps pickled credentials, so every request gets
+        # its own user instance instead of one shared between threads.
+        pickled = token_cache.get(cache_key)
+        if pickled is not None:
+            credentials = pickle.loads(pickled)
+        else:
+            credentials = cache.get(cache_key)
+            if credentials is None:
+                # A lagging replica would cache a token deleted on logout.
+                with use_primary():
+                    credentials = super().authenticate_credentials(key)
+                cache.set(cache_key, credentials, TOKEN_CACHE_TIMEOUT)
+            token_cache.set(cache_key, pickle.dumps(credentials))
+
+        user, token = credentials
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        return credentials
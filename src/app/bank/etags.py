@@ -0,0 +1,55 @@
+import functools
+import hashlib
+
+from django.conf import settings
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+
+from .routers import use_primary
+from .services import get_version
+
+
+def resource_etag(resource: str):
+    """
+    Returns ETag function of views showing the resource of the user.
+
+    The ETag is a hash of the user, the resource version, the full path
+    and the renderer format, so it changes whenever the resource does
+    and differs between representations of it. Versions are kept in
+    the cache, so without ETAGS_ENABLED, i.e. a cache shared by all
+    workers, no ETag is sent.
+    """
+    def etag(request, *args, **kwargs) -> str | None:
+        if not getattr(settings, 'ETAGS_ENABLED', False):
+            return None
+        version = get_version(resource, request.user.pk)
+        value = (
+            f'{request.user.pk}:{version}:{request.get_full_path()}:'
+            f'{request.accepted_renderer.format}'
+        )
+        return hashlib.sha256(value.encode()).hexdigest()[:32]
+    return etag
+
+
+def conditional_get(resource: str):
+    """
+    Decorator of view methods answering GET requests with an ETag.
+
+    Requests with a matching `If-None-Match` get 304 Not Modified
+    from the cached version alone, before the database is queried
+    or anything is serialized. With ETAGS_ENABLED the view reads from
+    the primary database: the version is bumped after commit, so data
+    of a lagging replica would be tagged with the new version and
+    answered with 304 until the next change.
+    """
+    def decorator(view):
+        view = condition(etag_func=resource_etag(resource))(view)
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not getattr(settings, 'ETAGS_ENABLED', False):
+                return view(request, *args, **kwargs)
+            with use_primary():
+                return view(request, *args, **kwargs)
+        return wrapper
+    return method_decorator(decorator)
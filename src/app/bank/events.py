@@ -0,0 +1,263 @@
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import NamedTuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+# Events are kept in the cache this long for other worker processes.
+EVENT_CACHE_TIMEOUT = 60
+
+EVENT_COUNTER_TIMEOUT = 60 * 60 * 24
+
+# Newest events of a user looked at in one poll of the cache.
+MAX_POLLED_EVENTS = 100
+
+# Seconds an event numbered but missing from the cache is waited for.
+MISSING_EVENT_TIMEOUT = 1.0
+
+
+class Event(NamedTuple):
+    id: int
+    kind: str
+    data: dict
+
+
+class Subscription:
+    """
+    Queue of events of a user consumed by one stream.
+
+    Events that do not fit into the queue of a slow client are dropped
+    and the subscription is marked as overflowed, so the stream can
+    tell the client to reload its state.
+    """
+    def __init__(self, user_id, maxsize: int):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def put(self, event: Event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class EventHub:
+    """
+    In-process fan-out of user events to subscriptions.
+
+    Events may be dispatched from any thread, they are handed over
+    to the event loop of every subscription of the user.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+        self._listener = None
+
+    def subscribe(self, user_id) -> Subscription:
+        """
+        Subscribes to events of the user.
+
+        Should be called in the event loop consuming the events.
+        Starts listening to the broker if this loop does not yet.
+        """
+        subscription = Subscription(
+            user_id, getattr(settings, 'EVENTS_QUEUE_SIZE', 100)
+        )
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        listener = self._listener
+        if listener is None or listener.done() or \
+                listener.get_loop() is not subscription.loop:
+            self._listener = subscription.loop.create_task(
+                get_broker().listen(self)
+            )
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is None:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.user_id]
+
+    def user_ids(self) -> list:
+        """Returns users with subscriptions."""
+        with self._lock:
+            return list(self._subscriptions)
+
+    def dispatch(self, user_id, event: Event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(
+                    subscription.put, event
+                )
+            except RuntimeError:
+                # Event loop of an abandoned subscription is closed.
+                self.unsubscribe(subscription)
+
+
+hub = EventHub()
+
+
+class LocalBroker:
+    """
+    Delivers events straight to the hub of the current process.
+
+    Enough for a single worker process, streams served by other
+    processes do not get the events. Neither do they get events of
+    transfers executed by run_transfer_workers, which always runs
+    in processes of its own.
+    """
+    def __init__(self):
+        self._ids = itertools.count(1)
+
+    def publish(self, user_id, kind: str, data: dict):
+        hub.dispatch(user_id, Event(next(self._ids), kind, data))
+
+    def subscribe(self, user_id):
+        pass
+
+    async def listen(self, hub: EventHub):
+        pass
+
+
+class CacheBroker:
+    """
+    Passes events between worker processes through Django's cache.
+
+    A stand-in for a pub/sub server needing nothing but the shared
+    cache. Every event of a user is numbered by a counter of the user
+    and stored under its own key for EVENT_CACHE_TIMEOUT. The hub of
+    every process polls counters of all its subscribed users with one
+    `get_many` and fans new events out. Needs a cache backend with
+    atomic increments shared by workers, e.g. memcached or Redis.
+    """
+    def __init__(self):
+        # Number of the last dispatched event per user.
+        self._last = {}
+        # Time when a missing event was first seen per user and number.
+        self._missing = {}
+        # Serializes subscribe and poll running in different threads.
+        self._lock = threading.Lock()
+
+    def counter_key(self, user_id) -> str:
+        return f'bank:events:{user_id}'
+
+    def event_key(self, user_id, number: int) -> str:
+        return f'bank:events:{user_id}:{number}'
+
+    def publish(self, user_id, kind: str, data: dict):
+        counter = self.counter_key(user_id)
+        try:
+            number = cache.incr(counter)
+        except ValueError:
+            cache.add(counter, 0, EVENT_COUNTER_TIMEOUT)
+            number = cache.incr(counter)
+        cache.set(
+            self.event_key(user_id, number), (kind, data),
+            EVENT_CACHE_TIMEOUT
+        )
+
+    def subscribe(self, user_id):
+        """
+        Starts dispatching events of the user published from now on.
+
+        Should be called after the subscription is added to the hub.
+        """
+        with self._lock:
+            self._last.setdefault(
+                user_id, cache.get(self.counter_key(user_id), 0)
+            )
+
+    async def listen(self, hub: EventHub):
+        """Polls the cache until the hub has no subscriptions."""
+        poll = sync_to_async(self.poll, thread_sensitive=False)
+        while hub.user_ids():
+            await poll(hub)
+            await asyncio.sleep(
+                getattr(settings, 'EVENTS_POLL_INTERVAL', 0.5)
+            )
+
+    def poll(self, hub: EventHub):
+        """Dispatches events published since the previous poll."""
+        with self._lock:
+            self._poll(hub)
+
+    def _poll(self, hub: EventHub):
+        user_ids = hub.user_ids()
+        for user_id in set(self._last) - set(user_ids):
+            del self._last[user_id]
+        self._missing = {
+            key: since for key, since in self._missing.items()
+            if key[0] in self._last
+        }
+        counters = cache.get_many(
+            [self.counter_key(user_id) for user_id in user_ids]
+        )
+        now = time.monotonic()
+        for user_id in user_ids:
+            number = counters.get(self.counter_key(user_id), 0)
+            # Users not passed to subscribe start from the first poll.
+            last = self._last.setdefault(user_id, number)
+            if number < last:
+                # Counter was lost from the cache and started anew.
+                last = 0
+            numbers = range(max(last, number - MAX_POLLED_EVENTS) + 1,
+                            number + 1)
+            events = cache.get_many(
+                [self.event_key(user_id, n) for n in numbers]
+            )
+            for n in numbers:
+                key = self.event_key(user_id, n)
+                if key not in events:
+                    # Event is stored right after it gets its number.
+                    since = self._missing.setdefault((user_id, n), now)
+                    if now - since < MISSING_EVENT_TIMEOUT:
+                        break
+                else:
+                    hub.dispatch(user_id, Event(n, *events[key]))
+                self._missing.pop((user_id, n), None)
+                last = n
+            self._last[user_id] = last
+
+
+brokers = {
+    'local': LocalBroker(),
+    'cache': CacheBroker(),
+}
+
+
+def get_broker():
+    """Returns broker selected by EVENTS_BROKER."""
+    return brokers[getattr(settings, 'EVENTS_BROKER', 'local')]
+
+
+def publish_event(user_ids, kind: str, data: dict):
+    """
+    Publishes an event to streams of the users after commit.
+
+    Failures are logged and do not affect the committed changes.
+    """
+    def publish():
+        broker = get_broker()
+        for user_id in set(user_ids):
+            try:
+                broker.publish(user_id, kind, data)
+            except Exception:
+                logger.exception("Failed to publish %s event.", kind)
+    transaction.on_commit(publish)
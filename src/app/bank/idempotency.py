@@ -0,0 +1,119 @@
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_KEY_HEADER = 'Idempotency-Key'
+
+# Stored responses older than this are ignored and purged.
+IDEMPOTENCY_KEY_TTL = timedelta(
+    seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 60 * 60 * 24)
+)
+
+
+def request_fingerprint(request, data) -> str:
+    """Returns a hash identifying request method, path and parsed body."""
+    body = json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder)
+    payload = f'{request.method} {request.path} {body}'
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def purge_expired_idempotency_keys() -> int:
+    """Deletes stored responses older than the TTL."""
+    cutoff = timezone.now() - IDEMPOTENCY_KEY_TTL
+    deleted, _ = IdempotencyKey.objects.filter(
+        created_at__lt=cutoff
+    ).delete()
+    return deleted
+
+
+def idempotent_create(request, data, create) -> tuple[int, dict, bool]:
+    """
+    Runs create once per user and Idempotency-Key of the request.
+
+    The first request with a key stores the status and body returned
+    by create, and repeated requests get the stored response from one
+    indexed lookup without running create again. The key row is
+    inserted in the same transaction as the created objects, so
+    a concurrent duplicate blocks on the unique index until the first
+    request finishes. Failed requests raise out of create, are rolled
+    back together with their key and can be retried.
+
+    Shared by the DRF create actions and the async transfer view.
+    Returns response status, body and whether it was replayed.
+    """
+    key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+    if len(key) > IdempotencyKey._meta.get_field('key').max_length:
+        return (
+            status.HTTP_400_BAD_REQUEST,
+            {"detail": f"{IDEMPOTENCY_KEY_HEADER} is too long."},
+            False
+        )
+
+    fingerprint = request_fingerprint(request, data)
+    with transaction.atomic():
+        record, created = IdempotencyKey.objects.get_or_create(
+            user=request.user,
+            key=key,
+            defaults={'fingerprint': fingerprint}
+        )
+        if not created and \
+                record.created_at < timezone.now() - IDEMPOTENCY_KEY_TTL:
+            record.delete()
+            record = IdempotencyKey.objects.create(
+                user=request.user, key=key, fingerprint=fingerprint
+            )
+            created = True
+
+        if not created:
+            if record.fingerprint != fingerprint:
+                return (
+                    status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    {"detail": f"{IDEMPOTENCY_KEY_HEADER} was already used "
+                               f"for a different request."},
+                    False
+                )
+            return record.response_status, record.response_body, True
+
+        record.response_status, record.response_body = create()
+        record.save(update_fields=['response_status', 'response_body'])
+        return record.response_status, record.response_body, False
+
+
+class IdempotentCreateMixin:
+    """
+    Makes create action idempotent when Idempotency-Key header is sent.
+
+    See idempotent_create.
+    """
+    def create(self, request, *args, **kwargs):
+        if not request.headers.get(IDEMPOTENCY_KEY_HEADER):
+            return super().create(request, *args, **kwargs)
+
+        responses = []
+
+        def create():
+            response = super(IdempotentCreateMixin, self).create(
+                request, *args, **kwargs
+            )
+            responses.append(response)
+            return response.status_code, response.data
+
+        status_code, body, replayed = idempotent_create(
+            request, request.data, create
+        )
+        if responses:
+            return responses[0]
+        response = Response(body, status=status_code)
+        if replayed:
+            response['Idempotent-Replayed'] = 'true'
+        return response
@@ -0,0 +1,47 @@
+import secrets
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+_lock = threading.Lock()
+# Last 60-bit timestamp of milliseconds and sub-millisecond fraction.
+_last_timestamp = 0
+
+
+def uuid7() -> uuid.UUID:
+    """
+    Returns a time-ordered UUID in the version 7 layout of RFC 9562.
+
+    The first 48 bits are the Unix time in milliseconds, followed by
+    12 bits of sub-millisecond time and 62 random bits, so ids sort by
+    creation time as both UUIDs and their hex strings. Within a process
+    the timestamp is bumped if the clock did not advance, so ids are
+    strictly increasing.
+    """
+    global _last_timestamp
+    milliseconds, remainder = divmod(time.time_ns(), 1_000_000)
+    timestamp = milliseconds << 12 | remainder * 4096 // 1_000_000
+    with _lock:
+        timestamp = _last_timestamp = max(timestamp, _last_timestamp + 1)
+    return uuid.UUID(int=(
+        timestamp >> 12 << 80
+        | 0x7 << 76
+        | (timestamp & 0xfff) << 64
+        | 0b10 << 62
+        | secrets.randbits(62)
+    ))
+
+
+def new_id() -> uuid.UUID:
+    """
+    Returns primary key of a new bank model row.
+
+    Ids are random uuid4 by default. With TIME_ORDERED_IDS they are
+    uuid7, so new rows are appended to the end of primary key indexes
+    instead of random pages. Such ids reveal their creation time.
+    """
+    if getattr(settings, 'TIME_ORDERED_IDS', False):
+        return uuid7()
+    return uuid.uuid4()
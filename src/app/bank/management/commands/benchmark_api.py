@@ -0,0 +1,306 @@
+import json
+import platform
+import random
+import statistics
+import time
+import uuid
+from collections import defaultdict
+from contextlib import ExitStack
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import (
+    CaptureQueriesContext,
+    override_settings,
+    setup_databases,
+    teardown_databases,
+)
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from bank.models import Account
+from bank.seeding import seed_partition
+
+
+def seed(users, accounts_per_user, transfers, random_seed):
+    """
+    Writes benchmark users with tokens, accounts and transfers.
+
+    Usernames get a prefix unique to the run, so runs with --in-place
+    can be repeated on the same database.
+    Returns a list of (token key, account ids) of every user.
+    """
+    prefix = f'benchmark-{uuid.uuid4().hex[:8]}-'
+    seed_partition(
+        0, users, accounts_per_user, transfers, make_password(None),
+        prefix=prefix, random_seed=random_seed
+    )
+    created_users = get_user_model().objects.filter(
+        username__startswith=prefix
+    )
+    tokens = Token.objects.bulk_create(
+        Token(user=user, key=Token.generate_key()) for user in created_users
+    )
+    account_ids = defaultdict(list)
+    for user_id, pk in Account.objects.filter(
+            user__in=created_users).values_list('user_id', 'pk'):
+        account_ids[user_id].append(str(pk))
+    return [(token.key, account_ids[token.user_id]) for token in tokens]
+
+
+def summarize(timings, queries, errors, elapsed):
+    """
+    Returns latency percentiles, throughput and queries of a scenario.
+
+    Timings and queries are of successful requests only.
+    """
+    ms = [t * 1000 for t in timings]
+    percentiles = statistics.quantiles(ms, n=100, method='inclusive')
+    return {
+        'requests': len(ms) + errors,
+        'errors': errors,
+        'mean_ms': round(statistics.fmean(ms), 3),
+        'p50_ms': round(percentiles[49], 3),
+        'p95_ms': round(percentiles[94], 3),
+        'p99_ms': round(percentiles[98], 3),
+        'max_ms': round(max(ms), 3),
+        'throughput_rps': round(len(ms) / elapsed, 1),
+        'queries_per_request': round(statistics.fmean(queries), 2),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds users, accounts and transfers and measures latency, "
+        "throughput and queries of the bank API hot paths. Runs in a "
+        "temporary test database unless --in-place is given and prints "
+        "results as JSON."
+    )
+
+    scenarios = (
+        'account_list',
+        'transfer_create',
+        'replenishment_create',
+        'transfer_history',
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--accounts-per-user', type=int, default=2)
+        parser.add_argument(
+            '--transfers',
+            type=int,
+            default=10000,
+            help="Number of seeded transfers between random accounts.",
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help="Number of measured requests per scenario.",
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=10,
+            help="Number of unmeasured requests per scenario.",
+        )
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            choices=self.scenarios,
+            help="Scenario to run, can be repeated. Defaults to all.",
+        )
+        parser.add_argument(
+            '--random-seed',
+            type=int,
+            default=0,
+            help="Seed making generated data and requests reproducible.",
+        )
+        parser.add_argument(
+            '--in-place',
+            action='store_true',
+            help=(
+                "Seed and measure the configured database instead of a "
+                "temporary test database. Seeded data is left in place."
+            ),
+        )
+        parser.add_argument('--output', help="File to write results to.")
+        parser.add_argument(
+            '--baseline',
+            help=(
+                "Results of an earlier run. Fails if p95 latency grew "
+                "more than --tolerance or a scenario makes more queries."
+            ),
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.2,
+            help="Allowed relative growth of p95 latency.",
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 2:
+            raise CommandError("--requests should be at least 2.")
+        if options['users'] * options['accounts_per_user'] < 2:
+            raise CommandError("At least two accounts are needed.")
+
+        with ExitStack() as stack:
+            stack.enter_context(override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+                # Throttled requests would be measured instead of the API.
+                REST_FRAMEWORK={
+                    **settings.REST_FRAMEWORK,
+                    'DEFAULT_THROTTLE_RATES': dict.fromkeys(
+                        settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']
+                    ),
+                },
+            ))
+            if not options['in_place']:
+                old_config = setup_databases(
+                    verbosity=0, interactive=False, aliases={'default'}
+                )
+                stack.callback(teardown_databases, old_config, verbosity=0)
+            results = self.run(options)
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        self.stdout.write(output)
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            regressions = self.compare(
+                results, baseline, options['tolerance']
+            )
+            if regressions:
+                raise CommandError(
+                    "Performance regressed:\n" + "\n".join(regressions)
+                )
+
+    def run(self, options):
+        rng = random.Random(options['random_seed'])
+        started = time.perf_counter()
+        users = seed(
+            options['users'],
+            options['accounts_per_user'],
+            options['transfers'],
+            options['random_seed']
+        )
+        seeded = time.perf_counter() - started
+        if options['verbosity'] > 1:
+            self.stderr.write(f"Seeded data in {seeded:.1f}s")
+
+        results = {}
+        for name in options['scenario'] or self.scenarios:
+            scenario = getattr(self, name)
+            for _ in range(options['warmup']):
+                scenario(rng, users)
+            timings, queries, errors = [], [], 0
+            started = time.perf_counter()
+            for _ in range(options['requests']):
+                with ExitStack() as stack:
+                    captured = [
+                        stack.enter_context(CaptureQueriesContext(conn))
+                        for conn in connections.all()
+                    ]
+                    request_started = time.perf_counter()
+                    response = scenario(rng, users)
+                    elapsed = time.perf_counter() - request_started
+                if response.status_code >= 400:
+                    # Fast failures would skew latency and queries.
+                    errors += 1
+                    continue
+                timings.append(elapsed)
+                queries.append(sum(len(c) for c in captured))
+            if len(timings) < 2:
+                raise CommandError(
+                    f"{name}: {errors} of {options['requests']} "
+                    "requests failed."
+                )
+            results[name] = summarize(
+                timings, queries, errors, time.perf_counter() - started
+            )
+            if options['verbosity'] > 1:
+                self.stderr.write(f"{name}: {results[name]}")
+
+        return {
+            'environment': {
+                'database': connection.vendor,
+                'django': django.get_version(),
+                'python': platform.python_version(),
+            },
+            'config': {
+                key: options[key] for key in (
+                    'users',
+                    'accounts_per_user',
+                    'transfers',
+                    'requests',
+                    'warmup',
+                    'random_seed',
+                )
+            },
+            'seed_seconds': round(seeded, 3),
+            'scenarios': results,
+        }
+
+    def compare(self, results, baseline, tolerance):
+        """Returns descriptions of scenarios slower than in baseline."""
+        regressions = []
+        for name, result in results['scenarios'].items():
+            before = baseline.get('scenarios', {}).get(name)
+            if before is None:
+                continue
+            if result['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+                regressions.append(
+                    f"{name}: p95 {result['p95_ms']}ms, "
+                    f"baseline {before['p95_ms']}ms"
+                )
+            if result['queries_per_request'] > before['queries_per_request']:
+                regressions.append(
+                    f"{name}: {result['queries_per_request']} queries, "
+                    f"baseline {before['queries_per_request']}"
+                )
+        return regressions
+
+    def client(self, rng, users):
+        key, account_ids = rng.choice(users)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {key}')
+        return client, account_ids
+
+    def account_list(self, rng, users):
+        client, _ = self.client(rng, users)
+        return client.get(reverse('api:account-list'))
+
+    def transfer_create(self, rng, users):
+        client, account_ids = self.client(rng, users)
+        from_account = to_account = rng.choice(account_ids)
+        while to_account == from_account:
+            _, to_account_ids = rng.choice(users)
+            to_account = rng.choice(to_account_ids)
+        return client.post(reverse('api:transfer-list'), {
+            'from_account': from_account,
+            'to_account': to_account,
+            'amount': '0.01',
+        })
+
+    def replenishment_create(self, rng, users):
+        client, account_ids = self.client(rng, users)
+        return client.post(reverse('api:replenishment-list'), {
+            'account': rng.choice(account_ids),
+            'amount': '10.00',
+        })
+
+    def transfer_history(self, rng, users):
+        client, _ = self.client(rng, users)
+        return client.get(reverse('api:transfer-list'))
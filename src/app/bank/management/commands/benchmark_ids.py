@@ -0,0 +1,139 @@
+import json
+import time
+from contextlib import ExitStack
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection, transaction
+from django.test.utils import (
+    override_settings,
+    setup_databases,
+    teardown_databases,
+)
+
+from bank.models import Account, Customer, LedgerEntry, Replenishment, Transfer
+from bank.seeding import seed_partition
+
+SEEDED_MODELS = (Customer, Account, Replenishment, Transfer, LedgerEntry)
+
+
+def primary_key_index_size(model) -> int | None:
+    """
+    Returns size in bytes of the model primary key index.
+
+    Sizes of all partitions are summed. Returns None if the database
+    does not report index sizes.
+    """
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # The partition tree of an index that is not partitioned
+            # is empty. sum() of bigint is numeric, read as Decimal.
+            cursor.execute(
+                "SELECT coalesce(sum(pg_relation_size("
+                "coalesce(tree.relid, conindid))), 0)::bigint "
+                "FROM pg_constraint "
+                "LEFT JOIN LATERAL pg_partition_tree(conindid) tree ON true "
+                "WHERE conrelid = %s::regclass AND contype = 'p'",
+                [table]
+            )
+        elif connection.vendor == 'sqlite':
+            # Needs SQLite built with the dbstat virtual table.
+            try:
+                cursor.execute(
+                    "SELECT sum(pgsize) FROM dbstat WHERE name = %s",
+                    [f'sqlite_autoindex_{table}_1']
+                )
+            except DatabaseError:
+                return None
+        else:
+            return None
+        return cursor.fetchone()[0]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares insert rate and primary key index size of random "
+        "(uuid4) and time-ordered (uuid7) ids by seeding the same data "
+        "into a temporary test database with each. Prints JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--accounts-per-user', type=int, default=2)
+        parser.add_argument('--transfers', type=int, default=100000)
+        parser.add_argument('--random-seed', type=int, default=0)
+        parser.add_argument(
+            '--in-place',
+            action='store_true',
+            help=(
+                "Seed the configured database instead of temporary test "
+                "databases. Seeded data is rolled back after measuring."
+            ),
+        )
+        parser.add_argument('--output', help="File to write results to.")
+
+    def handle(self, *args, **options):
+        password_hash = make_password(None)
+        results = {}
+        for name, time_ordered in (('uuid4', False), ('uuid7', True)):
+            with ExitStack() as stack:
+                if options['in_place']:
+                    stack.enter_context(transaction.atomic())
+                    stack.callback(transaction.set_rollback, True)
+                else:
+                    old_config = setup_databases(
+                        verbosity=0, interactive=False, aliases={'default'}
+                    )
+                    stack.callback(teardown_databases, old_config, verbosity=0)
+                stack.enter_context(
+                    override_settings(TIME_ORDERED_IDS=time_ordered)
+                )
+                results[name] = self.measure(options, password_hash)
+            if options['verbosity'] > 1:
+                self.stderr.write(f"{name}: {results[name]}")
+
+        output = json.dumps({
+            'environment': {
+                'database': connection.vendor,
+                'django': django.get_version(),
+            },
+            'config': {
+                key: options[key] for key in (
+                    'users', 'accounts_per_user', 'transfers', 'random_seed'
+                )
+            },
+            'results': results,
+            'uuid7_speedup': round(
+                results['uuid7']['rows_per_second']
+                / results['uuid4']['rows_per_second'], 3
+            ),
+        }, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        self.stdout.write(output)
+
+    def measure(self, options, password_hash):
+        started = time.perf_counter()
+        seed_partition(
+            0,
+            options['users'],
+            options['accounts_per_user'],
+            options['transfers'],
+            password_hash,
+            prefix='benchmark',
+            random_seed=options['random_seed']
+        )
+        seconds = time.perf_counter() - started
+        rows = sum(model.objects.count() for model in SEEDED_MODELS)
+        return {
+            'seconds': round(seconds, 3),
+            'rows': rows,
+            'rows_per_second': round(rows / seconds, 1),
+            'primary_key_index_bytes': {
+                model._meta.db_table: primary_key_index_size(model)
+                for model in SEEDED_MODELS
+            },
+        }
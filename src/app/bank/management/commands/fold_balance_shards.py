@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from bank.models import Account
+from bank.services import fold_balance_shards
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves money from balance shards of hot accounts to their "
+        "balances. Meant to run periodically."
+    )
+
+    def handle(self, *args, **options):
+        accounts = Account.objects.filter(shards__balance__gt=0).distinct()
+        folded = 0
+        for account in accounts.iterator():
+            fold_balance_shards(account)
+            folded += 1
+        self.stdout.write(f"Folded balance shards of {folded} accounts.")
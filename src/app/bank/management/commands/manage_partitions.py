@@ -0,0 +1,77 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from bank.partitioning import (
+    PARTITIONED_MODELS,
+    add_months,
+    archive_month,
+    create_partition,
+    history_months,
+    is_partitioned,
+    month_start,
+    partition_name,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates monthly partitions of replenishments and transfers "
+        "ahead of time and archives old months to gzipped CSV files. "
+        "Meant to run periodically, e.g. daily."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=3,
+            help="Number of future months that should have a partition.",
+        )
+        parser.add_argument(
+            '--keep-months',
+            type=int,
+            help=(
+                "Archive history older than this many months "
+                "before the current one. Nothing is archived if not given."
+            ),
+        )
+        parser.add_argument(
+            '--archive-dir',
+            default='archive',
+            help="Directory archived months are written to.",
+        )
+
+    def handle(self, *args, **options):
+        current = month_start(timezone.now())
+
+        for model in PARTITIONED_MODELS:
+            if not is_partitioned(model):
+                self.stdout.write(
+                    f"{model._meta.db_table} is not partitioned, "
+                    "only archiving applies."
+                )
+                continue
+            for months in range(options['months_ahead'] + 1):
+                month = add_months(current, months)
+                if create_partition(model, month):
+                    self.stdout.write(
+                        f"Created partition {partition_name(model, month)}."
+                    )
+
+        if options['keep_months'] is None:
+            return
+        if options['keep_months'] < 0:
+            raise CommandError("--keep-months should not be negative.")
+        os.makedirs(options['archive_dir'], exist_ok=True)
+        before = add_months(current, -options['keep_months'])
+        for model in PARTITIONED_MODELS:
+            for month in history_months(model, before):
+                try:
+                    path, count = archive_month(
+                        model, month, options['archive_dir']
+                    )
+                except ValueError as e:
+                    raise CommandError(e)
+                self.stdout.write(f"Archived {count} rows to {path}.")
@@ -0,0 +1,89 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from bank.models import Account
+from bank.services import (
+    account_id_ranges,
+    find_balance_mismatches,
+    repair_balance,
+)
+from bank.workers import init_worker
+
+
+class Command(BaseCommand):
+    help = (
+        "Checks that every account balance equals sum of replenishments "
+        "plus incoming transfers minus outgoing transfers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help="Number of accounts checked by one query.",
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help="Number of processes checking chunks in parallel.",
+        )
+        parser.add_argument(
+            '--repair',
+            action='store_true',
+            help="Set mismatched balances to the expected value.",
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        total = Account.objects.count()
+        ranges = list(account_id_ranges(options['chunk_size']))
+        started = time.monotonic()
+        checked = 0
+        mismatches = []
+
+        if options['workers'] > 1:
+            # Forked workers must not share the parent's connections.
+            connections.close_all()
+            with ProcessPoolExecutor(
+                    options['workers'], initializer=init_worker) as pool:
+                results = pool.map(
+                    find_balance_mismatches, *zip(*ranges)
+                )
+                for chunk_checked, chunk_mismatches in results:
+                    checked += chunk_checked
+                    mismatches.extend(chunk_mismatches)
+                    self.progress(checked, total, mismatches, started)
+        else:
+            for lower, upper in ranges:
+                chunk_checked, chunk_mismatches = find_balance_mismatches(
+                    lower, upper
+                )
+                checked += chunk_checked
+                mismatches.extend(chunk_mismatches)
+                self.progress(checked, total, mismatches, started)
+
+        for pk, balance, expected in mismatches:
+            self.stdout.write(
+                f"Account {pk}: balance {balance}, expected {expected}"
+            )
+            if options['repair']:
+                repaired = repair_balance(pk)
+                self.stdout.write(f"Account {pk}: repaired to {repaired}")
+
+        self.stdout.write(
+            f"Checked {checked} accounts, found {len(mismatches)} mismatches."
+        )
+
+    def progress(self, checked, total, mismatches, started):
+        if self.verbosity < 1:
+            return
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stderr.write(
+            f"{checked}/{total} accounts, {len(mismatches)} mismatches, "
+            f"{checked / elapsed:.0f} accounts/s"
+        )
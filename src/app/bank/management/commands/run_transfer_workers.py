@@ -0,0 +1,84 @@
+import multiprocessing
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+
+from bank.services import process_transfer_queue
+
+
+def work(batch_size, poll_interval, once):
+    """Processes queued transfers until stopped or, if once, until empty."""
+    try:
+        while True:
+            try:
+                processed = process_transfer_queue(batch_size)
+            except OperationalError:
+                # Batch was rolled back (lock timeout, deadlock,
+                # locked SQLite database) and is retried.
+                time.sleep(poll_interval)
+                continue
+            if not processed:
+                if once:
+                    return
+                time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Executes transfers queued with `Prefer: respond-async` "
+        "in a pool of worker processes. Event streams get the results "
+        "only with EVENTS_BROKER=cache and a cache shared with the "
+        "web workers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1)
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help="Number of transfers executed in one transaction.",
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help="Seconds to wait when the queue is empty.",
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="Exit when the queue is empty.",
+        )
+
+    def handle(self, *args, **options):
+        if getattr(settings, 'EVENTS_BROKER', 'local') != 'cache':
+            self.stderr.write(
+                "Event streams do not get transfers executed here, "
+                "set EVENTS_BROKER=cache with a shared cache."
+            )
+        worker_args = (
+            options['batch_size'], options['poll_interval'], options['once']
+        )
+        if options['workers'] == 1:
+            work(*worker_args)
+            return
+
+        # Forked workers must not share the parent's connections.
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(target=work, args=worker_args)
+            for _ in range(options['workers'])
+        ]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.join()
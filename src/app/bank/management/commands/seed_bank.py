@@ -0,0 +1,123 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from bank.seeding import seed_partition
+from bank.workers import init_worker
+
+
+def split(total: int, parts: int) -> list[int]:
+    """Splits total into parts differing by at most one."""
+    return [total // parts + (i < total % parts) for i in range(parts)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates users with customers, accounts, replenishments and "
+        "transfers with consistent balances for load testing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--accounts-per-user', type=int, default=2)
+        parser.add_argument('--transfers', type=int, default=100000)
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=365,
+            help="Transfers are spread over this many last days.",
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help=(
+                "Number of processes seeding separate ranges of users. "
+                "Transfers stay between accounts of the same range."
+            ),
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--password',
+            default='password',
+            help="Password of all generated users, hashed only once.",
+        )
+        parser.add_argument(
+            '--prefix',
+            default='seed',
+            help="Prefix of generated usernames, e.g. seed42@example.com.",
+        )
+        parser.add_argument('--random-seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        workers = options['workers']
+        if workers < 1:
+            raise CommandError("--workers should be at least 1.")
+        if workers > 1 and connection.vendor == 'sqlite':
+            raise CommandError(
+                "SQLite allows one writer at a time, use --workers 1."
+            )
+        users = split(options['users'], workers)
+        if options['transfers'] and (
+                min(users) * options['accounts_per_user'] < 2):
+            raise CommandError(
+                "Every worker needs at least two accounts for transfers."
+            )
+        if get_user_model().objects.filter(
+                username__startswith=options['prefix']).exists():
+            raise CommandError(
+                f"Users with prefix \"{options['prefix']}\" already exist, "
+                "use another --prefix."
+            )
+
+        password_hash = make_password(options['password'])
+        partitions = []
+        first_user = 0
+        for i, (partition_users, transfers) in enumerate(zip(
+                users, split(options['transfers'], workers))):
+            partitions.append((
+                first_user,
+                partition_users,
+                options['accounts_per_user'],
+                transfers,
+                password_hash,
+                options['prefix'],
+                options['days'],
+                options['random_seed'] + i,
+                options['batch_size'],
+            ))
+            first_user += partition_users
+
+        started = time.monotonic()
+        totals = [0, 0, 0]
+        if workers > 1:
+            # Forked workers must not share the parent's connections.
+            connections.close_all()
+            with ProcessPoolExecutor(
+                    workers, initializer=init_worker) as pool:
+                for result in pool.map(seed_partition, *zip(*partitions)):
+                    self.progress(totals, result, started)
+        else:
+            for partition in partitions:
+                self.progress(totals, seed_partition(*partition), started)
+
+        self.stdout.write(
+            f"Created {totals[0]} users, {totals[1]} accounts and "
+            f"{totals[2]} transfers in {time.monotonic() - started:.1f}s."
+        )
+
+    def progress(self, totals, result, started):
+        for i, value in enumerate(result):
+            totals[i] += value
+        if self.verbosity < 1:
+            return
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stderr.write(
+            f"{totals[0]} users, {totals[2]} transfers, "
+            f"{totals[2] / elapsed:.0f} transfers/s"
+        )
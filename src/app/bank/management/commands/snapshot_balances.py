@@ -0,0 +1,49 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from bank.services import take_balance_snapshots
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes a balance snapshot of every account. "
+        "Meant to run periodically, e.g. at the end of every day."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--at',
+            help="ISO 8601 datetime of the snapshot, defaults to now - lag.",
+        )
+        parser.add_argument(
+            '--lag',
+            type=int,
+            default=60,
+            help=(
+                "Seconds to stay behind now, so transactions that are "
+                "still running are not missed by the snapshot."
+            ),
+        )
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['at']:
+            try:
+                at = parse_datetime(options['at'])
+            except ValueError:
+                at = None
+            if at is None:
+                raise CommandError("--at should be an ISO 8601 datetime.")
+            if timezone.is_naive(at):
+                at = timezone.make_aware(at)
+        else:
+            at = timezone.now() - timedelta(seconds=options['lag'])
+
+        processed = take_balance_snapshots(at, options['chunk_size'])
+        self.stdout.write(
+            f"Wrote balance snapshots at {at.isoformat()} "
+            f"for {processed} accounts."
+        )
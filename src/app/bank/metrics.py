@@ -0,0 +1,114 @@
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.http import HttpResponse
+
+# Upper bounds in seconds of request duration histogram buckets.
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+def escape_label(value: str) -> str:
+    return (
+        str(value).replace('\\', '\\\\').replace('"', '\\"')
+        .replace('\n', '\\n')
+    )
+
+
+class MetricsRegistry:
+    """
+    In-process store of per-view request and database metrics.
+
+    Every worker process keeps its own registry, so every worker
+    has to be scraped separately.
+    """
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            # (view, method, status) -> [bucket counts..., +Inf count, sum]
+            self._requests = {}
+            # view -> [sampled requests, queries, seconds]
+            self._db = defaultdict(lambda: [0, 0, 0.0])
+
+    def observe_request(self, view: str, method: str, status: int,
+                        seconds: float):
+        labels = (view, method, str(status))
+        with self._lock:
+            series = self._requests.get(labels)
+            if series is None:
+                series = self._requests[labels] = (
+                    [0] * (len(self.buckets) + 1) + [0.0]
+                )
+            series[bisect_left(self.buckets, seconds)] += 1
+            series[-1] += seconds
+
+    def observe_db(self, view: str, queries: int, seconds: float):
+        with self._lock:
+            series = self._db[view]
+            series[0] += 1
+            series[1] += queries
+            series[2] += seconds
+
+    def render(self) -> str:
+        """Returns metrics in the Prometheus text exposition format."""
+        lines = [
+            '# HELP bank_request_duration_seconds Request duration by view.',
+            '# TYPE bank_request_duration_seconds histogram',
+        ]
+        with self._lock:
+            requests = {k: list(v) for k, v in self._requests.items()}
+            db = {k: list(v) for k, v in self._db.items()}
+
+        for (view, method, status), series in sorted(requests.items()):
+            labels = (
+                f'view="{escape_label(view)}",method="{method}",'
+                f'status="{status}"'
+            )
+            cumulative = 0
+            bounds = [str(b) for b in self.buckets] + ['+Inf']
+            for bound, count in zip(bounds, series):
+                cumulative += count
+                lines.append(
+                    'bank_request_duration_seconds_bucket'
+                    f'{{{labels},le="{bound}"}} {cumulative}'
+                )
+            lines.append(
+                f'bank_request_duration_seconds_sum{{{labels}}} {series[-1]}'
+            )
+            lines.append(
+                f'bank_request_duration_seconds_count{{{labels}}} '
+                f'{cumulative}'
+            )
+
+        for name, index, help_text in (
+            ('bank_db_sampled_requests_total', 0,
+             'Requests with measured database usage by view.'),
+            ('bank_db_queries_total', 1,
+             'Database queries of sampled requests by view.'),
+            ('bank_db_duration_seconds_total', 2,
+             'Database time of sampled requests by view.'),
+        ):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for view, series in sorted(db.items()):
+                lines.append(
+                    f'{name}{{view="{escape_label(view)}"}} {series[index]}'
+                )
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def metrics(request):
+    """Exposes the metrics of this worker process to Prometheus."""
+    return HttpResponse(
+        registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
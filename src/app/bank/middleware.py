@@ -0,0 +1,201 @@
+import heapq
+import logging
+import random
+import time
+from contextlib import ExitStack, nullcontext
+
+from asgiref.sync import (
+    iscoroutinefunction, markcoroutinefunction, sync_to_async
+)
+from django.conf import settings
+from django.db import connections
+
+from .metrics import registry
+from .routers import replica_aliases, use_primary
+
+logger = logging.getLogger(__name__)
+
+# Cookie marking clients that wrote recently and read from the primary.
+REPLICA_PIN_COOKIE = 'bank_use_primary'
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaPinningMiddleware:
+    """
+    Keeps read-after-write consistency when reads go to replicas.
+
+    Requests with unsafe methods read from the primary and mark the
+    client with a cookie, so its requests in the following
+    REPLICA_PIN_SECONDS also read from the primary instead of a replica
+    that may lag behind. Works in sync and async chains, use_primary()
+    is a context variable that sync_to_async passes on to ORM calls.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not replica_aliases():
+            return self.get_response(request)
+
+        with self.pinning(request):
+            response = self.get_response(request)
+        return self.pin(request, response)
+
+    async def __acall__(self, request):
+        if not replica_aliases():
+            return await self.get_response(request)
+
+        with self.pinning(request):
+            response = await self.get_response(request)
+        return self.pin(request, response)
+
+    def pinning(self, request):
+        """Returns context reading from the primary if client is pinned."""
+        if request.method not in SAFE_METHODS or \
+                REPLICA_PIN_COOKIE in request.COOKIES:
+            return use_primary()
+        return nullcontext()
+
+    def pin(self, request, response):
+        if request.method not in SAFE_METHODS:
+            response.set_cookie(
+                REPLICA_PIN_COOKIE, '1',
+                max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 5),
+                httponly=True, samesite='Lax'
+            )
+        return response
+
+
+class QueryTimer:
+    """Database execute wrapper counting and timing queries."""
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.count += 1
+            self.seconds += duration
+            self.queries.append((duration, sql))
+
+
+def view_name(view_func, method: str) -> str:
+    """Returns metric label of the view, e.g. AccountView.list."""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    # Viewsets map HTTP methods to actions.
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(method.lower())
+    if action is None:
+        return cls.__name__
+    return f'{cls.__name__}.{action}'
+
+
+class MetricsMiddleware:
+    """
+    Records latency of every request by resolved view.
+
+    A METRICS_SAMPLE_RATE fraction of requests also records the number
+    and time of database queries, which needs a wrapper around every
+    query, and logs the slowest queries of requests taking longer than
+    METRICS_SLOW_REQUEST_SECONDS. With METRICS_SERVER_TIMING the
+    timings are also sent in a Server-Timing header. Works in sync and
+    async chains.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        timer = self.sample()
+        with self.timing_queries(timer):
+            response = self.get_response(request)
+        return self.record(request, response, started, timer)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        timer = self.sample()
+        if timer is None:
+            response = await self.get_response(request)
+            return self.record(request, response, started, timer)
+        # Wrappers are added in the thread running ORM calls of async
+        # views, the connections used there are its own.
+        stack = await sync_to_async(self.timing_queries)(timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.record(request, response, started, timer)
+
+    def sample(self) -> QueryTimer | None:
+        """Returns a timer if queries of the request are sampled."""
+        if random.random() < getattr(settings, 'METRICS_SAMPLE_RATE', 0.1):
+            return QueryTimer()
+        return None
+
+    def timing_queries(self, timer: QueryTimer | None) -> ExitStack:
+        stack = ExitStack()
+        if timer is not None:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(timer))
+        return stack
+
+    def record(self, request, response, started: float,
+               timer: QueryTimer | None):
+        duration = time.perf_counter() - started
+        view = getattr(request, '_metrics_view', 'unresolved')
+        registry.observe_request(
+            view, request.method, response.status_code, duration
+        )
+        timing = [f'app;dur={duration * 1000:.1f}']
+        if timer is not None:
+            registry.observe_db(view, timer.count, timer.seconds)
+            timing.append(
+                f'db;dur={timer.seconds * 1000:.1f};'
+                f'desc="{timer.count} queries"'
+            )
+            if duration >= getattr(
+                    settings, 'METRICS_SLOW_REQUEST_SECONDS', 1.0):
+                self.log_slow_request(request, view, duration, timer)
+        if getattr(settings, 'METRICS_SERVER_TIMING', False):
+            response['Server-Timing'] = ', '.join(timing)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._metrics_view = view_name(view_func, request.method)
+
+    def log_slow_request(self, request, view, duration, timer):
+        slowest = heapq.nlargest(
+            getattr(settings, 'METRICS_SLOW_QUERIES', 5), timer.queries,
+            key=lambda query: query[0]
+        )
+        logger.warning(
+            "Slow request %s %s (%s): %.1fms, %d queries in %.1fms%s",
+            request.method, request.path, view, duration * 1000,
+            timer.count, timer.seconds * 1000,
+            ''.join(
+                f'\n  {seconds * 1000:.1f}ms {sql}'
+                for seconds, sql in slowest
+            )
+        )
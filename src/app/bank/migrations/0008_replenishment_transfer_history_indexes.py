@@ -0,0 +1,25 @@
+# Generated by Django 4.1.1 on 2026-10-18 10:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bank', '0007_transfer_negative_amount_transfer_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='replenishment',
+            index=models.Index(fields=['account', 'created_at'], name='replenishment_account_created'),
+        ),
+        migrations.AddIndex(
+            model_name='transfer',
+            index=models.Index(fields=['from_account', 'created_at'], name='transfer_from_created'),
+        ),
+        migrations.AddIndex(
+            model_name='transfer',
+            index=models.Index(fields=['to_account', 'created_at'], name='transfer_to_created'),
+        ),
+    ]
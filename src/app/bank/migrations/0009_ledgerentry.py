@@ -0,0 +1,78 @@
+# Generated by Django 4.1.1 on 2026-10-18 10:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+def backfill_ledger(apps, schema_editor):
+    """Writes ledger entries for the already existing history."""
+    LedgerEntry = apps.get_model('bank', 'LedgerEntry')
+    Replenishment = apps.get_model('bank', 'Replenishment')
+    Transfer = apps.get_model('bank', 'Transfer')
+    batch_size = 2000
+
+    entries = []
+    for replenishment in Replenishment.objects.iterator(chunk_size=batch_size):
+        entries.append(LedgerEntry(
+            account_id=replenishment.account_id,
+            amount=replenishment.amount,
+            kind='replenishment',
+            replenishment_id=replenishment.id,
+            created_at=replenishment.created_at,
+        ))
+        if len(entries) >= batch_size:
+            LedgerEntry.objects.bulk_create(entries)
+            entries = []
+
+    for transfer in Transfer.objects.iterator(chunk_size=batch_size):
+        entries.append(LedgerEntry(
+            account_id=transfer.from_account_id,
+            amount=-transfer.amount,
+            kind='transfer_out',
+            transfer_id=transfer.id,
+            created_at=transfer.created_at,
+        ))
+        entries.append(LedgerEntry(
+            account_id=transfer.to_account_id,
+            amount=transfer.amount,
+            kind='transfer_in',
+            transfer_id=transfer.id,
+            created_at=transfer.created_at,
+        ))
+        if len(entries) >= batch_size:
+            LedgerEntry.objects.bulk_create(entries)
+            entries = []
+
+    LedgerEntry.objects.bulk_create(entries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bank', '0008_replenishment_transfer_history_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('kind', models.CharField(choices=[('replenishment', 'Replenishment'), ('transfer_in', 'Transfer In'), ('transfer_out', 'Transfer Out')], max_length=16)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='bank.account')),
+                ('replenishment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='bank.replenishment')),
+                ('transfer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='bank.transfer')),
+            ],
+            options={
+                'verbose_name_plural': 'ledger entries',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='ledgerentry',
+            index=models.Index(fields=['account', 'created_at'], name='ledger_account_created'),
+        ),
+        migrations.RunPython(backfill_ledger, migrations.RunPython.noop),
+    ]
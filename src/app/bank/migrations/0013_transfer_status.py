@@ -0,0 +1,27 @@
+# Generated by Django 4.1.1 on 2026-10-18 10:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bank', '0012_account_balance_shards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transfer',
+            name='failure_reason',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='transfer',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('completed', 'Completed'), ('failed', 'Failed')], default='completed', max_length=16),
+        ),
+        migrations.AddIndex(
+            model_name='transfer',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['created_at'], name='transfer_pending_created'),
+        ),
+    ]
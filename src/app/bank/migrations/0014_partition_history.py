@@ -0,0 +1,179 @@
+# Generated by Django 4.1.1 on 2026-10-18 10:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+PARTITIONED_TABLES = ('bank_replenishment', 'bank_transfer')
+
+# Months after the current one that get a partition up front.
+MONTHS_AHEAD = 3
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def month_bound(month):
+    return f'{month:%Y-%m-%d} 00:00:00+00'
+
+
+def rebuild_table(schema_editor, table, partitioned):
+    """
+    Replaces table with a copy that is or is not partitioned by month.
+
+    Partitioned tables must include created_at in their primary key.
+    Indexes, check and foreign key constraints of the table are kept.
+
+    Writes to the table wait until the migration commits and reads wait
+    while the old table is dropped, the whole history is copied in
+    between. Rows are copied one month per statement, which keeps
+    statements small but not the lock short: run it in a maintenance
+    window sized by a test run on a copy of production data. Tables too
+    big for that should be partitioned online instead, e.g. by writing
+    to both tables and backfilling in batches, and this migration faked.
+    """
+    quote = schema_editor.quote_name
+    new_table = f'{table}_rebuilt'
+    with schema_editor.connection.cursor() as cursor:
+        # Rows written after the copy would be lost with the old table.
+        cursor.execute(f"LOCK TABLE {quote(table)} IN EXCLUSIVE MODE")
+        cursor.execute(
+            "SELECT conname FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'p'",
+            [table]
+        )
+        primary_key, = cursor.fetchone()
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes "
+            "WHERE schemaname = current_schema() AND tablename = %s "
+            "AND indexname <> %s",
+            [table, primary_key]
+        )
+        indexes = [
+            # Indexes of a partitioned table are defined ON ONLY it.
+            indexdef.replace(' ON ONLY ', ' ON ')
+            for indexdef, in cursor.fetchall()
+        ]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [table]
+        )
+        foreign_keys = cursor.fetchall()
+
+        cursor.execute(
+            f"CREATE TABLE {quote(new_table)} (LIKE {quote(table)} "
+            "INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+            + (" PARTITION BY RANGE (created_at)" if partitioned else "")
+        )
+        cursor.execute(
+            "SELECT date_trunc('month', min(created_at) "
+            f"AT TIME ZONE 'UTC') FROM {quote(table)}"
+        )
+        now = django.utils.timezone.now().replace(tzinfo=None)
+        current = now.replace(
+            day=1, hour=0, minute=0, second=0, microsecond=0
+        )
+        first = min(cursor.fetchone()[0] or current, current)
+        months = [first]
+        while months[-1] < add_months(current, MONTHS_AHEAD + 1):
+            months.append(add_months(months[-1], 1))
+
+        if partitioned:
+            for month, next_month in zip(months, months[1:]):
+                cursor.execute(
+                    f"CREATE TABLE {quote(f'{table}_p{month:%Y_%m}')} "
+                    f"PARTITION OF {quote(new_table)} "
+                    "FOR VALUES FROM (%s) TO (%s)",
+                    [month_bound(month), month_bound(next_month)]
+                )
+            cursor.execute(
+                f"CREATE TABLE {quote(f'{table}_default')} "
+                f"PARTITION OF {quote(new_table)} DEFAULT"
+            )
+        copy = (
+            f"INSERT INTO {quote(new_table)} SELECT * FROM {quote(table)} "
+        )
+        for month, next_month in zip(months, months[1:]):
+            cursor.execute(
+                copy + "WHERE created_at >= %s AND created_at < %s",
+                [month_bound(month), month_bound(next_month)]
+            )
+        cursor.execute(
+            copy + "WHERE created_at >= %s", [month_bound(months[-1])]
+        )
+        # Also drops partitions of a partitioned table.
+        cursor.execute(f"DROP TABLE {quote(table)}")
+        cursor.execute(
+            f"ALTER TABLE {quote(new_table)} RENAME TO {quote(table)}"
+        )
+        # Index names are unique per schema, so the primary key and
+        # indexes are created once the old table is gone.
+        cursor.execute(
+            f"ALTER TABLE {quote(table)} "
+            f"ADD CONSTRAINT {quote(primary_key)} PRIMARY KEY "
+            + ("(id, created_at)" if partitioned else "(id)")
+        )
+        for indexdef in indexes:
+            cursor.execute(indexdef)
+        for name, definition in foreign_keys:
+            cursor.execute(
+                f"ALTER TABLE {quote(table)} "
+                f"ADD CONSTRAINT {quote(name)} {definition}"
+            )
+
+
+def partition_tables(apps, schema_editor):
+    """Partitions history tables by month on PostgreSQL."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in PARTITIONED_TABLES:
+        rebuild_table(schema_editor, table, partitioned=True)
+
+
+def unpartition_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in PARTITIONED_TABLES:
+        rebuild_table(schema_editor, table, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bank', '0013_transfer_status'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ledgerentry',
+            name='replenishment',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='ledger_entries', to='bank.replenishment'),
+        ),
+        migrations.AlterField(
+            model_name='ledgerentry',
+            name='transfer',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='ledger_entries', to='bank.transfer'),
+        ),
+        migrations.CreateModel(
+            name='ArchivedHistory',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('source', models.CharField(max_length=63)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_history', to='bank.account')),
+            ],
+            options={
+                'verbose_name_plural': 'archived history',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='archivedhistory',
+            constraint=models.UniqueConstraint(fields=('account', 'source'), name='unique_account_archived_source'),
+        ),
+        migrations.RunPython(partition_tables, unpartition_tables),
+    ]
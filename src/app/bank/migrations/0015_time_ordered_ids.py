@@ -0,0 +1,59 @@
+# Generated by Django 4.1.1 on 2026-10-18 10:55
+
+import bank.ids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bank', '0014_partition_history'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='account',
+            name='id',
+            field=models.UUIDField(default=bank.ids.new_id, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='archivedhistory',
+            name='id',
+            field=models.UUIDField(default=bank.ids.new_id, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='balanceshard',
+            name='id',
+            field=models.UUIDField(default=bank.ids.new_id, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='balancesnapshot',
+            name='id',
+            field=models.UUIDField(default=bank.ids.new_id, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='customer',
+            name='id',
+            field=models.UUIDField(default=bank.ids.new_id, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='idempotencykey',
+            name='id',
+            field=models.UUIDField(default=bank.ids.new_id, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='ledgerentry',
+            name='id',
+            field=models.UUIDField(default=bank.ids.new_id, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='replenishment',
+            name='id',
+            field=models.UUIDField(default=bank.ids.new_id, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='transfer',
+            name='id',
+            field=models.UUIDField(default=bank.ids.new_id, editable=False, primary_key=True, serialize=False),
+        ),
+    ]
@@ -1,16 +1,18 @@
 from django.utils import timezone
-import uuid
 from django.db import models
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db.models.query import Q, F
 
+from .ids import new_id
+
 
 class BaseModel(models.Model):
     """
     Abstract base model that provides uuid primary key
     and created_at field.
     """
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=new_id, editable=False)
 
     created_at = models.DateTimeField(db_index=True, default=timezone.now)
 
@@ -48,6 +50,10 @@ class Account(BaseModel):
 
     Constraints:
         - Account balance can't be a negative number.
+
+    Hot accounts (balance_shards > 0) receive credits into BalanceShard
+    rows instead of this row, so their full balance is balance plus
+    balances of all shards.
     """
     balance = models.DecimalField(
 
@@ -56,6 +62,11 @@ class Account(BaseModel):
         decimal_places=2
     )
 
+    balance_shards = models.PositiveSmallIntegerField(
+        default=0,
+        help_text="Number of balance shards receiving credits, 0 if off."
+    )
+
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.PROTECT  # we cannot delete user with money
@@ -73,6 +84,52 @@ class Account(BaseModel):
         return f'Account {self.id} of {self.user.username}'
 
 
+class BalanceShard(BaseModel):
+    """
+    Model used to store part of a hot account balance.
+
+    Credits to a hot account are spread over its shards, so concurrent
+    transactions do not wait for a lock on one account row. Shards are
+    folded back into the account balance periodically and on debits.
+
+    Relations:
+        - Balance shard must have one related account.
+        - Account can have any number of balance shards.
+
+    Constraints:
+        - Shard balance can't be a negative number.
+        - Account has one shard with every index.
+    """
+    account = models.ForeignKey(
+        Account,
+        on_delete=models.CASCADE,
+        related_name="shards"
+    )
+
+    index = models.PositiveSmallIntegerField()
+
+    balance = models.DecimalField(
+        default=0,
+        max_digits=10,
+        decimal_places=2
+    )
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                name="negative_shard_balance",
+                check=Q(balance__gte=0)
+            ),
+            models.UniqueConstraint(
+                name="unique_account_shard_index",
+                fields=["account", "index"]
+            )
+        ]
+
+    def __str__(self):
+        return f'Shard {self.index} of account {self.account_id}'
+
+
 class Replenishment(BaseModel):
     """
     Model used to store replenishment state.
@@ -102,6 +159,12 @@ class Replenishment(BaseModel):
                 check=Q(amount__gte=0)
             )
         ]
+        indexes = [
+            models.Index(
+                name="replenishment_account_created",
+                fields=["account", "created_at"]
+            )
+        ]
 
     def __str__(self):
         return (
@@ -121,7 +184,14 @@ class Transfer(BaseModel):
     Constraints:
         - Transfer amount cannot be a negative number.
         - Source and target accounts cannot be the same account.
+
+    Pending transfers are queued and have not changed any balance yet.
     """
+    class Status(models.TextChoices):
+        PENDING = 'pending'
+        COMPLETED = 'completed'
+        FAILED = 'failed'
+
     from_account = models.ForeignKey(
         Account,
         on_delete=models.CASCADE,
@@ -139,6 +209,14 @@ class Transfer(BaseModel):
         decimal_places=2
     )
 
+    status = models.CharField(
+        max_length=16,
+        choices=Status.choices,
+        default=Status.COMPLETED
+    )
+
+    failure_reason = models.CharField(max_length=255, blank=True)
+
     class Meta:
         constraints = [
             models.CheckConstraint(
@@ -150,6 +228,22 @@ class Transfer(BaseModel):
                 check=~Q(from_account__exact=F("to_account"))
             )
         ]
+        indexes = [
+            models.Index(
+                name="transfer_from_created",
+                fields=["from_account", "created_at"]
+            ),
+            models.Index(
+                name="transfer_to_created",
+                fields=["to_account", "created_at"]
+            ),
+            # Queue of transfers waiting for run_transfer_workers.
+            models.Index(
+                name="transfer_pending_created",
+                fields=["created_at"],
+                condition=Q(status="pending")
+            )
+        ]
 
     def __str__(self):
         return (
@@ -157,3 +251,193 @@ class Transfer(BaseModel):
             f'from account {self.from_account.id} '
             f'to account {self.to_account.id} '
             f'for {self.amount}')
+
+
+class LedgerEntry(BaseModel):
+    """
+    Model used to store one signed balance movement of an account.
+
+    Entries are append-only and are written in the same transaction
+    as the replenishment or transfer they describe, so the history of
+    an account can be read from this table alone.
+
+    Relations:
+        - Ledger entry must have one related account.
+        - Ledger entry is related either to a replenishment
+          or to a transfer.
+        - Transfer has two ledger entries, one for every account.
+        - Ledger entries outlive archived replenishments and transfers,
+          so their foreign keys have no database constraint.
+    """
+    class Kind(models.TextChoices):
+        REPLENISHMENT = 'replenishment'
+        TRANSFER_IN = 'transfer_in'
+        TRANSFER_OUT = 'transfer_out'
+
+    account = models.ForeignKey(
+        Account,
+        on_delete=models.CASCADE,
+        related_name="ledger_entries"
+    )
+
+    # Positive for credits and negative for debits.
+    amount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2
+    )
+
+    kind = models.CharField(max_length=16, choices=Kind.choices)
+
+    replenishment = models.ForeignKey(
+        Replenishment,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name="ledger_entries"
+    )
+
+    transfer = models.ForeignKey(
+        Transfer,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name="ledger_entries"
+    )
+
+    class Meta:
+        verbose_name_plural = "ledger entries"
+        indexes = [
+            models.Index(
+                name="ledger_account_created",
+                fields=["account", "created_at"]
+            )
+        ]
+
+    def __str__(self):
+        return (
+            f'{self.created_at}: Account {self.account_id} '
+            f'{self.kind} {self.amount}')
+
+
+class IdempotencyKey(BaseModel):
+    """
+    Model used to store the response to a request with Idempotency-Key.
+
+    Relations:
+        - Idempotency key must have one related user.
+
+    Constraints:
+        - Key is unique per user.
+    """
+    key = models.CharField(max_length=255)
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="idempotency_keys"
+    )
+
+    # Hash of request method, path and body, used to reject a key
+    # reused for a different request.
+    fingerprint = models.CharField(max_length=64)
+
+    # Empty only while the first request with the key is executed.
+    response_status = models.PositiveSmallIntegerField(null=True)
+
+    response_body = models.JSONField(encoder=DjangoJSONEncoder, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                name="unique_user_idempotency_key",
+                fields=["user", "key"]
+            )
+        ]
+
+    def __str__(self):
+        return f'Idempotency key {self.key} of user {self.user_id}'
+
+
+class BalanceSnapshot(BaseModel):
+    """
+    Model used to store account balance at a point in time.
+
+    Balance includes every ledger entry created at or before created_at,
+    so balance at any later time is the snapshot plus the ledger entries
+    after it.
+
+    Relations:
+        - Balance snapshot must have one related account.
+        - Account can have any number of balance snapshots.
+
+    Constraints:
+        - Account has at most one snapshot for a point in time.
+    """
+    account = models.ForeignKey(
+        Account,
+        on_delete=models.CASCADE,
+        related_name="balance_snapshots"
+    )
+
+    balance = models.DecimalField(
+        max_digits=10,
+        decimal_places=2
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                name="unique_account_snapshot_time",
+                fields=["account", "created_at"]
+            )
+        ]
+
+    def __str__(self):
+        return (
+            f'{self.created_at}: Account {self.account_id} '
+            f'balance {self.balance}')
+
+
+class ArchivedHistory(BaseModel):
+    """
+    Model used to store net amount of archived history of an account.
+
+    When a month of replenishments or transfers is archived, the sum
+    of its amounts per account is kept here, so the balance expected
+    from the history still includes it.
+
+    Relations:
+        - Archived history must have one related account.
+        - Account has one archived history for every archived source.
+
+    Constraints:
+        - Account has at most one archived history for a source.
+    """
+    account = models.ForeignKey(
+        Account,
+        on_delete=models.CASCADE,
+        related_name="archived_history"
+    )
+
+    # Archived partition, e.g. bank_transfer_p2024_01.
+    source = models.CharField(max_length=63)
+
+    # Positive for credits and negative for debits.
+    amount = models.DecimalField(
+        max_digits=12,
+        decimal_places=2
+    )
+
+    class Meta:
+        verbose_name_plural = "archived history"
+        constraints = [
+            models.UniqueConstraint(
+                name="unique_account_archived_source",
+                fields=["account", "source"]
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.source}: Account {self.account_id} {self.amount}'
@@ -0,0 +1,16 @@
+from rest_framework.pagination import CursorPagination
+
+
+class HistoryCursorPagination(CursorPagination):
+    """
+    Keyset pagination for replenishment and transfer history.
+
+    Pages are fetched with `created_at < cursor` on the
+    (account, created_at) indexes, so the cost of a page does not
+    depend on how deep into the history it is. `id` makes the order
+    of rows with equal created_at deterministic.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
@@ -0,0 +1,240 @@
+import csv
+import gzip
+import os
+import re
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from .models import Account, ArchivedHistory, Replenishment, Transfer
+from .services import CENT, invalidate_account_caches
+
+# History tables partitioned by month of created_at on PostgreSQL.
+PARTITIONED_MODELS = (Replenishment, Transfer)
+
+
+def month_start(value: datetime) -> datetime:
+    """Returns start of the UTC month of value."""
+    return value.astimezone(dt_timezone.utc).replace(
+        day=1, hour=0, minute=0, second=0, microsecond=0
+    )
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(model, month: datetime) -> str:
+    return f'{model._meta.db_table}_p{month:%Y_%m}'
+
+
+def is_partitioned(model) -> bool:
+    """Returns True if the model table is partitioned in the database."""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT relkind = 'p' FROM pg_class "
+            "WHERE oid = %s::regclass",
+            [model._meta.db_table]
+        )
+        row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+def create_partition(model, month: datetime) -> bool:
+    """
+    Creates the partition of the month if it does not exist yet.
+
+    Returns True if the partition was created.
+    """
+    name = partition_name(model, month)
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s)", [name])
+        if cursor.fetchone()[0] is not None:
+            return False
+        cursor.execute(
+            f"CREATE TABLE {quote(name)} "
+            f"PARTITION OF {quote(model._meta.db_table)} "
+            "FOR VALUES FROM (%s) TO (%s)",
+            [month, add_months(month, 1)]
+        )
+    return True
+
+
+def history_months(model, before: datetime) -> list[datetime]:
+    """
+    Returns months before the given month that hold model history.
+
+    On a partitioned table these are months of the existing partitions,
+    including ones detached by an interrupted archive_month, and months
+    of rows in the default partition, otherwise months of the existing
+    rows.
+    """
+    if is_partitioned(model):
+        table = model._meta.db_table
+        default = f'{table}_default'
+        pattern = re.compile(re.escape(table) + r'_p(\d{4})_(\d{2})$')
+        months = set()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT relname FROM pg_class "
+                "WHERE relnamespace = current_schema()::regnamespace "
+                "AND relkind = 'r' AND starts_with(relname, %s)",
+                [f'{table}_p']
+            )
+            for name, in cursor.fetchall():
+                match = pattern.match(name)
+                if match:
+                    months.add(datetime(
+                        int(match[1]), int(match[2]), 1,
+                        tzinfo=dt_timezone.utc
+                    ))
+            cursor.execute("SELECT to_regclass(%s)", [default])
+            if cursor.fetchone()[0] is not None:
+                # Rows older than the first partition or newer than
+                # the created ones are kept in the default partition.
+                cursor.execute(
+                    "SELECT DISTINCT date_trunc('month', "
+                    "created_at AT TIME ZONE 'UTC') "
+                    f"FROM {connection.ops.quote_name(default)} "
+                    "WHERE created_at < %s",
+                    [before]
+                )
+                months.update(
+                    month.replace(tzinfo=dt_timezone.utc)
+                    for month, in cursor.fetchall()
+                )
+        return sorted(month for month in months if month < before)
+
+    return list(model.objects.filter(created_at__lt=before).datetimes(
+        'created_at', 'month', tzinfo=dt_timezone.utc
+    ))
+
+
+def archived_amounts(model, month: datetime) -> dict:
+    """Returns net amount of model history in the month per account."""
+    rows = model.objects.filter(
+        created_at__gte=month, created_at__lt=add_months(month, 1)
+    )
+    amounts = defaultdict(Decimal)
+    if model is Transfer:
+        rows = rows.filter(status=Transfer.Status.COMPLETED)
+        for field, sign in (('from_account', -1), ('to_account', 1)):
+            for account_id, total in rows.values(field).annotate(
+                    total=Sum('amount')).values_list(field, 'total'):
+                amounts[account_id] += sign * Decimal(total).quantize(CENT)
+    else:
+        for account_id, total in rows.values('account').annotate(
+                total=Sum('amount')).values_list('account', 'total'):
+            amounts[account_id] += Decimal(total).quantize(CENT)
+    return amounts
+
+
+def archive_month(model, month: datetime, directory: str) -> tuple[str, int]:
+    """
+    Moves model history of the month into a gzipped CSV file.
+
+    Net amounts per account are kept as ArchivedHistory, so expected
+    balances do not change. On PostgreSQL the month partition is
+    detached, copied out and dropped. Rows of a month without
+    a partition, which are kept in the default partition, and rows
+    of a table that is not partitioned are deleted.
+    Ledger entries are not archived.
+    Returns path of the file and number of archived rows.
+
+    Raises:
+        ValueError:
+            if the month still has pending transfers.
+    """
+    source = partition_name(model, month)
+    path = os.path.join(directory, f'{source}.csv.gz')
+    rows = model.objects.filter(
+        created_at__gte=month, created_at__lt=add_months(month, 1)
+    )
+    attached, partition = False, None
+    if is_partitioned(model):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT EXISTS (SELECT FROM pg_inherits "
+                "WHERE inhrelid = to_regclass(%s)), to_regclass(%s)",
+                [source, source]
+            )
+            attached, partition = cursor.fetchone()
+    if partition is None:
+        with transaction.atomic():
+            amounts = archive_amounts(model, month, source)
+            with gzip.open(path, 'wt', newline='') as f:
+                fields = [
+                    field.attname for field in model._meta.concrete_fields
+                ]
+                writer = csv.writer(f)
+                writer.writerow(fields)
+                count = 0
+                for row in rows.values_list(*fields).iterator():
+                    writer.writerow(row)
+                    count += 1
+                rows.delete()
+            invalidate_archived_accounts(amounts)
+        return path, count
+
+    quote = connection.ops.quote_name
+    # Amounts of a partition detached by an interrupted run are archived.
+    if attached:
+        # DETACH locks the whole parent table against reads and writes
+        # until commit, so only the bookkeeping shares its transaction.
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                # Writes to the month wait until it is archived.
+                cursor.execute(f"LOCK TABLE {quote(source)} IN SHARE MODE")
+            amounts = archive_amounts(model, month, source)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"ALTER TABLE {quote(model._meta.db_table)} "
+                    f"DETACH PARTITION {quote(source)}"
+                )
+            invalidate_archived_accounts(amounts)
+
+    # The detached table is not seen by queries of the parent table.
+    with gzip.open(path, 'wt', newline='') as f:
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {quote(source)}")
+            count, = cursor.fetchone()
+            cursor.cursor.copy_expert(
+                f"COPY {quote(source)} TO STDOUT WITH CSV HEADER", f
+            )
+            cursor.execute(f"DROP TABLE {quote(source)}")
+    return path, count
+
+
+def archive_amounts(model, month: datetime, source: str) -> dict:
+    """
+    Saves net amounts of the month per account as ArchivedHistory.
+
+    Raises:
+        ValueError:
+            if the month still has pending transfers.
+    """
+    if model is Transfer and model.objects.filter(
+            created_at__gte=month, created_at__lt=add_months(month, 1),
+            status=Transfer.Status.PENDING).exists():
+        raise ValueError(f"{source} has pending transfers.")
+
+    amounts = archived_amounts(model, month)
+    ArchivedHistory.objects.bulk_create(
+        ArchivedHistory(account_id=account_id, source=source, amount=amount)
+        for account_id, amount in amounts.items()
+    )
+    return amounts
+
+
+def invalidate_archived_accounts(amounts: dict):
+    # Replenishment counts shown with accounts drop with the rows.
+    for user_id in Account.objects.filter(pk__in=amounts).values_list(
+            'user_id', flat=True).distinct():
+        invalidate_account_caches(user_id)
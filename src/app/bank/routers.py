@@ -0,0 +1,56 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+_use_primary = ContextVar('bank_use_primary', default=False)
+
+
+def replica_aliases():
+    """Returns aliases of the configured read replicas."""
+    return getattr(settings, 'REPLICA_DATABASES', ())
+
+
+@contextmanager
+def use_primary():
+    """Routes all reads made inside the block to the primary database."""
+    token = _use_primary.set(True)
+    try:
+        yield
+    finally:
+        _use_primary.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """
+    Sends writes to the primary database and reads to a random replica.
+
+    Reads stay on the primary while pinned with use_primary() (see
+    ReplicaPinningMiddleware) and inside transactions on the primary,
+    where a replica would not see uncommitted writes or hold row locks.
+    Without configured replicas the router has no opinion.
+    """
+    def db_for_read(self, model, **hints):
+        replicas = replica_aliases()
+        if not replicas:
+            return None
+        if _use_primary.get():
+            return DEFAULT_DB_ALIAS
+        if transaction.get_connection(DEFAULT_DB_ALIAS).in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive schema changes through replication.
+        if db in replica_aliases():
+            return False
+        return None
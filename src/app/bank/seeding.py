@@ -0,0 +1,222 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from .models import Account, Customer, LedgerEntry, Replenishment, Transfer
+
+FIRST_NAMES = (
+    'Anna', 'Jan', 'Maria', 'Piotr', 'Olga', 'Ivan', 'Emma', 'Lukas',
+    'Sofia', 'Mateo', 'Eva', 'Noah',
+)
+LAST_NAMES = (
+    'Novak', 'Kowalski', 'Ivanova', 'Schmidt', 'Garcia', 'Rossi',
+    'Dubois', 'Smith', 'Horvat', 'Jensen',
+)
+CITIES = (
+    'Warsaw', 'Minsk', 'Vilnius', 'Berlin', 'Prague', 'Madrid',
+    'Rome', 'Paris', 'London', 'Oslo',
+)
+
+# Initial replenishment of every account, in cents.
+INITIAL_BALANCE_CENTS = (10_000, 1_000_000)
+
+MAX_TRANSFER_CENTS = 50_000
+
+
+def cents(value: int) -> Decimal:
+    return Decimal(value).scaleb(-2)
+
+
+def insert_rows(model, rows: list[dict]):
+    """
+    Inserts rows with multi-row `INSERT` statements.
+
+    Every row is a dict of values by field attname, e.g. `account_id`.
+    Fields missing from a row get their default, so adding a field
+    with a default to the model does not break seeding.
+    Unlike bulk_create, no model instances are built and the
+    statement is compiled once, which dominates the cost of inserting
+    millions of rows.
+    """
+    if not rows:
+        return
+    # The wrapper itself, not the proxy looked up on every access.
+    connection = connections[DEFAULT_DB_ALIAS]
+    fields = model._meta.concrete_fields
+    columns = [
+        (field.attname, field.get_default, field.get_db_prep_save)
+        for field in fields
+    ]
+    quote = connection.ops.quote_name
+    max_params = connection.features.max_query_params or 2 ** 15
+    per_statement = max(1, min(len(rows), max_params // len(fields)))
+    row_sql = '({})'.format(', '.join(['%s'] * len(fields)))
+    sql = 'INSERT INTO {} ({}) VALUES '.format(
+        quote(model._meta.db_table),
+        ', '.join(quote(field.column) for field in fields)
+    )
+    with connection.cursor() as cursor:
+        for first in range(0, len(rows), per_statement):
+            chunk = rows[first:first + per_statement]
+            cursor.execute(
+                sql + ', '.join([row_sql] * len(chunk)),
+                [
+                    prep(
+                        row[attname] if attname in row else default(),
+                        connection
+                    )
+                    for row in chunk
+                    for attname, default, prep in columns
+                ]
+            )
+
+
+def seed_partition(first_user: int, users: int, accounts_per_user: int,
+                   transfers: int, password_hash: str, prefix: str = 'seed',
+                   days: int = 365, random_seed: int = 0,
+                   batch_size: int = 5000) -> tuple[int, int, int]:
+    """
+    Writes generated users with customers, accounts and history.
+
+    Users are numbered from first_user, so partitions with distinct
+    ranges can be seeded in parallel. Every account gets one initial
+    replenishment, then transfers between random accounts of the
+    partition are spread over the last days. Balances are tracked in
+    memory and accounts are written last with their final balances,
+    so everything matches reconcile_balances. All rows are written in
+    one transaction and foreign keys are checked at commit. Only users
+    and customers, whose ids are needed, go through `bulk_create`.
+
+    Returns numbers of created users, accounts and transfers.
+    """
+    User = get_user_model()
+    rng = random.Random(random_seed)
+    end = timezone.now()
+    start = end - timedelta(days=days)
+
+    with transaction.atomic():
+        user_ids = []
+        last_user = first_user + users
+        for batch_first in range(first_user, last_user, batch_size):
+            created = User.objects.bulk_create(
+                User(
+                    username=f'{prefix}{number}@example.com',
+                    email=f'{prefix}{number}@example.com',
+                    password=password_hash,
+                    date_joined=start
+                )
+                for number in range(
+                    batch_first, min(batch_first + batch_size, last_user)
+                )
+            )
+            Customer.objects.bulk_create(
+                Customer(
+                    user=user,
+                    fname=rng.choice(FIRST_NAMES),
+                    lname=rng.choice(LAST_NAMES),
+                    city=rng.choice(CITIES),
+                    created_at=start
+                )
+                for user in created
+            )
+            user_ids.extend(user.pk for user in created)
+
+        # Primary keys use the model default, like rows created by the API.
+        new_account_id = Account._meta.pk.get_default
+        new_transfer_id = Transfer._meta.pk.get_default
+        new_replenishment_id = Replenishment._meta.pk.get_default
+        new_entry_id = LedgerEntry._meta.pk.get_default
+        account_users = [
+            user_id for user_id in user_ids for _ in range(accounts_per_user)
+        ]
+        account_ids = [new_account_id() for _ in account_users]
+        initial = [
+            rng.randint(*INITIAL_BALANCE_CENTS) for _ in account_ids
+        ]
+        balances = list(initial)
+
+        created_transfers = 0
+        history = []
+        for number in range(transfers):
+            source, target = rng.sample(range(len(account_ids)), 2)
+            if not balances[source]:
+                continue
+            amount = rng.randint(
+                1, min(balances[source], MAX_TRANSFER_CENTS)
+            )
+            balances[source] -= amount
+            balances[target] += amount
+            history.append({
+                'id': new_transfer_id(),
+                'created_at': (
+                    start + (end - start) * (number + 1) / (transfers + 1)
+                ),
+                'from_account_id': account_ids[source],
+                'to_account_id': account_ids[target],
+                'amount': cents(amount),
+                'status': Transfer.Status.COMPLETED,
+            })
+            if len(history) == batch_size:
+                created_transfers += write_transfers(history)
+                history = []
+        created_transfers += write_transfers(history)
+
+        for batch_first in range(0, len(account_ids), batch_size):
+            batch = range(
+                batch_first, min(batch_first + batch_size, len(account_ids))
+            )
+            insert_rows(Account, [
+                {'id': account_ids[i], 'created_at': start,
+                 'balance': cents(balances[i]),
+                 'user_id': account_users[i]}
+                for i in batch
+            ])
+            replenishments = [
+                {'id': new_replenishment_id(), 'created_at': start,
+                 'amount': cents(initial[i]),
+                 'account_id': account_ids[i]}
+                for i in batch
+            ]
+            insert_rows(Replenishment, replenishments)
+            insert_rows(LedgerEntry, [
+                {'id': new_entry_id(),
+                 'created_at': replenishment['created_at'],
+                 'account_id': replenishment['account_id'],
+                 'amount': replenishment['amount'],
+                 'kind': LedgerEntry.Kind.REPLENISHMENT,
+                 'replenishment_id': replenishment['id']}
+                for replenishment in replenishments
+            ])
+
+    return len(user_ids), len(account_ids), created_transfers
+
+
+def write_transfers(history: list[dict]) -> int:
+    """
+    Writes rows of transfers with their ledger entries.
+
+    Returns number of written transfers.
+    """
+    new_entry_id = LedgerEntry._meta.pk.get_default
+    insert_rows(Transfer, history)
+    insert_rows(LedgerEntry, [
+        entry
+        for transfer in history
+        for entry in (
+            {'id': new_entry_id(), 'created_at': transfer['created_at'],
+             'account_id': transfer['from_account_id'],
+             'amount': -transfer['amount'],
+             'kind': LedgerEntry.Kind.TRANSFER_OUT,
+             'transfer_id': transfer['id']},
+            {'id': new_entry_id(), 'created_at': transfer['created_at'],
+             'account_id': transfer['to_account_id'],
+             'amount': transfer['amount'],
+             'kind': LedgerEntry.Kind.TRANSFER_IN,
+             'transfer_id': transfer['id']},
+        )
+    ])
+    return len(history)
@@ -1,8 +1,13 @@
 from rest_framework import serializers
 
-from .models import Customer, Account, Replenishment, Transfer
+from .models import Customer, Account, LedgerEntry, Replenishment, Transfer
 
-from .services import make_replenishment, make_transfer
+from .services import (
+    enqueue_transfer,
+    get_user_accounts,
+    make_replenishment,
+    make_transfer,
+)
 
 
 class CustomerSerializer(serializers.ModelSerializer):
@@ -24,15 +29,106 @@ class CustomerSerializer(serializers.ModelSerializer):
 
 
 class AccountSerializer(serializers.ModelSerializer):
+    # Annotated by services.annotate_total_balance and
+    # services.annotate_replenishment_summary,
+    # new accounts fall back to defaults.
+    balance = serializers.DecimalField(
+        source='total_balance',
+        max_digits=12,
+        decimal_places=2,
+        read_only=True,
+        default=0
+    )
+    replenishments_count = serializers.IntegerField(
+        read_only=True,
+        default=0
+    )
+    replenishments_total = serializers.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        read_only=True,
+        default=0
+    )
+
+    class Meta:
+        model = Account
+        fields = (
+            'id',
+            'created_at',
+            'balance',
+            'replenishments_count',
+            'replenishments_total',
+        )
+        read_only_fields = ('id', 'created_at', )
+
+
+class AccountSummarySerializer(serializers.ModelSerializer):
+    # Annotated by services.get_account_summaries.
+    balance = serializers.DecimalField(
+        source='total_balance',
+        max_digits=12,
+        decimal_places=2,
+        read_only=True
+    )
+    total_in = serializers.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        read_only=True
+    )
+    total_out = serializers.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        read_only=True
+    )
+    replenishments_count = serializers.IntegerField(read_only=True)
+    transfers_in_count = serializers.IntegerField(read_only=True)
+    transfers_out_count = serializers.IntegerField(read_only=True)
+    last_activity = serializers.DateTimeField(read_only=True)
+
+    class Meta:
+        model = Account
+        fields = (
+            'id',
+            'balance',
+            'total_in',
+            'total_out',
+            'replenishments_count',
+            'transfers_in_count',
+            'transfers_out_count',
+            'last_activity',
+        )
+        read_only_fields = fields
+
+
+class AccountReplenishmentsSerializer(AccountSerializer):
+    """Account serializer that also lists ids of all replenishments."""
     replenishments = serializers.PrimaryKeyRelatedField(
         many=True,
         read_only=True
     )
 
+    class Meta(AccountSerializer.Meta):
+        fields = AccountSerializer.Meta.fields + ('replenishments', )
+
+
+class AccountBalanceSerializer(serializers.Serializer):
+    id = serializers.UUIDField()
+    at = serializers.DateTimeField(required=False)
+    balance = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
+class LedgerEntrySerializer(serializers.ModelSerializer):
     class Meta:
-        model = Account
-        fields = ('id', 'created_at', 'balance', 'replenishments', )
-        read_only_fields = ('id', 'created_at', 'balance', 'replenishments', )
+        model = LedgerEntry
+        fields = (
+            'id',
+            'created_at',
+            'amount',
+            'kind',
+            'replenishment',
+            'transfer',
+        )
+        read_only_fields = fields
 
 
 class AccountOwnerForeignKey(serializers.PrimaryKeyRelatedField):
@@ -50,8 +146,45 @@ class ReplenishmentSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'created_at', )
 
     def create(self, validated_data):
-        make_replenishment(**validated_data)
-        return super().create(validated_data)
+        return make_replenishment(**validated_data)
+
+
+class ReplenishmentBatchItemSerializer(serializers.Serializer):
+    account = serializers.UUIDField()
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+
+class ReplenishmentBatchSerializer(serializers.Serializer):
+    max_replenishments = 5000
+
+    replenishments = ReplenishmentBatchItemSerializer(
+        many=True,
+        allow_empty=False
+    )
+
+    def validate_replenishments(self, replenishments):
+        if len(replenishments) > self.max_replenishments:
+            raise serializers.ValidationError(
+                f"Ensure this field has no more than "
+                f"{self.max_replenishments} elements."
+            )
+
+        # Resolve all accounts with one query instead of one per item.
+        accounts = get_user_accounts(self.context['request'].user).in_bulk(
+            {item['account'] for item in replenishments}
+        )
+        errors = []
+        for item in replenishments:
+            if item['account'] in accounts:
+                item['account'] = accounts[item['account']]
+                errors.append({})
+            else:
+                errors.append({"account": [
+                    f'Invalid pk "{item["account"]}" - object does not exist.'
+                ]})
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return replenishments
 
 
 class TransferSerializer(serializers.ModelSerializer):
@@ -65,9 +198,35 @@ class TransferSerializer(serializers.ModelSerializer):
             'from_account',
             'to_account',
             'amount',
+            'status',
+            'failure_reason',
         )
-        read_only_fields = ('id', 'created_at', )
+        read_only_fields = ('id', 'created_at', 'status', 'failure_reason', )
 
     def create(self, validated_data):
-        make_transfer(**validated_data)
-        return super().create(validated_data)
+        # Set by TransferView for requests with `Prefer: respond-async`.
+        if self.context.get('respond_async'):
+            return enqueue_transfer(**validated_data)
+        return make_transfer(**validated_data)
+
+
+class TransferBatchItemSerializer(serializers.Serializer):
+    from_account = serializers.UUIDField()
+    to_account = serializers.UUIDField()
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+
+class TransferBatchSerializer(serializers.Serializer):
+    max_transfers = 5000
+
+    transfers = TransferBatchItemSerializer(many=True, allow_empty=False)
+    # All-or-nothing by default, best-effort if set to False.
+    atomic = serializers.BooleanField(default=True)
+
+    def validate_transfers(self, transfers):
+        if len(transfers) > self.max_transfers:
+            raise serializers.ValidationError(
+                f"Ensure this field has no more than "
+                f"{self.max_transfers} elements."
+            )
+        return transfers
@@ -1,19 +1,242 @@
-from .models import Account, Replenishment, Transfer
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from typing import Iterator
+
+from .events import publish_event
+from .models import (
+    Account,
+    ArchivedHistory,
+    BalanceShard,
+    BalanceSnapshot,
+    Customer,
+    LedgerEntry,
+    Replenishment,
+    Transfer,
+)
 from users.models import User
 
+from django.core.cache import cache
+from django.utils import timezone
+from django.db.models import (
+    Count,
+    DecimalField,
+    F,
+    Max,
+    OuterRef,
+    Prefetch,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce
 from django.db.models.query import QuerySet
 from django.db import transaction
 from django.core.exceptions import ValidationError
 
 
+CUSTOMER_CACHE_TIMEOUT = 60 * 15
+
+SUMMARY_CACHE_TIMEOUT = 60 * 5
+
+VERSION_CACHE_TIMEOUT = 60 * 60 * 24
+
+CENT = Decimal('0.01')
+
+
+def get_user_customer(user: User) -> Customer | None:
+    """Returns customer of the user together with the user in one query."""
+    return Customer.objects.select_related('user').filter(user=user).first()
+
+
+def customer_cache_key(user_id: int) -> str:
+    """Returns cache key of the serialized customer of the user."""
+    return f'bank:customer:{user_id}'
+
+
+def invalidate_customer_cache(user_id: int):
+    """
+    Removes the serialized customer of the user from the cache.
+
+    Version of the customer is bumped after commit.
+    """
+    cache.delete(customer_cache_key(user_id))
+    bump_version('customer', user_id)
+
+
+def summary_cache_key(user_id: int) -> str:
+    """Returns cache key of the serialized account summary of the user."""
+    return f'bank:summary:{user_id}'
+
+
+def invalidate_account_caches(user_id: int):
+    """
+    Removes the account summary of the user from the cache
+    and bumps version of the user accounts.
+
+    Inside a transaction both happen only after commit, so the summary
+    cannot be cached again from data about to be committed.
+    """
+    transaction.on_commit(lambda: cache.delete(summary_cache_key(user_id)))
+    bump_version('accounts', user_id)
+
+
+def version_cache_key(resource: str, user_id: int) -> str:
+    """Returns cache key of the version of the user resource."""
+    return f'bank:version:{resource}:{user_id}'
+
+
+def get_version(resource: str, user_id: int) -> int:
+    """
+    Returns version of the user resource, e.g. `accounts`.
+
+    Versions are counters in the cache bumped whenever the resource
+    changes. A missing counter starts from the current time in
+    nanoseconds, so a lost counter never repeats an earlier version.
+    """
+    key = version_cache_key(resource, user_id)
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(key, version, VERSION_CACHE_TIMEOUT):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_version(resource: str, user_id: int):
+    """Increments version of the user resource after commit."""
+    def bump():
+        try:
+            cache.incr(version_cache_key(resource, user_id))
+        except ValueError:
+            # Missing version starts anew when it is read.
+            pass
+    transaction.on_commit(bump)
+
+
 def get_user_accounts(user: User) -> QuerySet[Account]:
     """Returns a queryset of all accounts owned by user."""
     return Account.objects.filter(user=user)
 
 
-def get_user_replenishments(user: User) -> QuerySet[Replenishment]:
-    """Returns a queryset of replenishments on all user accounts."""
-    return Replenishment.objects.filter(account__in=get_user_accounts(user))
+def shard_balance():
+    """Returns expression of sum of account balance shards."""
+    return Coalesce(
+        Subquery(
+            BalanceShard.objects.filter(account=OuterRef('pk')).values(
+                'account'
+            ).annotate(total=Sum('balance')).values('total'),
+            output_field=DecimalField(max_digits=10, decimal_places=2)
+        ),
+        Decimal(0)
+    )
+
+
+def annotate_total_balance(accounts: QuerySet[Account]) -> QuerySet[Account]:
+    """
+    Annotates accounts with total_balance including balance shards.
+
+    Should be used wherever full balance of an account is shown,
+    because Account.balance of hot accounts does not include
+    credits that were not folded yet.
+    """
+    return accounts.annotate(total_balance=F('balance') + shard_balance())
+
+
+def annotate_replenishment_summary(
+        accounts: QuerySet[Account]) -> QuerySet[Account]:
+    """
+    Annotates accounts with replenishments_count and replenishments_total.
+
+    Both values are computed by the database in the same query.
+    """
+    return accounts.annotate(
+        replenishments_count=Count('replenishments'),
+        replenishments_total=Coalesce(
+            Sum('replenishments__amount'), Decimal(0)
+        ),
+    )
+
+
+def get_account_summaries(user: User) -> QuerySet[Account]:
+    """
+    Returns user accounts annotated with totals of their history.
+
+    Annotates total_balance, total_in, total_out, replenishments_count,
+    transfers_in_count, transfers_out_count and last_activity using
+    conditional aggregates over account ledger entries, which hold
+    every replenishment and completed transfer, in a single query.
+    """
+    entries = 'ledger_entries'
+    amount = f'{entries}__amount'
+    kind = f'{entries}__kind'
+    money = DecimalField(max_digits=12, decimal_places=2)
+    accounts = get_user_accounts(user).annotate(
+        total_in=Coalesce(
+            Sum(amount, filter=Q(**{f'{amount}__gt': 0})),
+            Value(Decimal(0)),
+            output_field=money
+        ),
+        total_out=Coalesce(
+            -Sum(amount, filter=Q(**{f'{amount}__lt': 0})),
+            Value(Decimal(0)),
+            output_field=money
+        ),
+        replenishments_count=Count(
+            entries, filter=Q(**{kind: LedgerEntry.Kind.REPLENISHMENT})
+        ),
+        transfers_in_count=Count(
+            entries, filter=Q(**{kind: LedgerEntry.Kind.TRANSFER_IN})
+        ),
+        transfers_out_count=Count(
+            entries, filter=Q(**{kind: LedgerEntry.Kind.TRANSFER_OUT})
+        ),
+        last_activity=Coalesce(
+            Max(f'{entries}__created_at'), F('created_at')
+        ),
+    )
+    return annotate_total_balance(accounts).order_by('created_at', 'pk')
+
+
+def prefetch_replenishment_ids(
+        accounts: QuerySet[Account]) -> QuerySet[Account]:
+    """Prefetches ids of account replenishments with one extra query."""
+    return accounts.prefetch_related(Prefetch(
+        'replenishments',
+        queryset=Replenishment.objects.only('id', 'account_id')
+    ))
+
+
+def created_between(queryset: QuerySet, start: datetime | None = None,
+                    end: datetime | None = None) -> QuerySet:
+    """
+    Filters queryset to rows created at or after start and before end.
+
+    Bounds on created_at let PostgreSQL scan only the partitions
+    of the months in between.
+    """
+    if start is not None:
+        queryset = queryset.filter(created_at__gte=start)
+    if end is not None:
+        queryset = queryset.filter(created_at__lt=end)
+    return queryset
+
+
+def get_user_replenishments(user: User, start: datetime | None = None,
+                            end: datetime | None = None
+                            ) -> QuerySet[Replenishment]:
+    """
+    Returns a queryset of replenishments on all user accounts.
+
+    Only replenishments created between start and end are returned.
+    """
+    return created_between(
+        Replenishment.objects.filter(account__in=get_user_accounts(user)),
+        start, end
+    )
 
 
 def get_transfers_from_user(user: User) -> QuerySet[Transfer]:
@@ -26,12 +249,407 @@ def get_transfers_to_user(user: User) -> QuerySet[Transfer]:
     return Transfer.objects.filter(to_account__in=get_user_accounts(user))
 
 
-def get_all_user_transfers(user: User) -> QuerySet[Transfer]:
-    """Returns a queryset of transfers from and to all user accounts."""
-    return get_transfers_from_user(user).union(get_transfers_to_user(user))
+def get_all_user_transfers(user: User, start: datetime | None = None,
+                           end: datetime | None = None
+                           ) -> QuerySet[Transfer]:
+    """
+    Returns a queryset of transfers from and to all user accounts.
+
+    Only transfers created between start and end are returned.
+    """
+    accounts = get_user_accounts(user)
+    # OR instead of UNION, so the result can still be filtered,
+    # ordered and paginated.
+    return created_between(
+        Transfer.objects.filter(
+            Q(from_account__in=accounts) | Q(to_account__in=accounts)
+        ),
+        start, end
+    )
+
+
+def get_account_ledger(account: Account) -> QuerySet[LedgerEntry]:
+    """Returns a queryset of all balance movements of the account."""
+    return LedgerEntry.objects.filter(account=account)
+
+
+def iter_account_statement(account: Account,
+                           start: datetime | None = None,
+                           end: datetime | None = None,
+                           chunk_size: int = 2000) -> Iterator[tuple]:
+    """
+    Yields statement rows of the account in chronological order.
+
+    Every row is a (created_at, kind, amount, balance, transfer_id,
+    replenishment_id) tuple, where balance is the running balance after
+    the movement. Rows are read from the ledger with a server-side
+    cursor as plain tuples, so memory use does not depend on the
+    length of the history.
+    """
+    entries = get_account_ledger(account)
+    balance = Decimal(0)
+    if start is not None:
+        balance = entries.filter(created_at__lt=start).aggregate(
+            total=Sum('amount')
+        )['total'] or Decimal(0)
+        entries = entries.filter(created_at__gte=start)
+    if end is not None:
+        entries = entries.filter(created_at__lt=end)
+
+    rows = entries.order_by('created_at', 'id').values_list(
+        'created_at', 'kind', 'amount', 'transfer_id', 'replenishment_id'
+    )
+    for created_at, kind, amount, transfer_id, replenishment_id in \
+            rows.iterator(chunk_size=chunk_size):
+        balance += amount
+        yield (created_at, kind, amount, balance,
+               transfer_id, replenishment_id)
+
+
+def get_balance_at(account: Account, at: datetime) -> Decimal:
+    """
+    Returns account balance including all movements at or before at.
+
+    Starts from the latest balance snapshot not after at and sums
+    only ledger entries after it, so the cost does not grow with
+    the age of the account.
+    """
+    snapshot = BalanceSnapshot.objects.filter(
+        account=account, created_at__lte=at
+    ).order_by('-created_at').first()
+
+    entries = get_account_ledger(account).filter(created_at__lte=at)
+    balance = Decimal(0)
+    if snapshot is not None:
+        entries = entries.filter(created_at__gt=snapshot.created_at)
+        balance = snapshot.balance
+    delta = entries.aggregate(total=Sum('amount'))['total']
+    return balance + (delta or 0)
+
+
+def take_balance_snapshots(at: datetime, chunk_size: int = 1000) -> int:
+    """
+    Writes a balance snapshot at time at for every account.
+
+    Accounts are processed in chunks of primary keys. For every chunk
+    one query computes latest snapshot plus ledger entries after it
+    for all accounts, and one query inserts the new snapshots.
+    Returns number of accounts processed.
+    """
+    latest = BalanceSnapshot.objects.filter(
+        account=OuterRef('pk'), created_at__lte=at
+    ).order_by('-created_at')
+    since = Coalesce(
+        OuterRef('snapshot_at'),
+        Value(datetime.min.replace(tzinfo=dt_timezone.utc))
+    )
+    delta = LedgerEntry.objects.filter(
+        account=OuterRef('pk'), created_at__lte=at, created_at__gt=since
+    ).values('account').annotate(total=Sum('amount')).values('total')
+
+    processed = 0
+    last_pk = None
+    while True:
+        accounts = Account.objects.order_by('pk')
+        if last_pk is not None:
+            accounts = accounts.filter(pk__gt=last_pk)
+        chunk = list(accounts.annotate(
+            snapshot_at=Subquery(latest.values('created_at')[:1]),
+            snapshot_balance=Subquery(latest.values('balance')[:1]),
+        ).annotate(
+            delta=Subquery(delta)
+        ).values_list('pk', 'snapshot_balance', 'delta')[:chunk_size])
+        if not chunk:
+            return processed
+
+        BalanceSnapshot.objects.bulk_create(
+            [
+                BalanceSnapshot(
+                    account_id=pk,
+                    balance=(snapshot_balance or 0) + (delta or 0),
+                    created_at=at
+                )
+                for pk, snapshot_balance, delta in chunk
+            ],
+            ignore_conflicts=True
+        )
+        processed += len(chunk)
+        last_pk = chunk[-1][0]
+
+
+def expected_balance():
+    """
+    Returns expression of account balance computed from its history.
+
+    The balance is sum of replenishments plus sum of completed incoming
+    transfers minus sum of completed outgoing transfers, each computed
+    by a correlated aggregate subquery. Archived history is included
+    through its net amounts.
+    """
+    def total(queryset, field):
+        return Coalesce(
+            Subquery(
+                queryset.filter(**{field: OuterRef('pk')}).values(
+                    field
+                ).annotate(total=Sum('amount')).values('total'),
+                output_field=DecimalField(max_digits=12, decimal_places=2)
+            ),
+            Decimal(0)
+        )
+
+    completed = Transfer.objects.filter(status=Transfer.Status.COMPLETED)
+    return (
+        total(Replenishment.objects, 'account')
+        + total(completed, 'to_account')
+        - total(completed, 'from_account')
+        + total(ArchivedHistory.objects, 'account')
+    )
+
+
+def account_id_ranges(chunk_size: int) -> Iterator[tuple]:
+    """
+    Yields (lower, upper) primary key ranges of at most chunk_size accounts.
+
+    lower is exclusive and upper is inclusive, None means unbounded.
+    Only the primary key index is scanned.
+    """
+    lower = None
+    in_range = 0
+    pks = Account.objects.order_by('pk').values_list('pk', flat=True)
+    for pk in pks.iterator(chunk_size=10000):
+        in_range += 1
+        if in_range == chunk_size:
+            yield lower, pk
+            lower = pk
+            in_range = 0
+    if in_range:
+        yield lower, None
+
+
+def find_balance_mismatches(lower=None, upper=None) -> tuple[int, list]:
+    """
+    Compares stored and expected balances of accounts in a pk range.
+
+    Uses one aggregate query for the whole range. Returns number of
+    checked accounts and a list of (pk, balance, expected) mismatches.
+    """
+    accounts = Account.objects.all()
+    if lower is not None:
+        accounts = accounts.filter(pk__gt=lower)
+    if upper is not None:
+        accounts = accounts.filter(pk__lte=upper)
+
+    rows = annotate_total_balance(accounts).annotate(
+        expected=expected_balance()
+    ).values_list('pk', 'total_balance', 'expected')
+    checked = 0
+    mismatches = []
+    for pk, balance, expected in rows:
+        checked += 1
+        # Backends without a decimal type (SQLite) return float sums.
+        balance = Decimal(balance).quantize(CENT)
+        expected = Decimal(expected).quantize(CENT)
+        if balance != expected:
+            mismatches.append((pk, balance, expected))
+    return checked, mismatches
+
+
+def repair_balance(account_pk) -> Decimal:
+    """
+    Sets account balance to the balance expected from its history.
+
+    The account row is locked while the expected balance is computed,
+    so concurrent transfers cannot change it in between.
+    Returns the new balance.
+    """
+    with transaction.atomic():
+        account = Account.objects.select_for_update().get(pk=account_pk)
+        fold_balance_shards(account)
+        expected, in_shards = Account.objects.filter(pk=account_pk).annotate(
+            expected=expected_balance(),
+            in_shards=shard_balance()
+        ).values_list('expected', 'in_shards').get()
+        expected = Decimal(expected).quantize(CENT)
+        # Shards credited after the fold stay part of the balance.
+        Account.objects.filter(pk=account_pk).update(
+            balance=expected - Decimal(in_shards).quantize(CENT)
+        )
+        invalidate_account_caches(account.user_id)
+        return expected
+
+
+def replenishment_ledger_entries(
+        replenishment: Replenishment) -> list[LedgerEntry]:
+    """Returns unsaved ledger entries describing the replenishment."""
+    return [LedgerEntry(
+        account=replenishment.account,
+        amount=replenishment.amount,
+        kind=LedgerEntry.Kind.REPLENISHMENT,
+        replenishment=replenishment,
+        created_at=replenishment.created_at
+    )]
+
+
+def transfer_ledger_entries(transfer: Transfer,
+                            created_at: datetime | None = None
+                            ) -> list[LedgerEntry]:
+    """
+    Returns unsaved ledger entries describing the transfer.
+
+    Entries are dated by created_at, transfer creation time by default.
+    """
+    created_at = created_at or transfer.created_at
+    return [
+        LedgerEntry(
+            account_id=transfer.from_account_id,
+            amount=-transfer.amount,
+            kind=LedgerEntry.Kind.TRANSFER_OUT,
+            transfer=transfer,
+            created_at=created_at
+        ),
+        LedgerEntry(
+            account_id=transfer.to_account_id,
+            amount=transfer.amount,
+            kind=LedgerEntry.Kind.TRANSFER_IN,
+            transfer=transfer,
+            created_at=created_at
+        ),
+    ]
+
+
+def publish_balance_change(account: Account, amount: float):
+    """Publishes change of the account balance to streams of its owner."""
+    publish_event([account.user_id], 'balance', {
+        "account": account.pk,
+        "amount": Decimal(amount).quantize(CENT),
+    })
+
+
+def publish_transfer(transfer: Transfer, from_user_id: int,
+                     to_user_id: int):
+    """Publishes the transfer to streams of both account owners."""
+    publish_event([from_user_id, to_user_id], 'transfer', {
+        "id": transfer.pk,
+        "created_at": transfer.created_at,
+        "from_account": transfer.from_account_id,
+        "to_account": transfer.to_account_id,
+        "amount": Decimal(transfer.amount).quantize(CENT),
+        "status": transfer.status,
+    })
 
 
-def make_replenishment(account: Account, amount: float):
+def publish_replenishment(replenishment: Replenishment, user_id: int):
+    """Publishes the replenishment to streams of the account owner."""
+    publish_event([user_id], 'replenishment', {
+        "id": replenishment.pk,
+        "created_at": replenishment.created_at,
+        "account": replenishment.account_id,
+        "amount": Decimal(replenishment.amount).quantize(CENT),
+    })
+
+
+def credit_account(account: Account, amount: float):
+    """
+    Atomically adds amount to the account balance in the database.
+
+    Credits to hot accounts go to a random balance shard instead,
+    so they do not wait for a lock on the account row.
+    """
+    if account.balance_shards:
+        credited = BalanceShard.objects.filter(
+            account=account, index=random.randrange(account.balance_shards)
+        ).update(balance=F('balance') + amount)
+        if credited:
+            invalidate_account_caches(account.user_id)
+            publish_balance_change(account, amount)
+            return
+    Account.objects.filter(pk=account.pk).update(
+        balance=F('balance') + amount
+    )
+    invalidate_account_caches(account.user_id)
+    publish_balance_change(account, amount)
+
+
+def debit_account(account: Account, amount: float):
+    """
+    Atomically subtracts amount from the account balance in the database.
+
+    The balance check and the update are a single conditional
+    `UPDATE ... WHERE balance >= amount`, so concurrent debits
+    can never overdraw the account. Hot accounts fold their balance
+    shards into the account balance if it is not enough.
+
+    Raises:
+        ValidationError:
+            if account balance is less than amount.
+    """
+    def debit():
+        return Account.objects.filter(
+            pk=account.pk, balance__gte=amount
+        ).update(balance=F('balance') - amount)
+
+    debited = debit()
+    if not debited and account.balance_shards:
+        # Money of a hot account may still be in its shards.
+        fold_balance_shards(account)
+        debited = debit()
+    if not debited:
+        raise ValidationError(
+            {"amount": "Not enough money."}
+        )
+    invalidate_account_caches(account.user_id)
+    publish_balance_change(account, -amount)
+
+
+def fold_balance_shards(account: Account) -> Decimal:
+    """
+    Moves money from balance shards of the account to its balance.
+
+    Every shard is decreased by the amount read from it rather than set
+    to zero, so credits committed in the meantime are never lost.
+    The decrease is conditional, so a shard already folded by
+    a concurrent call is skipped. The account row is locked before
+    any shard, see lock_account_rows. Returns the folded amount.
+    """
+    with transaction.atomic():
+        lock_account_rows([account.pk])
+        shards = list(BalanceShard.objects.filter(
+            account=account, balance__gt=0
+        ).order_by('index').values_list('pk', 'balance'))
+        folded = Decimal(0)
+        for pk, balance in shards:
+            moved = BalanceShard.objects.filter(
+                pk=pk, balance__gte=balance
+            ).update(balance=F('balance') - balance)
+            if moved:
+                folded += balance
+        if folded:
+            Account.objects.filter(pk=account.pk).update(
+                balance=F('balance') + folded
+            )
+        return folded
+
+
+def set_balance_shards(account: Account, count: int):
+    """
+    Turns hot account mode on with count shards, or off if count is 0.
+    """
+    with transaction.atomic():
+        Account.objects.filter(pk=account.pk).update(balance_shards=count)
+        account.balance_shards = count
+        fold_balance_shards(account)
+        # Shards credited by requests that still used the old count
+        # are kept until the next fold.
+        BalanceShard.objects.filter(
+            account=account, index__gte=count, balance=0
+        ).delete()
+        BalanceShard.objects.bulk_create(
+            [BalanceShard(account=account, index=i) for i in range(count)],
+            ignore_conflicts=True
+        )
+
+
+def make_replenishment(account: Account, amount: float) -> Replenishment:
     """
     Replenishes the account with given amount.
 
@@ -44,19 +662,78 @@ def make_replenishment(account: Account, amount: float):
             {"amount": "Should be a positive number."}
         )
     with transaction.atomic():
-        account.balance += amount
-        account.save()
+        credit_account(account, amount)
+        replenishment = Replenishment.objects.create(
+            account=account,
+            amount=amount
+        )
+        LedgerEntry.objects.bulk_create(
+            replenishment_ledger_entries(replenishment)
+        )
+        publish_replenishment(replenishment, account.user_id)
+        return replenishment
 
 
-def make_transfer(from_account: Account, to_account: Account, amount: float):
+def balance_order(account: Account) -> tuple:
     """
-    Transfers given amount from from_account to to_account.
+    Sort key of accounts whose balances are credited together.
+
+    Rows of plain accounts come before shards of hot accounts,
+    see lock_account_rows.
+    """
+    return bool(account.balance_shards), account.pk
+
+
+def make_replenishments(replenishments: list[dict]) -> list[Replenishment]:
+    """
+    Replenishes accounts with a batch of amounts in one transaction.
+
+    Every item of replenishments is a dict with account and amount.
+    Amounts are summed per account so every account balance is changed
+    with one `UPDATE` in balance_order, and replenishments are written
+    with `bulk_create`.
 
     Raises:
         ValidationError:
-            if amount is less or equal to 0.
+            if any amount is less or equal to 0.
+    """
+    accounts = {}
+    totals = defaultdict(Decimal)
+    for item in replenishments:
+        if item['amount'] <= 0:
+            raise ValidationError(
+                {"amount": "Should be a positive number."}
+            )
+        accounts[item['account'].pk] = item['account']
+        totals[item['account'].pk] += item['amount']
+
+    with transaction.atomic():
+        for account in sorted(accounts.values(), key=balance_order):
+            credit_account(account, totals[account.pk])
+        created = Replenishment.objects.bulk_create(
+            Replenishment(account=item['account'], amount=item['amount'])
+            for item in replenishments
+        )
+        LedgerEntry.objects.bulk_create(
+            entry
+            for replenishment in created
+            for entry in replenishment_ledger_entries(replenishment)
+        )
+        for replenishment in created:
+            publish_replenishment(
+                replenishment, replenishment.account.user_id
+            )
+        return created
+
+
+def validate_transfer(from_account: Account, to_account: Account,
+                      amount: float):
+    """
+    Checks transfer arguments that do not depend on account balance.
+
+    Raises:
         ValidationError:
-            if from_account balance is less than transfered amount.
+            if amount is less or equal to 0.
         ValidationError:
             if from_account and to_account are same.
     """
@@ -69,16 +746,255 @@ def make_transfer(from_account: Account, to_account: Account, amount: float):
             {"from_account": "Should be different from to_account.",
              "to_account": "Should be different from from_account."}
         )
-    if amount > from_account.balance:
-        raise ValidationError(
-            {"amount": "Not enough money."}
+
+
+def make_transfer(from_account: Account, to_account: Account,
+                  amount: float) -> Transfer:
+    """
+    Transfers given amount from from_account to to_account.
+
+    Both balances are changed with conditional `UPDATE` statements
+    instead of saving in-memory instances, so concurrent transfers
+    cannot lose updates. Account rows are locked up front,
+    see lock_account_rows.
+
+    Raises:
+        ValidationError:
+            if amount is less or equal to 0.
+        ValidationError:
+            if from_account balance is less than transfered amount.
+        ValidationError:
+            if from_account and to_account are same.
+    """
+    validate_transfer(from_account, to_account, amount)
+
+    with transaction.atomic():
+        # Credits to a hot account take only a shard.
+        locked = [from_account.pk]
+        if not to_account.balance_shards:
+            locked.append(to_account.pk)
+        lock_account_rows(locked)
+        # A failed debit raises and rolls back an already applied credit.
+        if from_account.pk < to_account.pk:
+            debit_account(from_account, amount)
+            credit_account(to_account, amount)
+        else:
+            credit_account(to_account, amount)
+            debit_account(from_account, amount)
+
+        transfer = Transfer.objects.create(
+            from_account=from_account,
+            to_account=to_account,
+            amount=amount
         )
+        LedgerEntry.objects.bulk_create(transfer_ledger_entries(transfer))
+        publish_transfer(transfer, from_account.user_id, to_account.user_id)
+        return transfer
+
+
+def lock_account_rows(account_ids):
+    """
+    Locks account rows in primary key order.
+
+    All balance changes take locks in one order, so concurrent changes
+    cannot deadlock: first rows of all accounts whose row is changed,
+    in primary key order, and only then balance shards, in account
+    primary key order. Debits lock the row before folding shards.
+    """
+    list(Account.objects.select_for_update().filter(
+        pk__in=account_ids
+    ).order_by('pk').values_list('pk', flat=True))
+
+
+def lock_accounts(account_ids) -> dict:
+    """
+    Locks accounts in primary key order and returns them by primary key.
+
+    Accounts are annotated with total_balance. Rows of hot accounts are
+    locked too, so apply_balance_deltas may change rows and shards
+    together in primary key order, see lock_account_rows.
+    """
+    return annotate_total_balance(
+        Account.objects.select_for_update().filter(pk__in=account_ids)
+    ).order_by('pk').in_bulk()
+
+
+def apply_balance_deltas(accounts: dict, deltas: dict):
+    """
+    Changes balance of every account by its delta with one `UPDATE`.
+
+    Accounts must be locked with lock_accounts, they are updated
+    in primary key order.
+    """
+    for pk in sorted(deltas):
+        if deltas[pk] < 0:
+            debit_account(accounts[pk], -deltas[pk])
+        elif deltas[pk] > 0:
+            credit_account(accounts[pk], deltas[pk])
+
+
+def make_transfers(user: User, transfers: list[dict],
+                   atomic: bool = True) -> list[Transfer | ValidationError]:
+    """
+    Executes a batch of transfers from user accounts in one transaction.
+
+    Every item of transfers is a dict with from_account and to_account
+    primary keys and amount. All referenced accounts are fetched and
+    locked with a single query, items are checked against running
+    balances in the given order, and then balances are changed with
+    one `UPDATE` per account and transfers are written with
+    `bulk_create`.
+
+    Returns a list with a saved Transfer or a ValidationError for
+    every item. If atomic is True and any item fails, nothing is saved.
+    """
+    account_ids = set()
+    for item in transfers:
+        account_ids.update((item['from_account'], item['to_account']))
 
     with transaction.atomic():
-        from_balance = from_account.balance - amount
-        from_account.balance = from_balance
-        from_account.save()
+        accounts = lock_accounts(account_ids)
+        balances = {
+            pk: account.total_balance for pk, account in accounts.items()
+        }
+        deltas = defaultdict(Decimal)
+        results = []
+
+        for item in transfers:
+            from_account = accounts.get(item['from_account'])
+            to_account = accounts.get(item['to_account'])
+            amount = item['amount']
+            try:
+                if from_account is None or from_account.user_id != user.pk:
+                    raise ValidationError({"from_account": (
+                        f'Invalid pk "{item["from_account"]}" '
+                        '- object does not exist.'
+                    )})
+                if to_account is None:
+                    raise ValidationError({"to_account": (
+                        f'Invalid pk "{item["to_account"]}" '
+                        '- object does not exist.'
+                    )})
+                validate_transfer(from_account, to_account, amount)
+                if amount > balances[from_account.pk]:
+                    raise ValidationError(
+                        {"amount": "Not enough money."}
+                    )
+            except ValidationError as e:
+                results.append(e)
+                continue
 
-        to_balance = to_account.balance + amount
-        to_account.balance = to_balance
-        to_account.save()
+            balances[from_account.pk] -= amount
+            balances[to_account.pk] += amount
+            deltas[from_account.pk] -= amount
+            deltas[to_account.pk] += amount
+            results.append(Transfer(
+                from_account=from_account,
+                to_account=to_account,
+                amount=amount
+            ))
+
+        failed = any(isinstance(r, ValidationError) for r in results)
+        if atomic and failed:
+            return results
+
+        apply_balance_deltas(accounts, deltas)
+        created = Transfer.objects.bulk_create(
+            [r for r in results if isinstance(r, Transfer)]
+        )
+        LedgerEntry.objects.bulk_create(
+            entry
+            for transfer in created
+            for entry in transfer_ledger_entries(transfer)
+        )
+        for transfer in created:
+            publish_transfer(
+                transfer,
+                transfer.from_account.user_id,
+                transfer.to_account.user_id
+            )
+        return results
+
+
+def enqueue_transfer(from_account: Account, to_account: Account,
+                     amount: float) -> Transfer:
+    """
+    Saves a pending transfer to be executed by process_transfer_queue.
+
+    Balance is checked only when the transfer is executed.
+
+    Raises:
+        ValidationError:
+            if amount is less or equal to 0.
+        ValidationError:
+            if from_account and to_account are same.
+    """
+    validate_transfer(from_account, to_account, amount)
+    transfer = Transfer.objects.create(
+        from_account=from_account,
+        to_account=to_account,
+        amount=amount,
+        status=Transfer.Status.PENDING
+    )
+    publish_transfer(transfer, from_account.user_id, to_account.user_id)
+    return transfer
+
+
+def process_transfer_queue(batch_size: int = 100) -> int:
+    """
+    Executes the oldest pending transfers in one transaction.
+
+    Pending transfers are claimed with `SELECT ... FOR UPDATE SKIP
+    LOCKED`, so concurrent workers take different transfers. Transfers
+    on the same account share one balance `UPDATE`. A transfer that
+    the balance does not cover is marked as failed.
+    Returns number of processed transfers.
+    """
+    with transaction.atomic():
+        queued = list(Transfer.objects.select_for_update(
+            skip_locked=True
+        ).filter(status=Transfer.Status.PENDING).order_by(
+            'created_at'
+        )[:batch_size])
+        if not queued:
+            return 0
+
+        account_ids = set()
+        for transfer in queued:
+            account_ids.update(
+                (transfer.from_account_id, transfer.to_account_id)
+            )
+        accounts = lock_accounts(account_ids)
+        balances = {
+            pk: account.total_balance for pk, account in accounts.items()
+        }
+        deltas = defaultdict(Decimal)
+
+        for transfer in queued:
+            if transfer.amount > balances[transfer.from_account_id]:
+                transfer.status = Transfer.Status.FAILED
+                transfer.failure_reason = "Not enough money."
+                continue
+            balances[transfer.from_account_id] -= transfer.amount
+            balances[transfer.to_account_id] += transfer.amount
+            deltas[transfer.from_account_id] -= transfer.amount
+            deltas[transfer.to_account_id] += transfer.amount
+            transfer.status = Transfer.Status.COMPLETED
+
+        apply_balance_deltas(accounts, deltas)
+        Transfer.objects.bulk_update(queued, ['status', 'failure_reason'])
+        # Ledger shows when money was moved, not when it was queued.
+        executed_at = timezone.now()
+        LedgerEntry.objects.bulk_create(
+            entry
+            for transfer in queued
+            if transfer.status == Transfer.Status.COMPLETED
+            for entry in transfer_ledger_entries(transfer, executed_at)
+        )
+        for transfer in queued:
+            publish_transfer(
+                transfer,
+                accounts[transfer.from_account_id].user_id,
+                accounts[transfer.to_account_id].user_id
+            )
+        return len(queued)
@@ -0,0 +1,73 @@
+import csv
+import json
+from itertools import islice
+from typing import Iterable, Iterator
+
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+
+STATEMENT_COLUMNS = (
+    'created_at',
+    'kind',
+    'amount',
+    'balance',
+    'transfer',
+    'replenishment',
+)
+
+# Statement lines read from the database by one call in a thread.
+ASYNC_CHUNK_LINES = 500
+
+
+class Echo:
+    """File-like object that returns written value instead of storing it."""
+    def write(self, value):
+        return value
+
+
+def _format(value) -> str:
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def stream_csv(rows: Iterable[tuple]) -> Iterator[str]:
+    """Yields statement rows as CSV lines, header first."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(STATEMENT_COLUMNS)
+    for row in rows:
+        yield writer.writerow([_format(value) for value in row])
+
+
+def stream_ndjson(rows: Iterable[tuple]) -> Iterator[str]:
+    """Yields statement rows as newline-delimited JSON objects."""
+    for row in rows:
+        yield json.dumps(dict(zip(
+            STATEMENT_COLUMNS,
+            (None if value is None else _format(value) for value in row)
+        ))) + '\n'
+
+
+def _take(iterator: Iterator[bytes], count: int) -> bytes:
+    return b''.join(islice(iterator, count))
+
+
+class StatementResponse(StreamingHttpResponse):
+    """
+    Streams a statement read from the database under WSGI and ASGI.
+
+    Under ASGI Django would read the whole synchronous iterator into
+    memory before sending anything, so lines are read in chunks of
+    ASYNC_CHUNK_LINES in a thread instead, keeping the database
+    connection of the request.
+    """
+    async def __aiter__(self):
+        iterator = iter(self.streaming_content)
+        take = sync_to_async(_take)
+        while True:
+            chunk = await take(iterator, ASYNC_CHUNK_LINES)
+            if not chunk:
+                break
+            yield chunk
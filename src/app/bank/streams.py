@@ -0,0 +1,129 @@
+"""
+Server-sent events stream of balance changes, transfers and replenishments.
+
+The stream is a plain ASGI application in front of Django, because
+Django 4.2 only notices a client disconnecting while it reads the
+request body, so a stream served by Django would never end.
+"""
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+
+from .authentication import aauthenticate_token
+from .events import get_broker, hub
+
+# Tells the client that events were dropped and it should reload state.
+RESYNC_EVENT = b'event: resync\ndata: {}\n\n'
+
+KEEPALIVE_COMMENT = b': keepalive\n\n'
+
+
+def format_event(event) -> bytes:
+    data = json.dumps(event.data, cls=DjangoJSONEncoder)
+    return f'id: {event.id}\nevent: {event.kind}\ndata: {data}\n\n'.encode()
+
+
+async def wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+class EventStreamApp:
+    """
+    ASGI application streaming events of the token owner.
+
+    Requests to path are served as a `text/event-stream`, all other
+    requests are passed to application. Clients authenticate with
+    the `Authorization: Token <key>` header like in the rest of the API.
+    Events are `balance` with account and amount of the change,
+    and `transfer` and `replenishment` with the created or updated
+    object. Clients should load their state after the stream is open
+    and on `resync`. A comment is sent every EVENTS_KEEPALIVE_SECONDS
+    so proxies do not close an idle stream.
+    """
+    def __init__(self, application, path: str):
+        self.application = application
+        self.path = path
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] != self.path:
+            return await self.application(scope, receive, send)
+
+        if scope['method'] != 'GET':
+            return await self.error(
+                send, f'Method "{scope["method"]}" not allowed.', 405
+            )
+        headers = dict(scope['headers'])
+        auth = headers.get(b'authorization', b'').decode('latin-1').split()
+        if len(auth) != 2 or auth[0].lower() != 'token':
+            return await self.error(
+                send, "Authentication credentials were not provided.", 401
+            )
+        user = await aauthenticate_token(auth[1])
+        # The stream outlives any database connection it could hold.
+        await sync_to_async(close_old_connections)()
+        if user is None:
+            return await self.error(send, "Invalid token.", 401)
+
+        await self.stream(user, receive, send)
+
+    async def stream(self, user, receive, send):
+        keepalive = getattr(settings, 'EVENTS_KEEPALIVE_SECONDS', 15)
+        subscription = hub.subscribe(user.pk)
+        disconnected = asyncio.ensure_future(wait_disconnect(receive))
+        try:
+            # Events published once the stream is open are not missed.
+            await sync_to_async(
+                get_broker().subscribe, thread_sensitive=False
+            )(user.pk)
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [
+                    (b'content-type', b'text/event-stream'),
+                    (b'cache-control', b'no-cache'),
+                    # Stops nginx from buffering the stream.
+                    (b'x-accel-buffering', b'no'),
+                ],
+            })
+            while True:
+                event = asyncio.ensure_future(subscription.queue.get())
+                await asyncio.wait(
+                    (event, disconnected),
+                    timeout=keepalive,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if disconnected.done():
+                    event.cancel()
+                    break
+                if event.done():
+                    body = format_event(event.result())
+                else:
+                    event.cancel()
+                    body = KEEPALIVE_COMMENT
+                if subscription.overflowed:
+                    subscription.overflowed = False
+                    body += RESYNC_EVENT
+                await send({
+                    'type': 'http.response.body',
+                    'body': body,
+                    'more_body': True,
+                })
+        finally:
+            hub.unsubscribe(subscription)
+            disconnected.cancel()
+
+    async def error(self, send, detail: str, status: int):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json')],
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': json.dumps({"detail": detail}).encode(),
+        })
@@ -0,0 +1,861 @@
+import csv
+import io
+import json
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from app.asgi import application
+
+from bank.models import (
+    Customer, Account, IdempotencyKey, LedgerEntry, Replenishment, Transfer
+)
+from bank.idempotency import IDEMPOTENCY_KEY_TTL
+from bank.services import make_replenishment, make_transfer
+
+
+TRANSFER_BATCH_URL = reverse('api:transfer-batch')
+REPLENISHMENT_BATCH_URL = reverse('api:replenishment-batch')
+TRANSFER_URL = reverse('api:transfer-list')
+ACCOUNT_URL = reverse('api:account-list')
+CUSTOMER_URL = reverse('api:customer')
+SUMMARY_URL = reverse('api:summary')
+
+
+def sample_user(email="test@test.com", password="testpass"):
+    """Create a sample user"""
+    return get_user_model().objects.create_user(email, password)
+
+
+class TransferBatchApiTest(TestCase):
+    def setUp(self):
+        self.user = sample_user(email="test1@test.com")
+        self.other = sample_user(email="test2@test.com")
+        self.account1 = Account.objects.create(user=self.user, balance=100)
+        self.account2 = Account.objects.create(user=self.user, balance=0)
+        self.other_account = Account.objects.create(user=self.other)
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def transfer(self, from_account, to_account, amount):
+        return {
+            'from_account': str(from_account.id),
+            'to_account': str(to_account.id),
+            'amount': amount,
+        }
+
+    def test_batch_success(self):
+        payload = {'transfers': [
+            self.transfer(self.account1, self.other_account, '30.00'),
+            self.transfer(self.account1, self.account2, '50.00'),
+            self.transfer(self.account2, self.other_account, '20.00'),
+        ]}
+        res = self.client.post(TRANSFER_BATCH_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [r['status'] for r in res.data['transfers']], ['created'] * 3
+        )
+        self.assertEqual(Transfer.objects.count(), 3)
+        self.account1.refresh_from_db()
+        self.account2.refresh_from_db()
+        self.other_account.refresh_from_db()
+        self.assertEqual(self.account1.balance, 20)
+        self.assertEqual(self.account2.balance, 30)
+        self.assertEqual(self.other_account.balance, 50)
+
+    def test_batch_query_count_is_constant(self):
+        payload = {'transfers': [
+            self.transfer(self.account1, self.other_account, '1.00')
+            for _ in range(20)
+        ]}
+        # savepoint, select accounts, two updates,
+        # transfers and ledger inserts, release
+        with self.assertNumQueries(7):
+            res = self.client.post(
+                TRANSFER_BATCH_URL, payload, format='json'
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Transfer.objects.count(), 20)
+
+    def test_batch_atomic_failure(self):
+        payload = {'transfers': [
+            self.transfer(self.account1, self.other_account, '60.00'),
+            self.transfer(self.account1, self.other_account, '60.00'),
+        ]}
+        res = self.client.post(TRANSFER_BATCH_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            [r['status'] for r in res.data['transfers']],
+            ['cancelled', 'failed']
+        )
+        self.assertFalse(Transfer.objects.exists())
+        self.account1.refresh_from_db()
+        self.assertEqual(self.account1.balance, 100)
+
+    def test_batch_best_effort(self):
+        payload = {'atomic': False, 'transfers': [
+            self.transfer(self.account1, self.other_account, '60.00'),
+            self.transfer(self.account1, self.other_account, '60.00'),
+            self.transfer(self.other_account, self.account1, '1.00'),
+            self.transfer(self.account1, self.account1, '1.00'),
+        ]}
+        res = self.client.post(TRANSFER_BATCH_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        results = res.data['transfers']
+        self.assertEqual(
+            [r['status'] for r in results],
+            ['created', 'failed', 'failed', 'failed']
+        )
+        self.assertIn('amount', results[1]['errors'])
+        self.assertIn('from_account', results[2]['errors'])
+        self.assertEqual(Transfer.objects.count(), 1)
+        self.other_account.refresh_from_db()
+        self.assertEqual(self.other_account.balance, 60)
+
+    def test_batch_invalid_payload(self):
+        res = self.client.post(
+            TRANSFER_BATCH_URL, {'transfers': []}, format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_batch_requires_authentication(self):
+        self.client.force_authenticate(None)
+        res = self.client.post(TRANSFER_BATCH_URL, {}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class ReplenishmentBatchApiTest(TestCase):
+    def setUp(self):
+        self.user = sample_user(email="test1@test.com")
+        self.account1 = Account.objects.create(user=self.user)
+        self.account2 = Account.objects.create(user=self.user)
+        self.other_account = Account.objects.create(
+            user=sample_user(email="test2@test.com")
+        )
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_batch_success(self):
+        payload = {'replenishments': [
+            {'account': str(self.account1.id), 'amount': '10.00'},
+            {'account': str(self.account2.id), 'amount': '5.00'},
+            {'account': str(self.account1.id), 'amount': '2.50'},
+        ]}
+        # select accounts, savepoint, two updates,
+        # replenishments and ledger inserts, release
+        with self.assertNumQueries(7):
+            res = self.client.post(
+                REPLENISHMENT_BATCH_URL, payload, format='json'
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data['replenishments']), 3)
+        self.assertEqual(Replenishment.objects.count(), 3)
+        self.account1.refresh_from_db()
+        self.account2.refresh_from_db()
+        self.assertEqual(self.account1.balance, 12.5)
+        self.assertEqual(self.account2.balance, 5)
+
+    def test_batch_foreign_account(self):
+        payload = {'replenishments': [
+            {'account': str(self.account1.id), 'amount': '10.00'},
+            {'account': str(self.other_account.id), 'amount': '5.00'},
+        ]}
+        res = self.client.post(
+            REPLENISHMENT_BATCH_URL, payload, format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Replenishment.objects.exists())
+
+    def test_batch_negative_amount(self):
+        payload = {'replenishments': [
+            {'account': str(self.account1.id), 'amount': '10.00'},
+            {'account': str(self.account2.id), 'amount': '-5.00'},
+        ]}
+        res = self.client.post(
+            REPLENISHMENT_BATCH_URL, payload, format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Replenishment.objects.exists())
+        self.account1.refresh_from_db()
+        self.assertEqual(self.account1.balance, 0)
+
+
+class TransferHistoryApiTest(TestCase):
+    def setUp(self):
+        self.user = sample_user(email="test1@test.com")
+        self.account = Account.objects.create(user=self.user)
+        self.other_account = Account.objects.create(
+            user=sample_user(email="test2@test.com")
+        )
+        for i in range(5):
+            Transfer.objects.create(
+                from_account=self.account,
+                to_account=self.other_account,
+                amount=i + 1
+            )
+            Transfer.objects.create(
+                from_account=self.other_account,
+                to_account=self.account,
+                amount=i + 1
+            )
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_is_paginated(self):
+        res = self.client.get(TRANSFER_URL, {'page_size': 4})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 4)
+        self.assertIsNotNone(res.data['next'])
+
+    def test_pages_cover_history_once(self):
+        ids = []
+        url = TRANSFER_URL + '?page_size=3'
+        while url:
+            res = self.client.get(url)
+            ids.extend(t['id'] for t in res.data['results'])
+            url = res.data['next']
+
+        self.assertEqual(len(ids), 10)
+        self.assertEqual(len(set(ids)), 10)
+        expected = Transfer.objects.order_by('-created_at', '-id')
+        self.assertEqual(ids, [str(t.id) for t in expected])
+
+    def test_retrieve_incoming_transfer(self):
+        transfer = Transfer.objects.filter(to_account=self.account).first()
+        res = self.client.get(
+            reverse('api:transfer-detail', args=[transfer.id])
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_list_created_between(self):
+        old = Transfer.objects.order_by('created_at')[:4]
+        Transfer.objects.filter(pk__in=[t.pk for t in old]).update(
+            created_at=timezone.now() - timezone.timedelta(days=40)
+        )
+        month_ago = (timezone.now() - timezone.timedelta(days=30)).isoformat()
+
+        res = self.client.get(TRANSFER_URL, {'created_after': month_ago})
+        self.assertEqual(len(res.data['results']), 6)
+
+        res = self.client.get(TRANSFER_URL, {'created_before': month_ago})
+        self.assertEqual(len(res.data['results']), 4)
+
+    def test_list_invalid_created_after(self):
+        for value in ('yesterday', '2024-02-30T00:00:00'):
+            res = self.client.get(TRANSFER_URL, {'created_after': value})
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AccountLedgerApiTest(TestCase):
+    def setUp(self):
+        self.user = sample_user(email="test1@test.com")
+        self.account = Account.objects.create(user=self.user)
+        self.other_account = Account.objects.create(
+            user=sample_user(email="test2@test.com")
+        )
+        make_replenishment(self.account, 100)
+        make_transfer(self.account, self.other_account, 30)
+        make_replenishment(self.other_account, 50)
+        make_transfer(self.other_account, self.account, 20)
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def ledger_url(self, account):
+        return reverse('api:account-ledger', args=[account.id])
+
+    def test_ledger(self):
+        res = self.client.get(self.ledger_url(self.account))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(e['kind'], e['amount']) for e in res.data['results']],
+            [('transfer_in', '20.00'),
+             ('transfer_out', '-30.00'),
+             ('replenishment', '100.00')]
+        )
+
+    def test_ledger_sums_to_balance(self):
+        for account in (self.account, self.other_account):
+            account.refresh_from_db()
+            total = sum(
+                e.amount for e in LedgerEntry.objects.filter(account=account)
+            )
+            self.assertEqual(total, account.balance)
+
+    def test_balance(self):
+        url = reverse('api:account-balance', args=[self.account.id])
+
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['balance'], '90.00')
+
+        entry = LedgerEntry.objects.get(
+            account=self.account, kind=LedgerEntry.Kind.TRANSFER_OUT
+        )
+        res = self.client.get(url, {'at': entry.created_at.isoformat()})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['balance'], '70.00')
+
+        for value in ('now', '2024-13-01T00:00:00'):
+            res = self.client.get(url, {'at': value})
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_ledger_foreign_account(self):
+        res = self.client.get(self.ledger_url(self.other_account))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class AccountStatementApiTest(TestCase):
+    def setUp(self):
+        self.user = sample_user(email="test1@test.com")
+        self.account = Account.objects.create(user=self.user)
+        self.other_account = Account.objects.create(
+            user=sample_user(email="test2@test.com")
+        )
+        make_replenishment(self.account, 100)
+        self.transfer = make_transfer(self.account, self.other_account, 30)
+        make_replenishment(self.account, 5)
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def statement_url(self, account):
+        return reverse('api:account-statement', args=[account.id])
+
+    def read(self, res):
+        return b''.join(res.streaming_content).decode()
+
+    def test_statement_csv(self):
+        res = self.client.get(self.statement_url(self.account))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(self.read(res).splitlines()))
+        self.assertEqual(
+            [(r['kind'], r['amount'], r['balance']) for r in rows],
+            [('replenishment', '100.00', '100.00'),
+             ('transfer_out', '-30.00', '70.00'),
+             ('replenishment', '5.00', '75.00')]
+        )
+        self.assertEqual(rows[1]['transfer'], str(self.transfer.id))
+
+    def test_statement_ndjson_period(self):
+        res = self.client.get(self.statement_url(self.account), {
+            'export': 'ndjson',
+            'start': self.transfer.created_at.isoformat(),
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        rows = [json.loads(line) for line in self.read(res).splitlines()]
+        self.assertEqual(
+            [(r['kind'], r['balance']) for r in rows],
+            [('transfer_out', '70.00'), ('replenishment', '75.00')]
+        )
+        self.assertIsNone(rows[0]['replenishment'])
+
+    def test_statement_invalid_params(self):
+        url = self.statement_url(self.account)
+
+        res = self.client.get(url, {'export': 'xml'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        for value in ('yesterday', '2024-02-30T00:00:00'):
+            res = self.client.get(url, {'start': value})
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_statement_foreign_account(self):
+        res = self.client.get(self.statement_url(self.other_account))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class AccountStatementAsgiTest(TransactionTestCase):
+    """Statement served by the ASGI application run in production."""
+    def setUp(self):
+        self.user = sample_user()
+        self.token = Token.objects.create(user=self.user)
+        self.account = Account.objects.create(user=self.user)
+        for amount in (1, 2, 3):
+            make_replenishment(self.account, amount)
+
+    @mock.patch('bank.statements.ASYNC_CHUNK_LINES', 2)
+    async def test_statement(self):
+        url = reverse('api:account-statement', args=[self.account.id])
+        scope = {
+            'type': 'http',
+            'method': 'GET',
+            'path': url,
+            'query_string': b'',
+            'headers': [
+                (b'host', b'testserver'),
+                (b'authorization', f'Token {self.token.key}'.encode()),
+            ],
+        }
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            messages.append(message)
+
+        await application(scope, receive, send)
+
+        self.assertEqual(messages[0]['status'], status.HTTP_200_OK)
+        bodies = [message.get('body', b'') for message in messages[1:]]
+        # Header and statement lines are sent two lines at a time.
+        self.assertEqual(len(bodies), 3)
+        self.assertEqual(bodies[-1], b'')
+        rows = list(csv.DictReader(b''.join(bodies).decode().splitlines()))
+        self.assertEqual(
+            [row['balance'] for row in rows], ['1.00', '3.00', '6.00']
+        )
+
+
+class AccountApiTest(TestCase):
+    def setUp(self):
+        self.user = sample_user(email="test1@test.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_accounts(self, count):
+        for _ in range(count):
+            account = Account.objects.create(user=self.user)
+            make_replenishment(account, 10)
+            make_replenishment(account, 5)
+
+    def test_list_summary(self):
+        self.create_accounts(1)
+        res = self.client.get(ACCOUNT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[0]['replenishments_count'], 2)
+        self.assertEqual(res.data[0]['replenishments_total'], '15.00')
+        self.assertNotIn('replenishments', res.data[0])
+
+    def test_list_query_count_is_constant(self):
+        self.create_accounts(10)
+        with self.assertNumQueries(1):
+            res = self.client.get(ACCOUNT_URL)
+        self.assertEqual(len(res.data), 10)
+
+        with self.assertNumQueries(2):
+            res = self.client.get(ACCOUNT_URL, {'include': 'replenishments'})
+        self.assertEqual(len(res.data[0]['replenishments']), 2)
+
+    def test_create_account(self):
+        res = self.client.post(ACCOUNT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['replenishments_count'], 0)
+        self.assertTrue(Account.objects.filter(user=self.user).exists())
+
+
+class CustomerApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = sample_user(email="test1@test.com")
+        self.customer = Customer.objects.create(
+            user=self.user,
+            fname="John",
+            lname="Doe",
+            city="New York"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_retrieve_is_cached(self):
+        with self.assertNumQueries(1):
+            res = self.client.get(CUSTOMER_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['fname'], "John")
+        self.assertEqual(
+            res.data['date_created'], self.user.date_joined.date()
+        )
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(CUSTOMER_URL)
+        self.assertEqual(cached.data, res.data)
+
+    def test_update_invalidates_cache(self):
+        self.client.get(CUSTOMER_URL)
+        res = self.client.patch(CUSTOMER_URL, {'city': "Boston"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.get(CUSTOMER_URL)
+        self.assertEqual(res.data['city'], "Boston")
+
+    def test_retrieve_is_cached_per_user(self):
+        self.client.get(CUSTOMER_URL)
+        other = sample_user(email="test2@test.com")
+        Customer.objects.create(
+            user=other, fname="Jane", lname="Roe", city="Paris"
+        )
+        self.client.force_authenticate(other)
+
+        res = self.client.get(CUSTOMER_URL)
+        self.assertEqual(res.data['fname'], "Jane")
+
+
+class AccountSummaryApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = sample_user(email="test1@test.com")
+        self.account1 = Account.objects.create(user=self.user)
+        self.account2 = Account.objects.create(user=self.user)
+        self.other_account = Account.objects.create(
+            user=sample_user(email="test2@test.com")
+        )
+        make_replenishment(self.account1, 100)
+        make_transfer(self.account1, self.account2, 30)
+        make_transfer(self.account1, self.other_account, 20)
+        make_transfer(self.other_account, self.account2, 5)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_summary(self):
+        with self.assertNumQueries(1):
+            res = self.client.get(SUMMARY_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        summary1, summary2 = res.data
+        self.assertEqual(summary1['id'], str(self.account1.id))
+        self.assertEqual(summary1['balance'], '50.00')
+        self.assertEqual(summary1['total_in'], '100.00')
+        self.assertEqual(summary1['total_out'], '50.00')
+        self.assertEqual(summary1['replenishments_count'], 1)
+        self.assertEqual(summary1['transfers_in_count'], 0)
+        self.assertEqual(summary1['transfers_out_count'], 2)
+        self.assertEqual(summary2['balance'], '35.00')
+        self.assertEqual(summary2['total_in'], '35.00')
+        self.assertEqual(summary2['total_out'], '0.00')
+        self.assertEqual(summary2['transfers_in_count'], 2)
+        self.assertEqual(
+            summary2['last_activity'],
+            LedgerEntry.objects.filter(
+                account=self.account2
+            ).latest('created_at').created_at.isoformat().replace(
+                '+00:00', 'Z'
+            )
+        )
+
+    def test_summary_ignores_pending_transfers(self):
+        Transfer.objects.create(
+            from_account=self.account1,
+            to_account=self.account2,
+            amount=10,
+            status=Transfer.Status.PENDING
+        )
+
+        res = self.client.get(SUMMARY_URL)
+
+        self.assertEqual(res.data[0]['total_out'], '50.00')
+        self.assertEqual(res.data[0]['transfers_out_count'], 2)
+
+    def test_new_account_summary(self):
+        account = Account.objects.create(user=self.user)
+
+        res = self.client.get(SUMMARY_URL)
+
+        self.assertEqual(len(res.data), 3)
+        self.assertEqual(res.data[2]['balance'], '0.00')
+        self.assertEqual(res.data[2]['total_in'], '0.00')
+        self.assertEqual(
+            res.data[2]['last_activity'],
+            account.created_at.isoformat().replace('+00:00', 'Z')
+        )
+
+    def test_summary_is_cached(self):
+        self.client.get(SUMMARY_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(SUMMARY_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_transfer_invalidates_summary(self):
+        self.client.get(SUMMARY_URL)
+        other = APIClient()
+        other.force_authenticate(self.other_account.user)
+        other.get(SUMMARY_URL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            make_transfer(self.account2, self.other_account, 15)
+
+        res = self.client.get(SUMMARY_URL)
+        self.assertEqual(res.data[1]['balance'], '20.00')
+        res = other.get(SUMMARY_URL)
+        self.assertEqual(res.data[0]['balance'], '30.00')
+
+    def test_new_account_invalidates_summary(self):
+        self.client.get(SUMMARY_URL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(ACCOUNT_URL)
+
+        res = self.client.get(SUMMARY_URL)
+        self.assertEqual(len(res.data), 3)
+
+
+class IdempotencyApiTest(TestCase):
+    def setUp(self):
+        self.user = sample_user(email="test1@test.com")
+        self.account = Account.objects.create(user=self.user, balance=100)
+        self.other_account = Account.objects.create(
+            user=sample_user(email="test2@test.com")
+        )
+        self.payload = {
+            'from_account': str(self.account.id),
+            'to_account': str(self.other_account.id),
+            'amount': '10.00',
+        }
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_retry_returns_stored_response(self):
+        res1 = self.client.post(
+            TRANSFER_URL, self.payload, HTTP_IDEMPOTENCY_KEY='key-1'
+        )
+        self.assertEqual(res1.status_code, status.HTTP_201_CREATED)
+
+        # one indexed lookup of the key
+        with self.assertNumQueries(3):
+            res2 = self.client.post(
+                TRANSFER_URL, self.payload, HTTP_IDEMPOTENCY_KEY='key-1'
+            )
+        self.assertEqual(res2.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res2.data['id'], res1.data['id'])
+        self.assertEqual(res2['Idempotent-Replayed'], 'true')
+        self.assertEqual(Transfer.objects.count(), 1)
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, 90)
+
+    def test_different_keys_execute(self):
+        self.client.post(
+            TRANSFER_URL, self.payload, HTTP_IDEMPOTENCY_KEY='key-1'
+        )
+        self.client.post(
+            TRANSFER_URL, self.payload, HTTP_IDEMPOTENCY_KEY='key-2'
+        )
+
+        self.assertEqual(Transfer.objects.count(), 2)
+
+    def test_key_reused_for_different_request(self):
+        self.client.post(
+            TRANSFER_URL, self.payload, HTTP_IDEMPOTENCY_KEY='key-1'
+        )
+        payload = dict(self.payload, amount='20.00')
+        res = self.client.post(
+            TRANSFER_URL, payload, HTTP_IDEMPOTENCY_KEY='key-1'
+        )
+
+        self.assertEqual(
+            res.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+        self.assertEqual(Transfer.objects.count(), 1)
+
+    def test_failed_request_is_not_stored(self):
+        payload = dict(self.payload, amount='1000.00')
+        res = self.client.post(
+            TRANSFER_URL, payload, HTTP_IDEMPOTENCY_KEY='key-1'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_replenishment_retry(self):
+        url = reverse('api:replenishment-list')
+        payload = {'account': str(self.account.id), 'amount': '5.00'}
+        for _ in range(2):
+            res = self.client.post(
+                url, payload, HTTP_IDEMPOTENCY_KEY='key-1'
+            )
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        self.assertEqual(Replenishment.objects.count(), 1)
+
+    def test_purge_expired_keys(self):
+        self.client.post(
+            TRANSFER_URL, self.payload, HTTP_IDEMPOTENCY_KEY='key-1'
+        )
+        self.client.post(
+            TRANSFER_URL, self.payload, HTTP_IDEMPOTENCY_KEY='key-2'
+        )
+        IdempotencyKey.objects.filter(key='key-1').update(
+            created_at=timezone.now() - IDEMPOTENCY_KEY_TTL
+        )
+        call_command('purge_idempotency_keys', stdout=io.StringIO())
+
+        self.assertEqual(
+            list(IdempotencyKey.objects.values_list('key', flat=True)),
+            ['key-2']
+        )
+
+
+class QueuedTransferApiTest(TestCase):
+    def setUp(self):
+        self.user = sample_user(email="test1@test.com")
+        self.account = Account.objects.create(user=self.user, balance=100)
+        self.other_account = Account.objects.create(
+            user=sample_user(email="test2@test.com")
+        )
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post_async(self, amount):
+        return self.client.post(TRANSFER_URL, {
+            'from_account': str(self.account.id),
+            'to_account': str(self.other_account.id),
+            'amount': amount,
+        }, HTTP_PREFER='respond-async')
+
+    def test_transfer_is_queued(self):
+        res = self.post_async('10.00')
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res['Preference-Applied'], 'respond-async')
+        self.assertEqual(res.data['status'], 'pending')
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, 100)
+        self.assertFalse(LedgerEntry.objects.exists())
+
+    def test_queued_transfers_are_executed(self):
+        completed = self.post_async('60.00').data['id']
+        failed = self.post_async('60.00').data['id']
+
+        err = io.StringIO()
+        call_command('run_transfer_workers', once=True, stderr=err)
+        self.assertIn("set EVENTS_BROKER=cache", err.getvalue())
+
+        url = reverse('api:transfer-detail', args=[completed])
+        res = self.client.get(url)
+        self.assertEqual(res.data['status'], 'completed')
+        res = self.client.get(reverse('api:transfer-detail', args=[failed]))
+        self.assertEqual(res.data['status'], 'failed')
+        self.assertEqual(res.data['failure_reason'], 'Not enough money.')
+
+        self.account.refresh_from_db()
+        self.other_account.refresh_from_db()
+        self.assertEqual(self.account.balance, 40)
+        self.assertEqual(self.other_account.balance, 60)
+        self.assertEqual(LedgerEntry.objects.count(), 2)
+
+    def test_queued_transfer_is_validated(self):
+        res = self.client.post(TRANSFER_URL, {
+            'from_account': str(self.account.id),
+            'to_account': str(self.account.id),
+            'amount': '10.00',
+        }, HTTP_PREFER='respond-async')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Transfer.objects.exists())
+
+
+@override_settings(ETAGS_ENABLED=True)
+class ConditionalGetApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = sample_user(email="test1@test.com")
+        self.account = Account.objects.create(user=self.user)
+        self.other_account = Account.objects.create(
+            user=sample_user(email="test2@test.com")
+        )
+        Customer.objects.create(
+            user=self.user, fname="John", lname="Doe", city="Minsk"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_not_modified(self):
+        etag = self.client.get(ACCOUNT_URL)['ETag']
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ACCOUNT_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+
+    def test_balance_change(self):
+        etag = self.client.get(ACCOUNT_URL)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            make_replenishment(self.account, 10)
+
+        res = self.client.get(ACCOUNT_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertEqual(res.data[0]['balance'], '10.00')
+
+    def test_incoming_transfer(self):
+        url = reverse('api:account-detail', args=[self.account.id])
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            make_replenishment(self.other_account, 10)
+            make_transfer(self.other_account, self.account, 5)
+
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['balance'], '5.00')
+
+    def test_representations_differ(self):
+        etag = self.client.get(ACCOUNT_URL)['ETag']
+
+        res = self.client.get(
+            ACCOUNT_URL,
+            {'include': 'replenishments'},
+            HTTP_IF_NONE_MATCH=etag
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_customer_update(self):
+        etag = self.client.get(CUSTOMER_URL)['ETag']
+        self.assertEqual(
+            self.client.get(
+                CUSTOMER_URL, HTTP_IF_NONE_MATCH=etag
+            ).status_code,
+            status.HTTP_304_NOT_MODIFIED
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(CUSTOMER_URL, {'city': "Vilnius"})
+
+        res = self.client.get(CUSTOMER_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['city'], "Vilnius")
+
+    @override_settings(ETAGS_ENABLED=False)
+    def test_disabled_without_shared_cache(self):
+        res = self.client.get(ACCOUNT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('ETag', res)
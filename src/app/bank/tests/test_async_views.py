@@ -0,0 +1,159 @@
+import base64
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+
+from bank.authentication import token_cache
+from bank.models import Account, Transfer
+
+
+ACCOUNT_URL = reverse('api:async-account-list')
+TRANSFER_URL = reverse('api:async-transfer-list')
+
+
+def sample_user(email="test@test.com", password="testpass"):
+    """Create a sample user"""
+    return get_user_model().objects.create_user(email, password)
+
+
+class AsyncViewsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.user = sample_user(email="test1@test.com")
+        self.token = Token.objects.create(user=self.user)
+        self.account = Account.objects.create(user=self.user, balance=100)
+        self.other_account = Account.objects.create(
+            user=sample_user(email="test2@test.com")
+        )
+        self.headers = {'AUTHORIZATION': f'Token {self.token.key}'}
+
+    async def test_account_list(self):
+        res = await self.async_client.get(ACCOUNT_URL, **self.headers)
+
+        self.assertEqual(res.status_code, 200)
+        data = res.json()
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0]['id'], str(self.account.id))
+        self.assertEqual(data[0]['balance'], '100.00')
+
+    async def test_account_balance(self):
+        url = reverse('api:async-account-balance', args=[self.account.id])
+        res = await self.async_client.get(url, **self.headers)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()['balance'], '100.00')
+
+    async def test_foreign_account_not_found(self):
+        url = reverse('api:async-account-detail', args=[self.other_account.id])
+        res = await self.async_client.get(url, **self.headers)
+
+        self.assertEqual(res.status_code, 404)
+
+    async def test_authentication_required(self):
+        res = await self.async_client.get(ACCOUNT_URL)
+        self.assertEqual(res.status_code, 401)
+
+        res = await self.async_client.get(
+            ACCOUNT_URL, AUTHORIZATION='Token invalid'
+        )
+        self.assertEqual(res.status_code, 401)
+
+    async def test_create_and_list_transfers(self):
+        for amount in ('10.00', '20.00', '30.00'):
+            res = await self.async_client.post(
+                TRANSFER_URL,
+                {
+                    'from_account': str(self.account.id),
+                    'to_account': str(self.other_account.id),
+                    'amount': amount,
+                },
+                content_type='application/json',
+                **self.headers
+            )
+            self.assertEqual(res.status_code, 201)
+
+        res = await self.async_client.get(
+            TRANSFER_URL, {'page_size': 2}, **self.headers
+        )
+        page = res.json()
+        self.assertEqual(
+            [t['amount'] for t in page['results']], ['30.00', '20.00']
+        )
+
+        res = await self.async_client.get(
+            TRANSFER_URL, {'page_size': 2, 'cursor': page['next']},
+            **self.headers
+        )
+        page = res.json()
+        self.assertEqual([t['amount'] for t in page['results']], ['10.00'])
+        self.assertIsNone(page['next'])
+
+        await sync_to_async(self.account.refresh_from_db)()
+        self.assertEqual(self.account.balance, 40)
+
+    async def test_create_transfer_not_enough_money(self):
+        res = await self.async_client.post(
+            TRANSFER_URL,
+            {
+                'from_account': str(self.account.id),
+                'to_account': str(self.other_account.id),
+                'amount': '1000.00',
+            },
+            content_type='application/json',
+            **self.headers
+        )
+
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('amount', res.json()['detail'])
+        self.assertFalse(await Transfer.objects.aexists())
+
+    async def test_invalid_cursor(self):
+        for value in ('2022-01-01T00:00:00+00:00|not-a-uuid',
+                      '2022-13-01T00:00:00+00:00|' + str(self.account.id),
+                      'no separator'):
+            cursor = base64.urlsafe_b64encode(value.encode()).decode()
+            res = await self.async_client.get(
+                TRANSFER_URL, {'cursor': cursor}, **self.headers
+            )
+
+            self.assertEqual(res.status_code, 404)
+
+    async def test_invalid_page_size(self):
+        res = await self.async_client.get(
+            TRANSFER_URL, {'page_size': -5}, **self.headers
+        )
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()['results'], [])
+
+    async def test_create_transfer_idempotency_key(self):
+        payload = {
+            'from_account': str(self.account.id),
+            'to_account': str(self.other_account.id),
+            'amount': '10.00',
+        }
+        responses = [
+            await self.async_client.post(
+                TRANSFER_URL, payload, content_type='application/json',
+                IDEMPOTENCY_KEY='key-1', **self.headers
+            )
+            for _ in range(2)
+        ]
+
+        self.assertEqual([r.status_code for r in responses], [201, 201])
+        self.assertEqual(responses[1]['Idempotent-Replayed'], 'true')
+        self.assertEqual(responses[0].json(), responses[1].json())
+        self.assertEqual(await Transfer.objects.acount(), 1)
+
+        res = await self.async_client.post(
+            TRANSFER_URL, dict(payload, amount='20.00'),
+            content_type='application/json',
+            IDEMPOTENCY_KEY='key-1', **self.headers
+        )
+        self.assertEqual(res.status_code, 422)
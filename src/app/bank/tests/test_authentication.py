@@ -0,0 +1,70 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from bank.authentication import token_cache
+
+
+ACCOUNT_URL = reverse('api:account-list')
+LOGOUT_URL = reverse('rest_logout')
+
+
+def sample_user(email="test@test.com", password="testpass"):
+    """Create a sample user"""
+    return get_user_model().objects.create_user(email, password)
+
+
+class CachedTokenAuthenticationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.user = sample_user()
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_token_is_cached(self):
+        # token lookup and account list
+        with self.assertNumQueries(2):
+            res = self.client.get(ACCOUNT_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(ACCOUNT_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_shared_cache_tier(self):
+        self.client.get(ACCOUNT_URL)
+        # Other worker processes start with an empty local cache.
+        token_cache.clear()
+
+        with self.assertNumQueries(1):
+            res = self.client.get(ACCOUNT_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_invalid_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+        res = self.client.get(ACCOUNT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logout_invalidates_token(self):
+        self.client.get(ACCOUNT_URL)
+        res = self.client.post(LOGOUT_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.get(ACCOUNT_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivation_invalidates_token(self):
+        self.client.get(ACCOUNT_URL)
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(ACCOUNT_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -0,0 +1,373 @@
+import io
+import json
+import csv
+import gzip
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from bank.models import (
+    Account,
+    ArchivedHistory,
+    BalanceShard,
+    BalanceSnapshot,
+    Customer,
+    LedgerEntry,
+    Replenishment,
+    Transfer,
+)
+from bank.partitioning import create_partition, month_start
+from bank.services import (
+    make_replenishment,
+    make_transfer,
+    set_balance_shards,
+)
+from bank.workers import init_worker
+
+
+def sample_user(email="test@test.com", password="testpass"):
+    """Create a sample user"""
+    return get_user_model().objects.create_user(email, password)
+
+
+def run_command(*args, **kwargs):
+    out = io.StringIO()
+    call_command(*args, stdout=out, stderr=io.StringIO(), **kwargs)
+    return out.getvalue()
+
+
+def account_table():
+    return Account._meta.db_table
+
+
+class InlineExecutor:
+    """
+    Runs pool work in the test process, which owns the test database.
+    """
+    def __init__(self, workers, initializer):
+        self.workers = workers
+        initializer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def map(self, fn, *iterables):
+        return map(fn, *iterables)
+
+
+class ReconcileBalancesTest(TestCase):
+    def setUp(self):
+        self.accounts = [
+            Account.objects.create(user=sample_user(email=f"test{i}@test.com"))
+            for i in range(5)
+        ]
+        for account in self.accounts:
+            make_replenishment(account, Decimal("100"))
+        make_transfer(self.accounts[0], self.accounts[1], Decimal("30"))
+        make_transfer(self.accounts[1], self.accounts[2], Decimal("50"))
+
+    def test_consistent_balances(self):
+        out = run_command('reconcile_balances', chunk_size=2)
+
+        self.assertIn("Checked 5 accounts, found 0 mismatches.", out)
+
+    def test_report_and_repair_drift(self):
+        drifted = self.accounts[1]
+        Account.objects.filter(pk=drifted.pk).update(balance=Decimal("1"))
+
+        out = run_command('reconcile_balances', chunk_size=2)
+        self.assertIn(
+            f"Account {drifted.pk}: balance 1.00, expected 80.00", out
+        )
+        self.assertIn("found 1 mismatches.", out)
+        drifted.refresh_from_db()
+        self.assertEqual(drifted.balance, 1)
+
+        run_command('reconcile_balances', chunk_size=2, repair=True)
+        drifted.refresh_from_db()
+        self.assertEqual(drifted.balance, 80)
+        out = run_command('reconcile_balances')
+        self.assertIn("found 0 mismatches.", out)
+
+    @mock.patch(
+        'bank.management.commands.reconcile_balances.ProcessPoolExecutor',
+        InlineExecutor
+    )
+    # Nothing is forked, and on PostgreSQL closing the connection
+    # would end the transaction of the test.
+    @mock.patch(
+        'bank.management.commands.reconcile_balances.connections.close_all'
+    )
+    def test_workers(self, close_all):
+        drifted = self.accounts[2]
+        Account.objects.filter(pk=drifted.pk).update(balance=Decimal("1"))
+
+        out = run_command(
+            'reconcile_balances', chunk_size=2, workers=2, repair=True
+        )
+
+        self.assertIn("Checked 5 accounts, found 1 mismatches.", out)
+        drifted.refresh_from_db()
+        self.assertEqual(drifted.balance, 150)
+
+    def test_spawned_worker(self):
+        # Unpickling the initializer must not import models before
+        # Django is set up in the spawned process.
+        with ProcessPoolExecutor(
+                1,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_worker) as pool:
+            self.assertEqual(
+                pool.submit(account_table).result(timeout=60), 'bank_account'
+            )
+
+
+class SnapshotBalancesTest(TestCase):
+    def test_snapshot_balances(self):
+        account = Account.objects.create(user=sample_user())
+        make_replenishment(account, Decimal("100"))
+
+        out = run_command('snapshot_balances', lag=0)
+
+        self.assertIn("for 1 accounts", out)
+        self.assertEqual(BalanceSnapshot.objects.get().balance, 100)
+
+    def test_invalid_at(self):
+        for value in ('yesterday', '2024-02-30T00:00:00'):
+            with self.assertRaisesMessage(CommandError, "ISO 8601"):
+                run_command('snapshot_balances', at=value)
+
+
+class FoldBalanceShardsTest(TestCase):
+    def test_fold_balance_shards(self):
+        account = Account.objects.create(user=sample_user())
+        set_balance_shards(account, 4)
+        account.refresh_from_db()
+        for _ in range(3):
+            make_replenishment(account, Decimal("10"))
+
+        out = run_command('fold_balance_shards')
+
+        self.assertIn("of 1 accounts", out)
+        account.refresh_from_db()
+        self.assertEqual(account.balance, 30)
+        self.assertFalse(
+            BalanceShard.objects.filter(balance__gt=0).exists()
+        )
+
+
+class ManagePartitionsTest(TestCase):
+    def setUp(self):
+        self.accounts = [
+            Account.objects.create(user=sample_user(email=f"test{i}@test.com"))
+            for i in range(3)
+        ]
+        for account in self.accounts:
+            make_replenishment(account, Decimal("100"))
+        make_transfer(self.accounts[0], self.accounts[1], Decimal("30"))
+        make_transfer(self.accounts[1], self.accounts[2], Decimal("50"))
+        # Everything above is two years old.
+        two_years_ago = timezone.now() - timedelta(days=730)
+        if connection.vendor == 'postgresql':
+            # Old transfers move into a partition of their month,
+            # old replenishments into the default partition.
+            create_partition(Transfer, month_start(two_years_ago))
+        Replenishment.objects.update(created_at=two_years_ago)
+        Transfer.objects.update(created_at=two_years_ago)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                # A partition with deferred foreign key checks of the
+                # moved rows pending cannot be dropped.
+                cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        make_transfer(self.accounts[2], self.accounts[0], Decimal("10"))
+
+        self.archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.archive_dir.cleanup)
+
+    def test_archive_old_history(self):
+        out = run_command(
+            'manage_partitions',
+            keep_months=12,
+            archive_dir=self.archive_dir.name
+        )
+
+        if connection.vendor == 'postgresql':
+            self.assertNotIn("not partitioned", out)
+        else:
+            self.assertIn("bank_transfer is not partitioned", out)
+        self.assertEqual(Replenishment.objects.count(), 0)
+        self.assertEqual(Transfer.objects.count(), 1)
+        self.assertEqual(LedgerEntry.objects.count(), 9)
+        self.assertEqual(
+            sorted(ArchivedHistory.objects.filter(
+                account=self.accounts[1]
+            ).values_list('amount', flat=True)),
+            [Decimal("-20.00"), Decimal("100.00")]
+        )
+        files = sorted(os.listdir(self.archive_dir.name))
+        self.assertEqual(len(files), 2)
+        transfer_file = next(f for f in files if 'transfer' in f)
+        self.assertIn("Archived 2 rows to ", out)
+        with gzip.open(
+                os.path.join(self.archive_dir.name, transfer_file),
+                'rt') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(
+            sorted(row['amount'] for row in rows), ['30.00', '50.00']
+        )
+
+        self.assertIn(
+            "found 0 mismatches.", run_command('reconcile_balances')
+        )
+
+    def test_recent_history_is_kept(self):
+        run_command(
+            'manage_partitions',
+            keep_months=36,
+            archive_dir=self.archive_dir.name
+        )
+
+        self.assertEqual(Transfer.objects.count(), 3)
+        self.assertFalse(ArchivedHistory.objects.exists())
+
+    def test_pending_transfers_are_not_archived(self):
+        Transfer.objects.filter(amount=30).update(
+            status=Transfer.Status.PENDING
+        )
+
+        with self.assertRaisesMessage(CommandError, "pending transfers"):
+            run_command(
+                'manage_partitions',
+                keep_months=12,
+                archive_dir=self.archive_dir.name
+            )
+
+
+class SeedBankTest(TestCase):
+    def test_seed(self):
+        out = run_command(
+            'seed_bank', users=5, accounts_per_user=3, transfers=100,
+            batch_size=7
+        )
+
+        self.assertIn("Created 5 users, 15 accounts and", out)
+        self.assertEqual(Customer.objects.count(), 5)
+        self.assertEqual(Account.objects.count(), 15)
+        self.assertEqual(Replenishment.objects.count(), 15)
+        transfers = Transfer.objects.count()
+        self.assertGreater(transfers, 90)
+        self.assertEqual(LedgerEntry.objects.count(), 15 + 2 * transfers)
+        self.assertTrue(self.client.login(
+            username="seed0@example.com", password="password"
+        ))
+        self.assertEqual(
+            run_command('reconcile_balances'),
+            "Checked 15 accounts, found 0 mismatches.\n"
+        )
+
+    def test_existing_prefix(self):
+        run_command('seed_bank', users=2, transfers=10)
+
+        with self.assertRaisesMessage(CommandError, "already exist"):
+            run_command('seed_bank', users=2, transfers=10)
+
+    @skipUnless(connection.vendor == 'sqlite', "Workers are refused on SQLite")
+    def test_workers_on_sqlite(self):
+        with self.assertRaisesMessage(CommandError, "--workers 1"):
+            run_command('seed_bank', workers=2)
+
+
+class BenchmarkApiTest(TestCase):
+    options = {
+        'in_place': True,
+        'users': 3,
+        'transfers': 20,
+        'requests': 3,
+        'warmup': 1,
+    }
+
+    def test_benchmark(self):
+        results = json.loads(run_command('benchmark_api', **self.options))
+
+        self.assertEqual(
+            results['environment']['database'], connection.vendor
+        )
+        self.assertEqual(set(results['scenarios']), {
+            'account_list',
+            'transfer_create',
+            'replenishment_create',
+            'transfer_history',
+        })
+        for result in results['scenarios'].values():
+            self.assertEqual(result['requests'], 3)
+            self.assertEqual(result['errors'], 0)
+            self.assertGreater(result['queries_per_request'], 0)
+        self.assertEqual(
+            run_command('reconcile_balances'),
+            "Checked 6 accounts, found 0 mismatches.\n"
+        )
+
+    @override_settings(REST_FRAMEWORK={'DEFAULT_THROTTLE_RATES': {
+        'bank_read': '1/min', 'bank_write': '1/min',
+    }})
+    def test_not_throttled(self):
+        results = json.loads(run_command('benchmark_api', **self.options))
+
+        for result in results['scenarios'].values():
+            self.assertEqual(result['errors'], 0)
+
+    def test_repeated_in_place_runs(self):
+        for _ in range(2):
+            results = json.loads(run_command(
+                'benchmark_api', scenario=['account_list'], **self.options
+            ))
+            self.assertEqual(
+                results['scenarios']['account_list']['errors'], 0
+            )
+
+        self.assertEqual(get_user_model().objects.count(), 6)
+
+    def test_baseline_regression(self):
+        baseline = {'scenarios': {'account_list': {
+            'p95_ms': 1e9, 'queries_per_request': 0
+        }}}
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as f:
+            json.dump(baseline, f)
+            f.flush()
+            with self.assertRaisesMessage(
+                    CommandError, "account_list: "):
+                run_command(
+                    'benchmark_api',
+                    scenario=['account_list'],
+                    baseline=f.name,
+                    **self.options
+                )
+
+
+class BenchmarkIdsTest(TestCase):
+    def test_benchmark(self):
+        results = json.loads(run_command(
+            'benchmark_ids', in_place=True, users=3, transfers=20
+        ))
+
+        self.assertEqual(set(results['results']), {'uuid4', 'uuid7'})
+        for result in results['results'].values():
+            self.assertEqual(result['rows'], 3 + 6 + 6 + 20 + 6 + 40)
+            self.assertGreater(result['rows_per_second'], 0)
+            self.assertIn('bank_transfer', result['primary_key_index_bytes'])
+            for size in result['primary_key_index_bytes'].values():
+                if size is not None:
+                    self.assertGreater(size, 0)
+        self.assertFalse(get_user_model().objects.exists())
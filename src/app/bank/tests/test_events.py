@@ -0,0 +1,225 @@
+import asyncio
+import json
+from decimal import Decimal
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+
+from rest_framework.authtoken.models import Token
+
+from bank.authentication import token_cache
+from bank.events import CacheBroker, Event, hub
+from bank.models import Account
+from bank.services import make_replenishment, make_transfer
+from bank.streams import EventStreamApp
+
+EVENTS_PATH = '/api/bank/events/'
+
+# Seconds a stream test waits for a message before it fails.
+WAIT_TIMEOUT = 5
+
+
+def sample_user(email="test@test.com", password="testpass"):
+    """Create a sample user"""
+    return get_user_model().objects.create_user(email, password)
+
+
+async def wait_until(condition):
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.01)
+    await asyncio.wait_for(poll(), WAIT_TIMEOUT)
+
+
+class StubHub:
+    def __init__(self, user_ids):
+        self.subscribed = user_ids
+        self.events = []
+
+    def user_ids(self):
+        return list(self.subscribed)
+
+    def dispatch(self, user_id, event):
+        self.events.append((user_id, event))
+
+
+@override_settings(EVENTS_BROKER='cache')
+class CacheBrokerTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = sample_user(email="test1@test.com")
+        self.other = sample_user(email="test2@test.com")
+        self.account = Account.objects.create(user=self.user)
+        self.other_account = Account.objects.create(user=self.other)
+        self.broker = CacheBroker()
+        self.hub = StubHub([self.user.pk, self.other.pk])
+        self.broker.subscribe(self.user.pk)
+        self.broker.subscribe(self.other.pk)
+
+    def test_services_publish_events(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            replenishment = make_replenishment(self.account, 100)
+            transfer = make_transfer(self.account, self.other_account, 30)
+        self.broker.poll(self.hub)
+
+        events = [
+            (user_id, event.kind, event.data)
+            for user_id, event in self.hub.events
+        ]
+        self.assertEqual(events[0], (self.user.pk, 'balance', {
+            "account": self.account.pk, "amount": Decimal('100.00')
+        }))
+        self.assertEqual(events[1][:2], (self.user.pk, 'replenishment'))
+        self.assertEqual(events[1][2]['id'], replenishment.pk)
+        self.assertIn(
+            (self.other.pk, 'balance', {
+                "account": self.other_account.pk,
+                "amount": Decimal('30.00')
+            }),
+            events
+        )
+        transfer_events = [e for e in events if e[1] == 'transfer']
+        self.assertEqual(
+            {user_id for user_id, _, _ in transfer_events},
+            {self.user.pk, self.other.pk}
+        )
+        self.assertEqual(transfer_events[0][2]['id'], transfer.pk)
+
+    def test_rolled_back_changes_are_not_published(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(ValidationError):
+                make_transfer(self.account, self.other_account, 30)
+        self.broker.poll(self.hub)
+
+        self.assertEqual(self.hub.events, [])
+
+    def test_poll_dispatches_every_event_once(self):
+        self.broker.publish(self.user.pk, 'balance', {"amount": 1})
+        self.broker.publish(self.user.pk, 'balance', {"amount": 2})
+        self.broker.poll(self.hub)
+        self.broker.poll(self.hub)
+
+        self.assertEqual(
+            [event.data['amount'] for _, event in self.hub.events], [1, 2]
+        )
+        self.assertEqual(
+            [event.id for _, event in self.hub.events], [1, 2]
+        )
+
+    def test_events_before_first_poll_are_dispatched(self):
+        self.broker.publish(self.user.pk, 'balance', {"amount": 1})
+        broker = CacheBroker()
+        broker.subscribe(self.user.pk)
+        self.broker.publish(self.user.pk, 'balance', {"amount": 2})
+        broker.poll(self.hub)
+
+        self.assertEqual(
+            [event.data['amount'] for _, event in self.hub.events], [2]
+        )
+
+
+async def inner_application(scope, receive, send):
+    await send({'type': 'http.response.start', 'status': 204,
+                'headers': []})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+class EventStreamTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.user = sample_user()
+        self.token = Token.objects.create(user=self.user)
+        self.app = EventStreamApp(inner_application, EVENTS_PATH)
+        # Like Django's test client, keep the connection holding the
+        # test transaction open, closing it would end the transaction
+        # on PostgreSQL.
+        patcher = mock.patch('bank.streams.close_old_connections')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def request(self, method='GET', path=EVENTS_PATH, token=None):
+        """Starts a request, returns its task, sent messages and input."""
+        headers = []
+        if token:
+            headers.append((b'authorization', f'Token {token}'.encode()))
+        scope = {
+            'type': 'http',
+            'method': method,
+            'path': path,
+            'headers': headers,
+        }
+        messages = []
+        received = asyncio.Queue()
+
+        async def send(message):
+            messages.append(message)
+
+        task = asyncio.ensure_future(self.app(scope, received.get, send))
+        return task, messages, received
+
+    async def test_stream(self):
+        task, messages, received = await self.request(token=self.token.key)
+        await wait_until(lambda: messages)
+
+        hub.dispatch(self.user.pk, Event(1, 'balance', {"amount": 5}))
+        await wait_until(lambda: len(messages) >= 2)
+        await received.put({'type': 'http.disconnect'})
+        await asyncio.wait_for(task, WAIT_TIMEOUT)
+
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertIn(
+            (b'content-type', b'text/event-stream'), messages[0]['headers']
+        )
+        self.assertEqual(
+            messages[1]['body'],
+            b'id: 1\nevent: balance\ndata: {"amount": 5}\n\n'
+        )
+        self.assertNotIn(self.user.pk, hub.user_ids())
+
+    async def test_committed_transfer(self):
+        other_account = await Account.objects.acreate(
+            user=await sync_to_async(sample_user)(email="other@test.com")
+        )
+        account = await Account.objects.acreate(user=self.user, balance=10)
+        task, messages, received = await self.request(token=self.token.key)
+        await wait_until(lambda: messages)
+
+        def transfer():
+            with self.captureOnCommitCallbacks(execute=True):
+                make_transfer(account, other_account, 3)
+        await sync_to_async(transfer)()
+        await wait_until(lambda: len(messages) >= 3)
+        await received.put({'type': 'http.disconnect'})
+        await asyncio.wait_for(task, WAIT_TIMEOUT)
+
+        self.assertTrue(messages[1]['body'].startswith(b'id: '))
+        self.assertIn(b'event: balance\n', messages[1]['body'])
+        self.assertIn(b'event: transfer\n', messages[2]['body'])
+        data = json.loads(messages[2]['body'].split(b'data: ')[1])
+        self.assertEqual(data['amount'], '3.00')
+
+    async def test_authentication(self):
+        for token in (None, 'invalid'):
+            task, messages, _ = await self.request(token=token)
+            await asyncio.wait_for(task, WAIT_TIMEOUT)
+
+            self.assertEqual(messages[0]['status'], 401)
+
+    async def test_method_not_allowed(self):
+        task, messages, _ = await self.request(
+            method='POST', token=self.token.key
+        )
+        await asyncio.wait_for(task, WAIT_TIMEOUT)
+
+        self.assertEqual(messages[0]['status'], 405)
+
+    async def test_other_paths(self):
+        task, messages, _ = await self.request(path='/api/bank/account/')
+        await asyncio.wait_for(task, WAIT_TIMEOUT)
+
+        self.assertEqual(messages[0]['status'], 204)
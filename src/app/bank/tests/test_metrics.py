@@ -0,0 +1,113 @@
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+
+from bank.authentication import token_cache
+from bank.metrics import registry
+from bank.models import Account
+
+
+ACCOUNT_URL = reverse('api:account-list')
+METRICS_URL = reverse('metrics')
+ASYNC_ACCOUNT_URL = reverse('api:async-account-list')
+
+
+def sample_user(email="test@test.com", password="testpass"):
+    """Create a sample user"""
+    return get_user_model().objects.create_user(email, password)
+
+
+@override_settings(METRICS_SAMPLE_RATE=1, METRICS_SERVER_TIMING=True)
+class MetricsMiddlewareTest(TestCase):
+    def setUp(self):
+        registry.clear()
+        self.user = sample_user()
+        self.account = Account.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_metrics_by_view(self):
+        self.client.get(ACCOUNT_URL)
+        self.client.get(ACCOUNT_URL)
+        self.client.get(reverse(
+            'api:account-ledger', kwargs={'pk': self.account.pk}
+        ))
+
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res['Content-Type'].startswith('text/plain'))
+        metrics = res.content.decode()
+        self.assertIn(
+            'bank_request_duration_seconds_count{view="AccountView.list",'
+            'method="GET",status="200"} 2',
+            metrics
+        )
+        self.assertIn(
+            'bank_request_duration_seconds_bucket{view="AccountView.list",'
+            'method="GET",status="200",le="+Inf"} 2',
+            metrics
+        )
+        self.assertIn(
+            'bank_request_duration_seconds_count{view="AccountView.ledger",'
+            'method="GET",status="200"} 1',
+            metrics
+        )
+        self.assertIn(
+            'bank_db_sampled_requests_total{view="AccountView.list"} 2',
+            metrics
+        )
+        self.assertIn(
+            'bank_db_queries_total{view="AccountView.list"} 2', metrics
+        )
+
+    def test_server_timing(self):
+        res = self.client.get(ACCOUNT_URL)
+
+        self.assertRegex(
+            res['Server-Timing'],
+            r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="1 queries"$'
+        )
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_unsampled_request(self):
+        res = self.client.get(ACCOUNT_URL)
+
+        self.assertRegex(res['Server-Timing'], r'^app;dur=[\d.]+$')
+        metrics = self.client.get(METRICS_URL).content.decode()
+        self.assertIn('view="AccountView.list"', metrics)
+        self.assertNotIn(
+            'bank_db_queries_total{view="AccountView.list"}', metrics
+        )
+
+    @override_settings(METRICS_SERVER_TIMING=False)
+    def test_server_timing_disabled(self):
+        res = self.client.get(ACCOUNT_URL)
+
+        self.assertNotIn('Server-Timing', res)
+
+    @override_settings(METRICS_SLOW_REQUEST_SECONDS=0)
+    def test_slow_request_log(self):
+        with self.assertLogs('bank.middleware', 'WARNING') as logs:
+            self.client.get(ACCOUNT_URL)
+
+        self.assertIn("Slow request GET /api/bank/account/", logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+    async def test_async_request(self):
+        token = await Token.objects.acreate(user=self.user)
+        token_cache.clear()
+
+        res = await self.async_client.get(
+            ASYNC_ACCOUNT_URL, AUTHORIZATION=f'Token {token.key}'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertRegex(
+            res['Server-Timing'],
+            r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="[1-9]\d* queries"$'
+        )
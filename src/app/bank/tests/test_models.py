@@ -1,7 +1,14 @@
+import time
+import uuid
+
 from django.db import IntegrityError
-from django.test import TestCase
+from django.contrib.admin import site
+from django.test import RequestFactory, TestCase, override_settings
 from django.contrib.auth import get_user_model
-from bank.models import Customer, Account, Transfer, Replenishment
+from bank.models import (
+    Customer, Account, Transfer, Replenishment, LedgerEntry
+)
+from bank.ids import new_id, uuid7
 
 
 def sample_user(email="test@test.com", password="testpass"):
@@ -148,3 +155,50 @@ class ModelTest(TestCase):
         )
 
         self.assertEqual(str(transfer), message)
+
+
+class IdsTest(TestCase):
+    def test_uuid7_layout(self):
+        before = time.time_ns() // 1_000_000
+        value = uuid7()
+        after = time.time_ns() // 1_000_000
+
+        self.assertEqual(value.version, 7)
+        self.assertEqual(value.variant, uuid.RFC_4122)
+        self.assertTrue(before <= value.int >> 80 <= after + 1)
+
+    def test_uuid7_increasing(self):
+        ids = [uuid7() for _ in range(1000)]
+
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual([str(i) for i in ids], sorted(str(i) for i in ids))
+        self.assertEqual(len(set(ids)), len(ids))
+
+    def test_new_id_default(self):
+        self.assertEqual(new_id().version, 4)
+
+    @override_settings(TIME_ORDERED_IDS=True)
+    def test_time_ordered_ids(self):
+        user = sample_user()
+        accounts = [Account.objects.create(user=user) for _ in range(5)]
+
+        for account in accounts:
+            self.assertEqual(account.id.version, 7)
+        self.assertEqual(
+            list(Account.objects.order_by('id')),
+            accounts
+        )
+
+
+class LedgerEntryAdminTest(TestCase):
+    def test_ledger_is_read_only(self):
+        request = RequestFactory().get('/')
+        request.user = get_user_model().objects.create_superuser(
+            "admin@test.com", "testpass"
+        )
+        entry_admin = site._registry[LedgerEntry]
+
+        self.assertTrue(entry_admin.has_view_permission(request))
+        self.assertFalse(entry_admin.has_add_permission(request))
+        self.assertFalse(entry_admin.has_change_permission(request))
+        self.assertFalse(entry_admin.has_delete_permission(request))
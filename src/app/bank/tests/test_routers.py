@@ -0,0 +1,149 @@
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory, TransactionTestCase, override_settings
+)
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from bank.authentication import token_cache
+from bank.middleware import REPLICA_PIN_COOKIE, ReplicaPinningMiddleware
+from bank.models import Account
+
+
+ACCOUNT_URL = reverse('api:account-list')
+SUMMARY_URL = reverse('api:summary')
+
+REPLICA = 'replica'
+
+
+def sample_user(email="test@test.com", password="testpass"):
+    """Create a sample user"""
+    return get_user_model().objects.create_user(email, password)
+
+
+class ReplicaRoutingTest(TransactionTestCase):
+    """
+    Uses a second test database as a replica which, unlike a real one,
+    does not follow the primary, so the database a read went to is
+    visible in the data it returns.
+    """
+    @classmethod
+    def setUpClass(cls):
+        # The replica is set up here rather than declared in databases,
+        # which the test runner would require to be in settings.
+        default = connections.settings['default']
+        connections.settings[REPLICA] = {
+            **default,
+            'NAME': f"{default['NAME']}_{REPLICA}",
+            'TEST': {**default['TEST'], 'NAME': None},
+        }
+        connections[REPLICA].creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        cls.databases = {'default', REPLICA}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connection = connections[REPLICA]
+        connection.creation.destroy_test_db(
+            connection.settings_dict['NAME'], verbosity=0
+        )
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+
+    def setUp(self):
+        # Enabled per test, so that flushing the replica is not prevented
+        # by the router.
+        replicas = override_settings(REPLICA_DATABASES=[REPLICA])
+        replicas.enable()
+        self.addCleanup(replicas.disable)
+        cache.clear()
+        token_cache.clear()
+        self.user = sample_user()
+        # Replicated copy of the user with a replica-only account
+        self.user.save(using=REPLICA)
+        Account.objects.using(REPLICA).create(user=self.user, balance=7)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_reads_go_to_replica(self):
+        self.assertEqual(Account.objects.all().db, REPLICA)
+
+        res = self.client.get(ACCOUNT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
+        self.assertEqual(res.data[0]['balance'], '7.00')
+
+    def test_writes_go_to_primary(self):
+        res = self.client.post(ACCOUNT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Account.objects.using('default').exists())
+        self.assertEqual(Account.objects.using(REPLICA).count(), 1)
+
+    def test_reads_after_write_stick_to_primary(self):
+        res = self.client.post(ACCOUNT_URL)
+        self.assertIn(REPLICA_PIN_COOKIE, res.cookies)
+
+        res = self.client.get(ACCOUNT_URL)
+        self.assertEqual(res.data[0]['balance'], '0.00')
+
+        del self.client.cookies[REPLICA_PIN_COOKIE]
+        res = self.client.get(ACCOUNT_URL)
+        self.assertEqual(res.data[0]['balance'], '7.00')
+
+    @override_settings(ETAGS_ENABLED=True)
+    def test_reads_with_etag_go_to_primary(self):
+        Account.objects.create(user=self.user, balance=3)
+
+        res = self.client.get(ACCOUNT_URL)
+
+        self.assertIn('ETag', res)
+        self.assertEqual(res.data[0]['balance'], '3.00')
+
+    def test_cached_reads_go_to_primary(self):
+        Account.objects.create(user=self.user, balance=3)
+
+        res = self.client.get(SUMMARY_URL)
+
+        self.assertEqual(res.data[0]['balance'], '3.00')
+
+    def test_tokens_are_read_from_primary(self):
+        token = Token.objects.create(user=self.user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        res = client.get(ACCOUNT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_reads_inside_transaction_go_to_primary(self):
+        with transaction.atomic():
+            self.assertEqual(Account.objects.all().db, 'default')
+
+    async def test_async_middleware_pins_reads(self):
+        async def view(request):
+            return HttpResponse(Account.objects.all().db)
+        middleware = ReplicaPinningMiddleware(view)
+        factory = RequestFactory()
+
+        res = await middleware(factory.post('/'))
+        self.assertEqual(res.content, b'default')
+        self.assertIn(REPLICA_PIN_COOKIE, res.cookies)
+
+        request = factory.get('/')
+        request.COOKIES[REPLICA_PIN_COOKIE] = '1'
+        res = await middleware(request)
+        self.assertEqual(res.content, b'default')
+
+        res = await middleware(factory.get('/'))
+        self.assertEqual(res.content, REPLICA.encode())
@@ -0,0 +1,341 @@
+import random
+import threading
+import time
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import connection, OperationalError
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from bank.models import (
+    Account, BalanceShard, BalanceSnapshot, Transfer, Replenishment
+)
+from bank.services import (
+    fold_balance_shards,
+    get_balance_at,
+    make_replenishment,
+    make_replenishments,
+    make_transfer,
+    make_transfers,
+    set_balance_shards,
+    take_balance_snapshots,
+)
+
+
+def sample_user(email="test@test.com", password="testpass"):
+    """Create a sample user"""
+    return get_user_model().objects.create_user(email, password)
+
+
+class ServicesTest(TestCase):
+    def setUp(self):
+        user1 = sample_user(email="test1@test.com")
+        user2 = sample_user(email="test2@test.com")
+        self.account1 = Account.objects.create(user=user1, balance=500)
+        self.account2 = Account.objects.create(user=user2, balance=0)
+
+    def test_make_replenishment(self):
+        replenishment = make_replenishment(self.account2, Decimal("100"))
+
+        self.account2.refresh_from_db()
+        self.assertEqual(self.account2.balance, 100)
+        self.assertEqual(replenishment.account, self.account2)
+        self.assertEqual(Replenishment.objects.count(), 1)
+
+    def test_make_replenishment_negative_amount(self):
+        with self.assertRaises(ValidationError):
+            make_replenishment(self.account2, Decimal("-1"))
+
+    def test_make_transfer(self):
+        transfer = make_transfer(self.account1, self.account2, Decimal("200"))
+
+        self.account1.refresh_from_db()
+        self.account2.refresh_from_db()
+        self.assertEqual(self.account1.balance, 300)
+        self.assertEqual(self.account2.balance, 200)
+        self.assertEqual(transfer.amount, 200)
+        self.assertEqual(Transfer.objects.count(), 1)
+
+    def test_make_transfer_reverse_order(self):
+        """Test that transfer works when to_account is locked first"""
+        make_transfer(self.account1, self.account2, Decimal("200"))
+        make_transfer(self.account2, self.account1, Decimal("50"))
+
+        self.account1.refresh_from_db()
+        self.account2.refresh_from_db()
+        self.assertEqual(self.account1.balance, 350)
+        self.assertEqual(self.account2.balance, 150)
+
+    def test_make_transfer_not_enough_money(self):
+        with self.assertRaises(ValidationError):
+            make_transfer(self.account1, self.account2, Decimal("500.01"))
+
+        self.account1.refresh_from_db()
+        self.account2.refresh_from_db()
+        self.assertEqual(self.account1.balance, 500)
+        self.assertEqual(self.account2.balance, 0)
+        self.assertFalse(Transfer.objects.exists())
+
+    def test_make_transfer_stale_instance(self):
+        """Test that balance check uses database state, not instance"""
+        make_transfer(self.account1, self.account2, Decimal("400"))
+
+        # self.account1 still holds balance of 500 in memory.
+        with self.assertRaises(ValidationError):
+            make_transfer(self.account1, self.account2, Decimal("400"))
+
+    def test_make_transfer_same_account(self):
+        with self.assertRaises(ValidationError):
+            make_transfer(self.account1, self.account1, Decimal("1"))
+
+
+def total_balances():
+    # Summed in Python, SQLite aggregates decimals as floats.
+    balances = dict(Account.objects.values_list('pk', 'balance'))
+    for account_id, balance in BalanceShard.objects.values_list(
+            'account_id', 'balance'):
+        balances[account_id] += balance
+    return balances
+
+
+class HotAccountTest(TestCase):
+    def setUp(self):
+        self.hot = Account.objects.create(
+            user=sample_user(email="test1@test.com")
+        )
+        self.other = Account.objects.create(
+            user=sample_user(email="test2@test.com"), balance=1000
+        )
+        set_balance_shards(self.hot, 4)
+
+    def test_credits_go_to_shards(self):
+        for _ in range(10):
+            make_transfer(self.other, self.hot, Decimal("10"))
+
+        self.hot.refresh_from_db()
+        self.assertEqual(self.hot.balance, 0)
+        self.assertEqual(BalanceShard.objects.filter(
+            account=self.hot
+        ).count(), 4)
+        self.assertEqual(total_balances()[self.hot.pk], 100)
+
+    def test_debit_folds_shards(self):
+        make_replenishment(self.hot, Decimal("60"))
+        make_transfer(self.other, self.hot, Decimal("40"))
+
+        make_transfer(self.hot, self.other, Decimal("90"))
+
+        self.hot.refresh_from_db()
+        self.assertEqual(self.hot.balance, 10)
+        self.assertFalse(BalanceShard.objects.filter(
+            account=self.hot, balance__gt=0
+        ).exists())
+        with self.assertRaises(ValidationError):
+            make_transfer(self.hot, self.other, Decimal("10.01"))
+
+    def test_fold_balance_shards(self):
+        make_replenishment(self.hot, Decimal("60"))
+
+        self.assertEqual(fold_balance_shards(self.hot), 60)
+        self.hot.refresh_from_db()
+        self.assertEqual(self.hot.balance, 60)
+
+    def test_disable_hot_mode(self):
+        make_replenishment(self.hot, Decimal("60"))
+        set_balance_shards(self.hot, 0)
+        make_replenishment(self.hot, Decimal("1"))
+
+        self.hot.refresh_from_db()
+        self.assertEqual(self.hot.balance, 61)
+        self.assertFalse(BalanceShard.objects.exists())
+
+
+class TransferStressTest(TransactionTestCase):
+    """Runs many concurrent transfers and checks that money is conserved."""
+    threads = 8
+    transfers_per_thread = 50
+    accounts = 6
+    hot_accounts = 0
+    initial_balance = Decimal("1000")
+
+    def setUp(self):
+        self.account_list = [
+            Account.objects.create(
+                user=sample_user(email=f"test{i}@test.com"),
+                balance=self.initial_balance
+            )
+            for i in range(self.accounts)
+        ]
+        for account in self.account_list[:self.hot_accounts]:
+            set_balance_shards(account, 4)
+            account.refresh_from_db()
+
+    # Attempts of one transfer before the test fails.
+    max_attempts = 100
+
+    def random_amount(self, rnd):
+        return Decimal(rnd.randint(1, 30000)) / 100
+
+    def operation(self, rnd):
+        """Returns a random balance change to run."""
+        from_account, to_account = rnd.sample(self.account_list, 2)
+        amount = self.random_amount(rnd)
+        return lambda: make_transfer(from_account, to_account, amount)
+
+    def _worker(self, seed, errors):
+        rnd = random.Random(seed)
+        try:
+            for _ in range(self.transfers_per_thread):
+                operation = self.operation(rnd)
+                # Backends without row locks (SQLite) may report the
+                # database as locked; the transaction was rolled back,
+                # so retrying after a random backoff is safe.
+                for attempt in range(self.max_attempts):
+                    try:
+                        operation()
+                    except ValidationError:
+                        pass
+                    except OperationalError:
+                        time.sleep(rnd.random() * 0.001 * (attempt + 1))
+                        continue
+                    break
+                else:
+                    raise AssertionError(
+                        f"Transfer failed {self.max_attempts} times "
+                        "with OperationalError."
+                    )
+        except Exception as e:  # pragma: no cover
+            errors.append(e)
+        finally:
+            connection.close()
+
+    def test_money_is_conserved(self):
+        errors = []
+        workers = [
+            threading.Thread(target=self._worker, args=(seed, errors))
+            for seed in range(self.threads)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        balances = total_balances()
+        replenished = sum(
+            Replenishment.objects.values_list('amount', flat=True)
+        )
+        self.assertEqual(
+            sum(balances.values()),
+            self.initial_balance * self.accounts + replenished
+        )
+        self.assertFalse(Account.objects.filter(balance__lt=0).exists())
+
+        # Every committed change is reflected in the balances.
+        for account in Account.objects.all():
+            incoming = sum(Transfer.objects.filter(
+                to_account=account
+            ).values_list('amount', flat=True))
+            outgoing = sum(Transfer.objects.filter(
+                from_account=account
+            ).values_list('amount', flat=True))
+            replenished = sum(Replenishment.objects.filter(
+                account=account
+            ).values_list('amount', flat=True))
+            self.assertEqual(
+                balances[account.pk],
+                self.initial_balance + incoming - outgoing + replenished
+            )
+
+
+class HotAccountTransferStressTest(TransferStressTest):
+    """Same as TransferStressTest with some accounts in hot mode."""
+    hot_accounts = 2
+
+
+class MixedBalanceStressTest(HotAccountTransferStressTest):
+    """
+    Runs every kind of concurrent balance change on hot and plain accounts.
+
+    On a backend with row locks a lock order violation shows up as
+    a deadlock error failing the test.
+    """
+    def operation(self, rnd):
+        kind = rnd.choice(('transfer', 'batch', 'replenish', 'fold'))
+        if kind == 'transfer':
+            return super().operation(rnd)
+        account, *others = rnd.sample(self.account_list, 3)
+        if kind == 'batch':
+            transfers = [
+                {'from_account': account.pk, 'to_account': other.pk,
+                 'amount': self.random_amount(rnd)}
+                for other in others
+            ]
+            return lambda: make_transfers(
+                account.user, transfers, atomic=False
+            )
+        if kind == 'replenish':
+            replenishments = [
+                {'account': other, 'amount': self.random_amount(rnd)}
+                for other in (account, *others)
+            ]
+            return lambda: make_replenishments(replenishments)
+        return lambda: fold_balance_shards(account)
+
+
+class BalanceSnapshotTest(TestCase):
+    def setUp(self):
+        self.account1 = Account.objects.create(
+            user=sample_user(email="test1@test.com")
+        )
+        self.account2 = Account.objects.create(
+            user=sample_user(email="test2@test.com")
+        )
+        self.start = timezone.now()
+        make_replenishment(self.account1, Decimal("100"))
+        make_transfer(self.account1, self.account2, Decimal("40"))
+        self.middle = timezone.now()
+        make_replenishment(self.account2, Decimal("5"))
+        make_transfer(self.account2, self.account1, Decimal("15"))
+        self.end = timezone.now()
+
+    def test_balance_at_without_snapshots(self):
+        self.assertEqual(get_balance_at(self.account1, self.start), 0)
+        self.assertEqual(get_balance_at(self.account1, self.middle), 60)
+        self.assertEqual(get_balance_at(self.account1, self.end), 75)
+        self.assertEqual(get_balance_at(self.account2, self.end), 30)
+
+    def test_take_balance_snapshots(self):
+        processed = take_balance_snapshots(self.middle, chunk_size=1)
+
+        self.assertEqual(processed, 2)
+        snapshots = dict(BalanceSnapshot.objects.values_list(
+            'account', 'balance'
+        ))
+        self.assertEqual(snapshots, {
+            self.account1.id: 60,
+            self.account2.id: 40,
+        })
+
+    def test_incremental_snapshots(self):
+        take_balance_snapshots(self.middle)
+        take_balance_snapshots(self.end)
+        # Repeated snapshot for the same time is ignored.
+        take_balance_snapshots(self.end)
+
+        snapshot = BalanceSnapshot.objects.get(
+            account=self.account2, created_at=self.end
+        )
+        self.assertEqual(snapshot.balance, 30)
+        self.assertEqual(BalanceSnapshot.objects.count(), 4)
+
+    def test_balance_at_uses_snapshot(self):
+        take_balance_snapshots(self.middle)
+        # Snapshot is trusted, entries before it are not read again.
+        BalanceSnapshot.objects.filter(account=self.account1).update(
+            balance=1000
+        )
+
+        self.assertEqual(get_balance_at(self.account1, self.end), 1015)
+        self.assertEqual(get_balance_at(self.account1, self.start), 0)
@@ -0,0 +1,117 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from bank.authentication import token_cache
+from bank.models import Account
+from bank.throttling import parse_rate, take_token
+
+ACCOUNT_URL = reverse('api:account-list')
+ASYNC_ACCOUNT_URL = reverse('api:async-account-list')
+
+THROTTLE_SETTINGS = {
+    'DEFAULT_THROTTLE_RATES': {'bank_read': '2/min', 'bank_write': None},
+}
+
+
+def sample_user(email="test@test.com", password="testpass"):
+    """Create a sample user"""
+    return get_user_model().objects.create_user(email, password)
+
+
+def at(seconds):
+    return mock.patch('bank.throttling.time.time', return_value=seconds)
+
+
+class TokenBucketTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('60/min'), (60, 60))
+        self.assertEqual(parse_rate('5/s'), (5, 1))
+        self.assertIsNone(parse_rate(None))
+
+    def test_burst_and_refill(self):
+        with at(1000):
+            for _ in range(3):
+                self.assertEqual(take_token('bucket', 3, 60), 0)
+            self.assertEqual(take_token('bucket', 3, 60), 20)
+        with at(1010):
+            self.assertEqual(take_token('bucket', 3, 60), 10)
+        with at(1020):
+            self.assertEqual(take_token('bucket', 3, 60), 0)
+            self.assertEqual(take_token('bucket', 3, 60), 20)
+
+    def test_capacity_is_not_exceeded_after_idle(self):
+        with at(1000):
+            take_token('bucket', 3, 60)
+        with at(1059):
+            for _ in range(3):
+                self.assertEqual(take_token('bucket', 3, 60), 0)
+            self.assertGreater(take_token('bucket', 3, 60), 0)
+
+    def test_buckets_are_separate(self):
+        with at(1000):
+            self.assertEqual(take_token('first', 1, 60), 0)
+            self.assertEqual(take_token('second', 1, 60), 0)
+            self.assertGreater(take_token('first', 1, 60), 0)
+
+
+@override_settings(REST_FRAMEWORK=THROTTLE_SETTINGS)
+class ThrottleApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.user = sample_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_reads_are_throttled(self):
+        for _ in range(2):
+            self.assertEqual(self.client.get(ACCOUNT_URL).status_code, 200)
+        res = self.client.get(ACCOUNT_URL)
+
+        self.assertEqual(res.status_code, 429)
+        self.assertEqual(res['Retry-After'], '30')
+
+    def test_writes_use_separate_budget(self):
+        for _ in range(2):
+            self.client.get(ACCOUNT_URL)
+        res = self.client.post(ACCOUNT_URL, {})
+
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(Account.objects.count(), 1)
+
+    def test_users_use_separate_budgets(self):
+        for _ in range(3):
+            self.client.get(ACCOUNT_URL)
+        self.client.force_authenticate(sample_user(email="other@test.com"))
+
+        self.assertEqual(self.client.get(ACCOUNT_URL).status_code, 200)
+
+    def test_async_views_are_throttled(self):
+        token = Token.objects.create(user=self.user)
+        headers = {'HTTP_AUTHORIZATION': f'Token {token.key}'}
+        for _ in range(2):
+            res = self.client.get(ASYNC_ACCOUNT_URL, **headers)
+            self.assertEqual(res.status_code, 200)
+        res = self.client.get(ASYNC_ACCOUNT_URL, **headers)
+
+        self.assertEqual(res.status_code, 429)
+        self.assertIn('Retry-After', res)
+
+    def test_async_views_share_budget_of_drf_views(self):
+        token = Token.objects.create(user=self.user)
+        headers = {'HTTP_AUTHORIZATION': f'Token {token.key}'}
+        for _ in range(2):
+            self.assertEqual(self.client.get(ACCOUNT_URL).status_code, 200)
+        res = self.client.get(ASYNC_ACCOUNT_URL, **headers)
+
+        self.assertEqual(res.status_code, 429)
@@ -0,0 +1,114 @@
+import time
+
+from django.core.cache import cache
+
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+DURATIONS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24}
+
+
+def parse_rate(rate: str | None) -> tuple[int, int] | None:
+    """
+    Returns bucket capacity and seconds to refill it from a rate string.
+
+    Rates have the DRF format, e.g. `60/min` allows bursts of 60
+    requests and refills one token every second.
+    """
+    if rate is None:
+        return None
+    num, period = rate.split('/')
+    return int(num), DURATIONS[period[0]]
+
+
+def take_token(key: str, capacity: int, period: int) -> float:
+    """
+    Takes a token from the bucket of key shared by all worker processes.
+
+    The bucket is a counter of used tokens, changed only with atomic
+    `incr` and `decr` of the cache, and the time it was started.
+    Tokens earned since then above the capacity are added to the
+    counter, so a bucket never holds more than capacity tokens.
+    Buckets expire when idle long enough to be full again.
+    Needs a cache backend with atomic increments shared by workers,
+    e.g. memcached or Redis.
+
+    Returns 0 if a token was taken or seconds until one is available.
+    """
+    used_key, start_key = f'{key}:used', f'{key}:start'
+    refill = capacity / period
+    now = time.time()
+    try:
+        used = cache.incr(used_key)
+    except ValueError:
+        cache.add(start_key, now, period)
+        cache.add(used_key, 0, period)
+        used = cache.incr(used_key)
+    start = cache.get(start_key)
+    if start is None:
+        cache.add(start_key, now, period)
+        start = now
+
+    earned = (now - start) * refill
+    excess = int(earned) - (used - 1)
+    if excess > 0:
+        # Concurrent requests may both drop the same excess,
+        # which only delays the next refill.
+        used = cache.incr(used_key, excess)
+
+    wait = 0
+    if used > capacity + earned:
+        cache.decr(used_key)
+        wait = (used - capacity - earned) / refill
+    cache.touch(used_key, period)
+    cache.touch(start_key, period)
+    return wait
+
+
+def scope_wait(scope: str, endpoint: str, ident) -> float:
+    """
+    Takes a token of the client from the bucket of the scope and endpoint.
+
+    Rate of the scope is taken from DEFAULT_THROTTLE_RATES, a scope
+    without rate is not limited.
+    Returns 0 if allowed or seconds until the next request is allowed.
+    """
+    rate = parse_rate(api_settings.DEFAULT_THROTTLE_RATES.get(scope))
+    if rate is None:
+        return 0
+    return take_token(f'throttle:{scope}:{endpoint}:{ident}', *rate)
+
+
+def method_scope(method: str) -> str:
+    """Returns throttle scope of requests with the HTTP method."""
+    return 'bank_read' if method in SAFE_METHODS else 'bank_write'
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Limits requests of a user to a view action with a token bucket.
+
+    Reads and writes have separate scopes, see method_scope.
+    Anonymous requests are limited by client address.
+    Throttled requests get 429 with `Retry-After`.
+    """
+    def get_endpoint(self, view) -> str:
+        endpoint = type(view).__name__
+        action = getattr(view, 'action', None)
+        if action:
+            endpoint = f'{endpoint}.{action}'
+        return endpoint
+
+    def allow_request(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        self.seconds = scope_wait(
+            method_scope(request.method), self.get_endpoint(view), ident
+        )
+        return not self.seconds
+
+    def wait(self):
+        return self.seconds or None
@@ -1,6 +1,6 @@
 from rest_framework.routers import DefaultRouter
 from django.urls import path, include
-from . import views
+from . import async_views, views
 
 
 app_name = 'bank'
@@ -15,4 +15,26 @@ router.register('transfer', views.TransferView)
 urlpatterns = [
     path('', include(router.urls)),
     path('customer/', views.CustomerDetail.as_view(), name='customer'),
+    path('summary/', views.AccountSummary.as_view(), name='summary'),
+
+    path(
+        'async/account/',
+        async_views.account_list,
+        name='async-account-list'
+    ),
+    path(
+        'async/account/<uuid:pk>/',
+        async_views.account_detail,
+        name='async-account-detail'
+    ),
+    path(
+        'async/account/<uuid:pk>/balance/',
+        async_views.account_balance,
+        name='async-account-balance'
+    ),
+    path(
+        'async/transfer/',
+        async_views.transfer_list,
+        name='async-transfer-list'
+    ),
 ]
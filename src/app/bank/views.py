@@ -1,29 +1,131 @@
-from rest_framework import generics, viewsets, mixins
-from rest_framework.authentication import TokenAuthentication
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from rest_framework import generics, viewsets, mixins, status
+from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 
+from .authentication import CachedTokenAuthentication
+from .etags import conditional_get
+from .idempotency import IdempotentCreateMixin
+from .pagination import HistoryCursorPagination
+from .routers import use_primary
+from .statements import StatementResponse, stream_csv, stream_ndjson
+from .throttling import TokenBucketThrottle
 from .models import Customer, Account, Replenishment, Transfer
 from .serializers import (
     CustomerSerializer,
     AccountSerializer,
+    AccountBalanceSerializer,
+    AccountReplenishmentsSerializer,
+    AccountSummarySerializer,
+    LedgerEntrySerializer,
     ReplenishmentSerializer,
-    TransferSerializer
+    ReplenishmentBatchSerializer,
+    TransferSerializer,
+    TransferBatchSerializer,
 )
 from .services import (
+    CUSTOMER_CACHE_TIMEOUT,
+    SUMMARY_CACHE_TIMEOUT,
+    customer_cache_key,
+    summary_cache_key,
+    get_user_customer,
+    annotate_replenishment_summary,
+    annotate_total_balance,
+    prefetch_replenishment_ids,
+    get_account_ledger,
+    get_account_summaries,
+    get_balance_at,
+    iter_account_statement,
     get_user_accounts,
     get_user_replenishments,
     get_all_user_transfers,
+    make_replenishments,
+    make_transfers,
 )
 
 
+def datetime_query_param(request, param):
+    """
+    Returns aware datetime from ISO 8601 query param or None if missing.
+
+    Raises:
+        ValidationError:
+            if query param is not a datetime.
+    """
+    value = request.query_params.get(param)
+    if value is None:
+        return None
+    try:
+        # Invalid dates, e.g. month 13, raise instead of returning None.
+        parsed = parse_datetime(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError(
+            {param: "Should be an ISO 8601 datetime."}
+        )
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
 class CustomerDetail(generics.RetrieveUpdateAPIView):
     serializer_class = CustomerSerializer
-    authentication_classes = (TokenAuthentication, )
+    authentication_classes = (CachedTokenAuthentication, )
     permission_classes = (IsAuthenticated, )
+    throttle_classes = (TokenBucketThrottle, )
     queryset = Customer.objects.all()
 
     def get_object(self):
-        return self.queryset.filter(user=self.request.user).first()
+        return get_user_customer(self.request.user)
+
+    @conditional_get('customer')
+    def retrieve(self, request, *args, **kwargs):
+        # Serialized customer is cached per user and invalidated
+        # by signals whenever the customer or the user is saved.
+        # It is read from the primary, as a lagging replica would
+        # keep the old customer cached until the next change.
+        key = customer_cache_key(request.user.pk)
+        data = cache.get(key)
+        if data is None:
+            with use_primary():
+                instance = self.get_object()
+                data = self.get_serializer(instance).data
+            if instance is not None:
+                cache.set(key, data, CUSTOMER_CACHE_TIMEOUT)
+        return Response(data)
+
+
+class AccountSummary(generics.ListAPIView):
+    """Lists balance and history totals of all user accounts."""
+    serializer_class = AccountSummarySerializer
+    authentication_classes = (CachedTokenAuthentication, )
+    permission_classes = (IsAuthenticated, )
+    throttle_classes = (TokenBucketThrottle, )
+    pagination_class = None
+
+    def get_queryset(self):
+        return get_account_summaries(self.request.user)
+
+    @conditional_get('accounts')
+    def list(self, request, *args, **kwargs):
+        # Summary is cached per user and invalidated by bank.services
+        # whenever a balance of the user's account changes. It is read
+        # from the primary like the customer above.
+        key = summary_cache_key(request.user.pk)
+        data = cache.get(key)
+        if data is None:
+            with use_primary():
+                data = self.get_serializer(
+                    self.get_queryset(), many=True
+                ).data
+            cache.set(key, data, SUMMARY_CACHE_TIMEOUT)
+        return Response(data)
 
 
 class AccountView(viewsets.GenericViewSet,
@@ -32,43 +134,229 @@ class AccountView(viewsets.GenericViewSet,
                   mixins.CreateModelMixin,
                   mixins.DestroyModelMixin):
     serializer_class = AccountSerializer
-    authentication_classes = (TokenAuthentication, )
+    authentication_classes = (CachedTokenAuthentication, )
     permission_classes = (IsAuthenticated, )
+    throttle_classes = (TokenBucketThrottle, )
     queryset = Account.objects.all()
 
+    statement_exports = {
+        'csv': (stream_csv, 'text/csv'),
+        'ndjson': (stream_ndjson, 'application/x-ndjson'),
+    }
+
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    @conditional_get('accounts')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_get('accounts')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    def include_replenishments(self):
+        # Full list of replenishment ids is returned only on request:
+        # ?include=replenishments
+        return (
+            self.action in ('list', 'retrieve')
+            and self.request.query_params.get('include') == 'replenishments'
+        )
+
+    def get_serializer_class(self):
+        if self.include_replenishments():
+            return AccountReplenishmentsSerializer
+        return super().get_serializer_class()
+
     def get_queryset(self):
         # View only accounts owned by logged in user.
-        return get_user_accounts(self.request.user)
+        queryset = get_user_accounts(self.request.user)
+        if self.action in ('list', 'retrieve', 'balance'):
+            queryset = annotate_total_balance(queryset)
+        if self.action in ('list', 'retrieve'):
+            queryset = annotate_replenishment_summary(queryset)
+        if self.include_replenishments():
+            queryset = prefetch_replenishment_ids(queryset)
+        return queryset
+
+    @action(detail=True, serializer_class=LedgerEntrySerializer,
+            pagination_class=HistoryCursorPagination)
+    def ledger(self, request, pk=None):
+        """Lists all balance movements of the account, newest first."""
+        queryset = get_account_ledger(self.get_object())
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
+    @action(detail=True, serializer_class=AccountBalanceSerializer)
+    @conditional_get('accounts')
+    def balance(self, request, pk=None):
+        """
+        Returns current account balance or balance at ?at=<datetime>.
+        """
+        account = self.get_object()
+        at = datetime_query_param(request, 'at')
+        data = {"id": account.id, "balance": account.total_balance}
+        if at is not None:
+            data.update(at=at, balance=get_balance_at(account, at))
+        return Response(self.get_serializer(data).data)
 
-class ReplenishmentView(viewsets.GenericViewSet,
+    @action(detail=True)
+    def statement(self, request, pk=None):
+        """
+        Streams the full account statement with a running balance.
+
+        Query params:
+            export: `csv` (default) or `ndjson`.
+            start, end: optional ISO 8601 datetimes limiting the period.
+        """
+        export = request.query_params.get('export', 'csv')
+        if export not in self.statement_exports:
+            raise ValidationError(
+                {"export": f"Should be one of: "
+                           f"{', '.join(self.statement_exports)}."}
+            )
+
+        period = {}
+        for param in ('start', 'end'):
+            value = datetime_query_param(request, param)
+            if value is not None:
+                period[param] = value
+
+        account = self.get_object()
+        stream, content_type = self.statement_exports[export]
+        response = StatementResponse(
+            stream(iter_account_statement(account, **period)),
+            content_type=content_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="statement-{account.id}.{export}"'
+        )
+        return response
+
+
+class ReplenishmentView(IdempotentCreateMixin,
+                        viewsets.GenericViewSet,
                         mixins.ListModelMixin,
                         mixins.RetrieveModelMixin,
                         mixins.CreateModelMixin):
     serializer_class = ReplenishmentSerializer
-    authentication_classes = (TokenAuthentication, )
+    authentication_classes = (CachedTokenAuthentication, )
     permission_classes = (IsAuthenticated, )
+    throttle_classes = (TokenBucketThrottle, )
+    pagination_class = HistoryCursorPagination
     queryset = Replenishment.objects.all()
 
     def get_queryset(self):
         # View only replenishments on accounts
         # owned by logged in user.
-        return get_user_replenishments(self.request.user)
+        return get_user_replenishments(
+            self.request.user,
+            datetime_query_param(self.request, 'created_after'),
+            datetime_query_param(self.request, 'created_before')
+        )
+
+    @action(detail=False, methods=['post'],
+            serializer_class=ReplenishmentBatchSerializer)
+    def batch(self, request):
+        """Replenishes a list of accounts in one transaction."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        replenishments = make_replenishments(
+            **serializer.validated_data
+        )
+        return Response(
+            {"replenishments": ReplenishmentSerializer(
+                replenishments, many=True
+            ).data},
+            status=status.HTTP_201_CREATED
+        )
+
+
+class QueuedCreateMixin(mixins.CreateModelMixin):
+    """
+    Queues created object instead of executing it on request.
 
+    Applies to requests with `Prefer: respond-async` header, which get
+    202 Accepted. Serializer receives respond_async in its context.
+    """
+    def respond_async(self):
+        preferences = self.request.headers.get('Prefer', '')
+        return 'respond-async' in (
+            preference.split(';')[0].strip()
+            for preference in preferences.split(',')
+        )
 
-class TransferView(viewsets.GenericViewSet,
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['respond_async'] = (
+            self.action == 'create' and self.respond_async()
+        )
+        return context
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        if self.respond_async():
+            response.status_code = status.HTTP_202_ACCEPTED
+            response['Preference-Applied'] = 'respond-async'
+        return response
+
+
+class TransferView(IdempotentCreateMixin,
+                   QueuedCreateMixin,
+                   viewsets.GenericViewSet,
                    mixins.ListModelMixin,
-                   mixins.RetrieveModelMixin,
-                   mixins.CreateModelMixin):
+                   mixins.RetrieveModelMixin):
     serializer_class = TransferSerializer
-    authentication_classes = (TokenAuthentication, )
+    authentication_classes = (CachedTokenAuthentication, )
     permission_classes = (IsAuthenticated, )
+    throttle_classes = (TokenBucketThrottle, )
+    pagination_class = HistoryCursorPagination
     queryset = Transfer.objects.all()
 
     def get_queryset(self):
         # View only transfers from or to accounts
         # owned by logged in user.
-        return get_all_user_transfers(self.request.user)
+        return get_all_user_transfers(
+            self.request.user,
+            datetime_query_param(self.request, 'created_after'),
+            datetime_query_param(self.request, 'created_before')
+        )
+
+    @action(detail=False, methods=['post'],
+            serializer_class=TransferBatchSerializer)
+    def batch(self, request):
+        """
+        Executes a list of transfers in one transaction.
+
+        Responds with a result for every transfer in request order.
+        In atomic mode a single failed transfer cancels the whole batch.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = make_transfers(request.user, **serializer.validated_data)
+
+        failed = any(isinstance(r, ValidationError) for r in results)
+        cancelled = failed and serializer.validated_data['atomic']
+
+        data = []
+        for result in results:
+            if isinstance(result, ValidationError):
+                data.append(
+                    {"status": "failed", "errors": result.message_dict}
+                )
+            elif cancelled:
+                data.append({"status": "cancelled"})
+            else:
+                data.append({
+                    "status": "created",
+                    "transfer": TransferSerializer(result).data,
+                })
+
+        if cancelled:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif failed:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_201_CREATED
+        return Response({"transfers": data}, status=response_status)
@@ -0,0 +1,18 @@
+"""
+Helpers of management commands running work in process pools.
+
+Nothing here may import models: a process started with spawn imports
+this module to unpickle the initializer before Django is set up.
+"""
+import django
+from django.apps import apps
+
+
+def init_worker():
+    """
+    Sets up Django in a worker process started with spawn.
+
+    Forked workers inherit the set up registry of the parent.
+    """
+    if not apps.ready:
+        django.setup()